@@ -0,0 +1,55 @@
+"""indexes for hot query paths
+
+Revision ID: 0002_hot_path_indexes
+Revises: 0001_baseline
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "0002_hot_path_indexes"
+down_revision = "0001_baseline"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # The partial unique index below refuses duplicate open borrows, which the
+    # old check-then-insert flow could create under concurrency. Close all but
+    # the newest open borrow per book first.
+    op.execute(
+        """
+        UPDATE borrows SET returned_at = borrowed_at
+        WHERE returned_at IS NULL
+          AND id NOT IN (
+            SELECT max(id) FROM borrows WHERE returned_at IS NULL GROUP BY book_id
+          )
+        """
+    )
+    op.create_index(
+        "uq_borrows_active_book",
+        "borrows",
+        ["book_id"],
+        unique=True,
+        postgresql_where=sa.text("returned_at IS NULL"),
+        sqlite_where=sa.text("returned_at IS NULL"),
+    )
+    op.create_index("ix_borrows_user_id_book_id", "borrows", ["user_id", "book_id"])
+    op.create_index("ix_reviews_book_id_created_at", "reviews", ["book_id", "created_at"])
+    op.create_index("ix_reviews_user_id_rating", "reviews", ["user_id", "rating"])
+    op.create_index("ix_user_preferences_user_id_key", "user_preferences", ["user_id", "key"])
+    op.create_index("ix_users_email_lower", "users", [sa.text("lower(email)")])
+    op.create_index("ix_books_created_at_id", "books", ["created_at", "id"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_books_created_at_id", table_name="books")
+    op.drop_index("ix_users_email_lower", table_name="users")
+    op.drop_index("ix_user_preferences_user_id_key", table_name="user_preferences")
+    op.drop_index("ix_reviews_user_id_rating", table_name="reviews")
+    op.drop_index("ix_reviews_book_id_created_at", table_name="reviews")
+    op.drop_index("ix_borrows_user_id_book_id", table_name="borrows")
+    op.drop_index("uq_borrows_active_book", table_name="borrows")
@@ -0,0 +1,52 @@
+"""per-book statistics table
+
+Revision ID: 0003_book_stats
+Revises: 0002_hot_path_indexes
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "0003_book_stats"
+down_revision = "0002_hot_path_indexes"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "book_stats",
+        sa.Column("book_id", sa.Integer(), nullable=False),
+        sa.Column("review_count", sa.Integer(), server_default="0", nullable=False),
+        sa.Column("rating_sum", sa.Integer(), server_default="0", nullable=False),
+        sa.Column("sentiment_sum", sa.Float(), server_default="0", nullable=False),
+        sa.Column("sentiment_count", sa.Integer(), server_default="0", nullable=False),
+        sa.Column("current_borrower_id", sa.Integer(), nullable=True),
+        sa.Column("updated_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.ForeignKeyConstraint(["book_id"], ["books.id"]),
+        sa.ForeignKeyConstraint(["current_borrower_id"], ["users.id"]),
+        sa.PrimaryKeyConstraint("book_id"),
+    )
+    op.execute(
+        """
+        INSERT INTO book_stats
+            (book_id, review_count, rating_sum, sentiment_sum, sentiment_count, current_borrower_id)
+        SELECT
+            b.id,
+            (SELECT count(*) FROM reviews r WHERE r.book_id = b.id),
+            (SELECT coalesce(sum(r.rating), 0) FROM reviews r WHERE r.book_id = b.id),
+            (SELECT coalesce(sum(r.sentiment_score), 0) FROM reviews r WHERE r.book_id = b.id),
+            (SELECT count(r.sentiment_score) FROM reviews r WHERE r.book_id = b.id),
+            (SELECT br.user_id FROM borrows br
+              WHERE br.book_id = b.id AND br.returned_at IS NULL
+              ORDER BY br.borrowed_at DESC LIMIT 1)
+        FROM books b
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("book_stats")
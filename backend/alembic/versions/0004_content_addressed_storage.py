@@ -0,0 +1,41 @@
+"""content hashes and blob reference counts
+
+Revision ID: 0004_content_addressed_storage
+Revises: 0003_book_stats
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "0004_content_addressed_storage"
+down_revision = "0003_book_stats"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table("books") as batch_op:
+        batch_op.add_column(sa.Column("original_filename", sa.String(length=255), nullable=True))
+        batch_op.add_column(sa.Column("content_hash", sa.String(length=64), nullable=True))
+        batch_op.create_index("ix_books_content_hash", ["content_hash"])
+
+    op.create_table(
+        "blobs",
+        sa.Column("sha256", sa.String(length=64), nullable=False),
+        sa.Column("key", sa.String(), nullable=False),
+        sa.Column("size", sa.BigInteger(), nullable=False),
+        sa.Column("ref_count", sa.Integer(), server_default="0", nullable=False),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.PrimaryKeyConstraint("sha256"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("blobs")
+    with op.batch_alter_table("books") as batch_op:
+        batch_op.drop_index("ix_books_content_hash")
+        batch_op.drop_column("content_hash")
+        batch_op.drop_column("original_filename")
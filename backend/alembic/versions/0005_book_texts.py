@@ -0,0 +1,35 @@
+"""extracted text artifacts
+
+Revision ID: 0005_book_texts
+Revises: 0004_content_addressed_storage
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "0005_book_texts"
+down_revision = "0004_content_addressed_storage"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "book_texts",
+        sa.Column("book_id", sa.Integer(), nullable=False),
+        sa.Column("key", sa.String(), nullable=False),
+        sa.Column("sha256", sa.String(length=64), nullable=False),
+        sa.Column("page_offsets", sa.Text(), nullable=False),
+        sa.Column("page_count", sa.Integer(), nullable=False),
+        sa.Column("char_count", sa.Integer(), nullable=False),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.ForeignKeyConstraint(["book_id"], ["books.id"]),
+        sa.PrimaryKeyConstraint("book_id"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("book_texts")
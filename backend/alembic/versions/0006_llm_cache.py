@@ -0,0 +1,36 @@
+"""llm response cache
+
+Revision ID: 0006_llm_cache
+Revises: 0005_book_texts
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "0006_llm_cache"
+down_revision = "0005_book_texts"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "llm_cache",
+        sa.Column("key", sa.String(length=64), nullable=False),
+        sa.Column("kind", sa.String(length=32), nullable=False),
+        sa.Column("model", sa.String(), nullable=False),
+        sa.Column("prompt_version", sa.Integer(), nullable=False),
+        sa.Column("value", sa.Text(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.Column("expires_at", sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint("key"),
+    )
+    op.create_index("ix_llm_cache_expires_at", "llm_cache", ["expires_at"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_llm_cache_expires_at", table_name="llm_cache")
+    op.drop_table("llm_cache")
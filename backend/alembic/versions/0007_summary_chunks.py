@@ -0,0 +1,37 @@
+"""map-reduce summary checkpoints
+
+Revision ID: 0007_summary_chunks
+Revises: 0006_llm_cache
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "0007_summary_chunks"
+down_revision = "0006_llm_cache"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "summary_chunks",
+        sa.Column("book_id", sa.Integer(), nullable=False),
+        sa.Column("level", sa.Integer(), nullable=False),
+        sa.Column("chunk_index", sa.Integer(), nullable=False),
+        sa.Column("source_sha256", sa.String(length=64), nullable=False),
+        sa.Column("prompt_version", sa.Integer(), nullable=False),
+        sa.Column("summary", sa.Text(), nullable=False),
+        sa.Column("prompt_tokens", sa.Integer(), nullable=False),
+        sa.Column("completion_tokens", sa.Integer(), nullable=False),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.ForeignKeyConstraint(["book_id"], ["books.id"]),
+        sa.PrimaryKeyConstraint("book_id", "level", "chunk_index"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("summary_chunks")
@@ -0,0 +1,37 @@
+"""coalesce key on jobs
+
+Revision ID: 0009_job_coalescing
+Revises: 0008_jobs
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "0009_job_coalescing"
+down_revision = "0008_jobs"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table("jobs") as batch_op:
+        batch_op.add_column(sa.Column("coalesce_key", sa.String(length=255), nullable=True))
+    op.create_index(
+        "uq_jobs_coalesce_key_queued",
+        "jobs",
+        ["coalesce_key"],
+        unique=True,
+        postgresql_where=sa.text("status = 'queued'"),
+        sqlite_where=sa.text("status = 'queued'"),
+    )
+    op.create_index("ix_jobs_coalesce_key_status", "jobs", ["coalesce_key", "status"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_jobs_coalesce_key_status", table_name="jobs")
+    op.drop_index("uq_jobs_coalesce_key_queued", table_name="jobs")
+    with op.batch_alter_table("jobs") as batch_op:
+        batch_op.drop_column("coalesce_key")
@@ -0,0 +1,81 @@
+"""user preference counters
+
+Revision ID: 0010_user_preference_counts
+Revises: 0009_job_coalescing
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+import re
+from collections import Counter
+
+from alembic import op
+import sqlalchemy as sa
+
+# The counting rule as of this revision, inlined so later changes to the app code
+# do not change what this migration seeds.
+LIKED_RATING = 4
+MAX_TERM_CHARS = 64
+STOPWORDS = {
+    "the", "and", "for", "that", "with", "this", "from", "have", "were", "been", "into",
+    "about", "would", "could", "their", "there", "they", "them", "book", "story", "very",
+    "really",
+}
+_WORD = re.compile(r"[a-zA-Z]{4,}")
+
+
+# revision identifiers, used by Alembic.
+revision = "0010_user_preference_counts"
+down_revision = "0009_job_coalescing"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    counts = op.create_table(
+        "user_preference_counts",
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("kind", sa.String(length=16), nullable=False),
+        sa.Column("term", sa.String(length=255), nullable=False),
+        sa.Column("count", sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(["user_id"], ["users.id"]),
+        sa.PrimaryKeyConstraint("user_id", "kind", "term"),
+    )
+    op.create_index(
+        "ix_user_preference_counts_top", "user_preference_counts", ["user_id", "kind", "count"]
+    )
+
+    # Seed the counters from existing reviews; the profile rows themselves are
+    # already up to date from the old full recompute.
+    rows = op.get_bind().execute(
+        sa.text(
+            "SELECT reviews.user_id, reviews.rating, reviews.comment, books.author "
+            "FROM reviews JOIN books ON books.id = reviews.book_id "
+            "WHERE reviews.rating >= :liked"
+        ),
+        {"liked": LIKED_RATING},
+    )
+    by_user: dict[int, Counter] = {}
+    for user_id, rating, comment, author in rows:
+        by_user.setdefault(user_id, Counter()).update(_review_terms(comment, author))
+    seed = [
+        {"user_id": user_id, "kind": kind, "term": term, "count": count}
+        for user_id, terms in by_user.items()
+        for (kind, term), count in terms.items()
+    ]
+    if seed:
+        op.bulk_insert(counts, seed)
+
+
+def _review_terms(comment, author) -> Counter:
+    terms = Counter()
+    if author:
+        terms[("author", author)] += 1
+    for word in _WORD.findall((comment or "").lower()):
+        if word not in STOPWORDS and len(word) <= MAX_TERM_CHARS:
+            terms[("keyword", word)] += 1
+    return terms
+
+
+def downgrade() -> None:
+    op.drop_index("ix_user_preference_counts_top", table_name="user_preference_counts")
+    op.drop_table("user_preference_counts")
@@ -0,0 +1,30 @@
+"""books.updated_at
+
+Revision ID: 0011_books_updated_at
+Revises: 0010_user_preference_counts
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "0011_books_updated_at"
+down_revision = "0010_user_preference_counts"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Set by the application on insert and update; existing rows start at created_at.
+    with op.batch_alter_table("books") as batch_op:
+        batch_op.add_column(sa.Column("updated_at", sa.DateTime(), nullable=True))
+    op.execute("UPDATE books SET updated_at = COALESCE(created_at, CURRENT_TIMESTAMP)")
+    op.create_index("ix_books_updated_at", "books", ["updated_at"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_books_updated_at", table_name="books")
+    with op.batch_alter_table("books") as batch_op:
+        batch_op.drop_column("updated_at")
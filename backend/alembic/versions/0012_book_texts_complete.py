@@ -0,0 +1,27 @@
+"""book_texts.complete
+
+Revision ID: 0012_book_texts_complete
+Revises: 0011_books_updated_at
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "0012_book_texts_complete"
+down_revision = "0011_books_updated_at"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Existing artifacts cannot be told apart; they are treated as complete.
+    with op.batch_alter_table("book_texts") as batch_op:
+        batch_op.add_column(sa.Column("complete", sa.Boolean(), server_default=sa.true(), nullable=False))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("book_texts") as batch_op:
+        batch_op.drop_column("complete")
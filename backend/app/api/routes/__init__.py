@@ -1,3 +1,3 @@
-from . import auth, books, llm
+from . import auth, books, jobs, llm, metrics
 
-__all__ = ["auth", "books", "llm"]
+__all__ = ["auth", "books", "jobs", "llm", "metrics"]
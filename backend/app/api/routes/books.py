@@ -1,7 +1,8 @@
-import asyncio
-from io import BytesIO
+import logging
+from functools import partial
 from pathlib import Path
 from typing import Optional
+from uuid import uuid4
 
 from fastapi import (
     APIRouter,
@@ -10,51 +11,64 @@ from fastapi import (
     UploadFile,
     File,
     Form,
-    BackgroundTasks,
+    Query,
     status,
 )
 from fastapi.responses import FileResponse, RedirectResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, func
-from pypdf import PdfReader
+from sqlalchemy.exc import IntegrityError
 
+from app.core.config import settings
+from app.core.events import BOOK_CHANGED, BOOK_DELETED, PREFERENCES_CHANGED, REVIEW_CREATED, events
+from app.core.metrics import metrics
 from app.db import models
 from app.db.session import get_db
 from app.schemas import book as book_schemas, review as review_schemas
 from app.api.deps.auth import get_current_user
-from app.services.storage import get_storage, StorageBackend
-from app.tasks.llm_tasks import generate_summary, analyze_review
-from app.tasks.review_tasks import update_book_consensus
+from app.services import book_stats, jobs, preferences
+from app.services.catalog import (
+    approximate_book_count,
+    build_book_cards,
+    clamp_page_size,
+    decode_cursor,
+    fetch_book_page,
+    summary_status,
+)
+from app.services.blobs import acquire_blob, find_blob, find_reusable_summary, reap_blob, release_blob
+from app.services.book_vectors import similar_books
+from app.services.search_index import search_books
+from app.services.storage import get_storage, StorageBackend, UploadTooLargeError
+from app.services.summarizer import discard_checkpoints
+from app.services.text_store import (
+    discard_incomplete_text,
+    extract_book_text,
+    find_reusable_text,
+    release_book_text,
+    share_book_text,
+)
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 ALLOWED_EXTENSIONS = {".txt", ".pdf"}
 ALLOWED_CONTENT_TYPES = {"text/plain", "application/pdf"}
 
 
-def _summary_status(summary: Optional[str]) -> str:
-    if not summary:
-        return "pending"
-    if summary.strip() == "__SUMMARY_FAILED__":
-        return "failed"
-    return "ready"
+def _download_name(book: models.Book) -> str:
+    if book.original_filename:
+        return book.original_filename
+    name = Path(book.file_path).name
+    return name.split("_", 1)[1] if "_" in name else name
 
 
-def _extract_text(file_bytes: bytes, ext: str) -> str:
-    if ext == ".pdf":
-        try:
-            reader = PdfReader(BytesIO(file_bytes))
-            return "\n".join((page.extract_text() or "") for page in reader.pages)
-        except Exception:
-            return ""
-    try:
-        return file_bytes.decode("utf-8")
-    except Exception:
-        return ""
+async def _upload_chunks(file: UploadFile):
+    while chunk := await file.read(settings.upload_chunk_bytes):
+        yield chunk
 
 
 @router.post("/", response_model=book_schemas.BookRead)
 async def create_book(
-    background_tasks: BackgroundTasks,
     title: str = Form(...),
     file: UploadFile = File(...),
     author: Optional[str] = Form(None),
@@ -69,92 +83,135 @@ async def create_book(
     if file.content_type and file.content_type not in ALLOWED_CONTENT_TYPES:
         raise HTTPException(status_code=400, detail="Unsupported file content type")
 
-    file_bytes = await file.read()
-    if not file_bytes:
+    try:
+        stored = await storage.save_stream(
+            _upload_chunks(file),
+            file.filename or "book.txt",
+            max_bytes=settings.upload_max_bytes,
+            # Shared blob: the reference is taken before the object is looked for.
+            claim=partial(acquire_blob, db) if settings.storage_content_addressed else None,
+        )
+    except UploadTooLargeError:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Uploaded file exceeds {settings.upload_max_bytes} bytes",
+        )
+    if not stored.size:
+        await db.rollback()
+        await storage.delete(stored.key)
         raise HTTPException(status_code=400, detail="Uploaded file is empty")
 
-    book = models.Book(title=title, author=author, description=description, file_path="")
+    reused_summary = await find_reusable_summary(db, stored.sha256)
+    reused_text = await find_reusable_text(db, stored.sha256)
+    book = models.Book(
+        title=title,
+        author=author,
+        description=description,
+        file_path=stored.key,
+        original_filename=Path(file.filename or "book.txt").name,
+        content_hash=stored.sha256,
+        summary=reused_summary,
+    )
     db.add(book)
+    await db.flush()
+    await book_stats.init_book_stats(db, book.id)
+    if reused_text:
+        reused_text = await share_book_text(db, reused_text, book.id)
+    # Per upload, not per id: SQLite hands a deleted newest book's id to the next one.
+    summary_key = f"summary:{book.id}:{uuid4().hex}"
+    if not reused_summary:
+        # Queued with the book, so a crash before the summary starts loses nothing. Without
+        # shared text it waits for the extraction below; should this request die first, the
+        # job extracts the book itself.
+        await jobs.enqueue(
+            db,
+            "generate_summary",
+            {"book_id": book.id},
+            idempotency_key=summary_key,
+            # Shared with refreshes, so the two never run on the book at once.
+            coalesce_key=f"summary:{book.id}",
+            delay_seconds=0 if reused_text else settings.extraction_timeout_seconds,
+        )
     await db.commit()
     await db.refresh(book)
+    logger.info(
+        "Stored upload for book_id=%s (%s bytes, sha256=%s)", book.id, stored.size, stored.sha256
+    )
 
-    path = await storage.save(BytesIO(file_bytes), file.filename or "book.txt")
-    book.file_path = path
-    await db.commit()
-    await db.refresh(book)
-
-    text = _extract_text(file_bytes, ext)
-    asyncio.create_task(generate_summary(book.id, text))
+    # Identical bytes seen before: reuse their extracted text and summary.
+    if reused_text or reused_summary:
+        metrics.inc("uploads.deduplicated")
+    if not reused_text:
+        await extract_book_text(db, storage, book.id, book.file_path)
+        await db.refresh(book)  # a clash with the summary job's extraction rolls the session back
+        if not reused_summary:
+            await jobs.make_due(db, summary_key)
+            await db.commit()
+    # Published once the extracted text is attached, so search indexes it with the book.
+    events.publish(BOOK_CHANGED, book=book)
     return {
         "id": book.id,
         "title": book.title,
         "author": book.author,
         "description": book.description,
         "summary": book.summary,
-        "summary_status": "pending",
+        "summary_status": summary_status(book.summary),
         "current_borrower": None,
         "recent_reviews": [],
     }
 
 
 @router.get("/", response_model=book_schemas.BookList)
-async def list_books(page: int = 1, db: AsyncSession = Depends(get_db)):
-    stmt = select(models.Book).offset((page - 1) * 10).limit(10)
-    result = await db.execute(stmt)
-    books = result.scalars().all()
-
-    items = []
-    for book in books:
-        active_borrow_stmt = (
-            select(models.User.full_name, models.User.email)
-            .join(models.Borrow, models.Borrow.user_id == models.User.id)
-            .where(
-                models.Borrow.book_id == book.id,
-                models.Borrow.returned_at.is_(None),
-            )
-            .order_by(models.Borrow.borrowed_at.desc())
-            .limit(1)
-        )
-        active_borrow = (await db.execute(active_borrow_stmt)).first()
-        current_borrower = None
-        if active_borrow:
-            current_borrower = active_borrow[0] or active_borrow[1]
-
-        reviews_stmt = (
-            select(models.User.full_name, models.User.email, models.Review.rating, models.Review.comment)
-            .join(models.Review, models.Review.user_id == models.User.id)
-            .where(
-                models.Review.book_id == book.id,
-                models.Review.comment.is_not(None),
-                models.Review.comment != "",
-            )
-            .order_by(models.Review.created_at.desc())
-            .limit(5)
-        )
-        review_rows = (await db.execute(reviews_stmt)).all()
-        review_snippets = [
-            {
-                "reviewer": row[0] or row[1],
-                "rating": row[2],
-                "comment": row[3],
-            }
-            for row in review_rows
-        ]
-
-        items.append(
-            {
-                "id": book.id,
-                "title": book.title,
-                "author": book.author,
-                "description": book.description,
-                "summary": book.summary,
-                "summary_status": _summary_status(book.summary),
-                "current_borrower": current_borrower,
-                "recent_reviews": review_snippets,
-            }
-        )
+async def list_books(
+    page: int = 1,
+    cursor: Optional[str] = None,
+    page_size: Optional[int] = None,
+    include_total: bool = False,
+    db: AsyncSession = Depends(get_db),
+):
+    size = clamp_page_size(page_size)
+    if cursor:
+        try:
+            after = decode_cursor(cursor)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        items, next_cursor = await fetch_book_page(db, limit=size, after=after)
+        current_page = None
+    else:
+        page = max(page, 1)
+        items, next_cursor = await fetch_book_page(db, offset=(page - 1) * size, limit=size)
+        current_page = page
+
+    total_estimate = await approximate_book_count(db) if include_total else None
+    return {
+        "items": items,
+        "page": current_page,
+        "page_size": size,
+        "next_cursor": next_cursor,
+        "total_estimate": total_estimate,
+    }
 
-    return {"items": items, "page": page}
+
+@router.get("/search", response_model=book_schemas.BookSearchResults)
+async def search(
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: Optional[int] = None,
+    offset: int = Query(0, ge=0),
+    db: AsyncSession = Depends(get_db),
+):
+    size = clamp_page_size(limit)
+    hits = await search_books(db, q, limit=size + 1, offset=offset)
+    cards = await build_book_cards(db, [book for book, _, _ in hits[:size]])
+    items = [
+        {**card, "score": score, "snippet": snippet}
+        for card, (_, score, snippet) in zip(cards, hits)
+    ]
+    return {
+        "items": items,
+        "limit": size,
+        "offset": offset,
+        "next_offset": offset + size if len(hits) > size else None,
+    }
 
 
 @router.put("/{book_id}", response_model=book_schemas.BookRead)
@@ -164,22 +221,54 @@ async def update_book(
     book = await db.get(models.Book, book_id)
     if not book:
         raise HTTPException(status_code=404, detail="Book not found")
-    for field, value in data.dict(exclude_unset=True).items():
+    changes = data.dict(exclude_unset=True)
+    profiled = []
+    if "author" in changes:
+        profiled = await preferences.change_book_author(db, book.id, book.author, changes["author"])
+    for field, value in changes.items():
         setattr(book, field, value)
     await db.commit()
     await db.refresh(book)
+    events.publish(BOOK_CHANGED, book=book)
+    if profiled:
+        events.publish(PREFERENCES_CHANGED, user_ids=profiled)
     return book
 
 
 @router.delete("/{book_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_book(book_id: int, db: AsyncSession = Depends(get_db)):
+async def delete_book(
+    book_id: int,
+    db: AsyncSession = Depends(get_db),
+    storage: StorageBackend = Depends(get_storage),
+):
     book = await db.get(models.Book, book_id)
     if not book:
         raise HTTPException(status_code=404, detail="Book not found")
-    storage = get_storage()
-    await storage.delete(book.file_path)
+    # Decided by the blobs table, not the current setting: the mode may have changed since upload.
+    orphaned_key, released = None, []
+    if await find_blob(db, book.content_hash, book.file_path):
+        # Shared blob: only the last referencing book removes the object.
+        if await release_blob(db, book.content_hash):
+            released.append(book.content_hash)
+    else:
+        orphaned_key = book.file_path
+    text_sha = await release_book_text(db, book_id)
+    if text_sha:
+        released.append(text_sha)
+    await discard_checkpoints(db, book_id)
+    # A later book may get this id; its jobs must not fold into these.
+    await jobs.discard_queued(db, [f"summary:{book_id}", f"consensus:{book_id}"])
+    await book_stats.delete_book_stats(db, book_id)
+    profiled = await preferences.forget_book(db, book)
     await db.delete(book)
     await db.commit()
+    events.publish(BOOK_DELETED, book_id=book_id)
+    if profiled:
+        events.publish(PREFERENCES_CHANGED, user_ids=profiled)
+    if orphaned_key:
+        await storage.delete(orphaned_key)
+    for sha256 in released:
+        await reap_blob(db, storage, sha256)
     return None
 
 
@@ -206,7 +295,13 @@ async def borrow_book(
 
     borrow = models.Borrow(user_id=user.id, book_id=book_id)
     db.add(borrow)
-    await db.commit()
+    try:
+        await book_stats.set_current_borrower(db, book_id, user.id)
+        await db.commit()
+    except IntegrityError:
+        # uq_borrows_active_book: another request borrowed it in the meantime
+        await db.rollback()
+        raise HTTPException(status_code=400, detail="Book is currently borrowed by another user")
     await db.refresh(borrow)
     return {"message": "borrowed"}
 
@@ -225,6 +320,7 @@ async def return_book(
     if not borrow:
         raise HTTPException(status_code=400, detail="No active borrow record")
     borrow.returned_at = func.now()
+    await book_stats.set_current_borrower(db, book_id, None)
     await db.commit()
     return {"message": "returned"}
 
@@ -233,7 +329,6 @@ async def return_book(
 async def create_review(
     book_id: int,
     review_in: review_schemas.ReviewCreate,
-    background_tasks: BackgroundTasks,
     user: models.User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db),
 ):
@@ -252,50 +347,75 @@ async def create_review(
         user_id=user.id, book_id=book_id, rating=review_in.rating, comment=review_in.comment
     )
     db.add(review)
+    await book_stats.record_review(db, book_id, review.rating)
+    await preferences.record_review(db, user.id, review.rating, review.comment, book.author)
+    await db.flush()
+    # Queued in the review's transaction: both jobs exist exactly when the review does.
+    await jobs.enqueue(
+        db,
+        "analyze_review",
+        {"review_id": review.id, "text": review_in.comment or ""},
+        idempotency_key=f"sentiment:{review.id}:{uuid4().hex}",
+    )
+    # One pending recompute per book; it reads every review present when it runs.
+    await jobs.enqueue(
+        db,
+        "update_book_consensus",
+        {"book_id": book_id},
+        coalesce_key=f"consensus:{book_id}",
+        delay_seconds=settings.consensus_debounce_seconds,
+    )
     await db.commit()
     await db.refresh(review)
-    text = review_in.comment or ""
-    asyncio.create_task(analyze_review(review.id, text))
-    asyncio.create_task(update_book_consensus(book_id))
+    events.publish(REVIEW_CREATED, review=review)
     return review
 
 
+@router.get("/{book_id}/similar", response_model=book_schemas.BookSimilarList)
+async def similar(book_id: int, limit: Optional[int] = None, db: AsyncSession = Depends(get_db)):
+    book = await db.get(models.Book, book_id)
+    if not book:
+        raise HTTPException(status_code=404, detail="Book not found")
+    hits = await similar_books(db, book, limit=clamp_page_size(limit))
+    cards = await build_book_cards(db, [found for found, _ in hits])
+    return {"items": [{**card, "score": score} for card, (_, score) in zip(cards, hits)]}
+
+
 @router.get("/{book_id}/analysis")
 async def book_analysis(book_id: int, db: AsyncSession = Depends(get_db)):
-    stmt = select(models.Review).where(models.Review.book_id == book_id)
-    res = await db.execute(stmt)
-    reviews = res.scalars().all()
-    scores = [r.sentiment_score for r in reviews if r.sentiment_score is not None]
-    avg = sum(scores) / len(scores) if scores else None
-    return {"average_sentiment": avg, "review_count": len(reviews)}
+    stats = await book_stats.get_book_stats(db, book_id)
+    if not stats or not stats.review_count:
+        return {"average_sentiment": None, "average_rating": None, "review_count": 0}
+    avg = stats.sentiment_sum / stats.sentiment_count if stats.sentiment_count else None
+    return {
+        "average_sentiment": avg,
+        "average_rating": stats.rating_sum / stats.review_count,
+        "review_count": stats.review_count,
+    }
 
 
-@router.post("/{book_id}/summary/refresh")
+@router.post("/{book_id}/summary/refresh", status_code=status.HTTP_202_ACCEPTED)
 async def refresh_summary(
     book_id: int,
     db: AsyncSession = Depends(get_db),
+    storage: StorageBackend = Depends(get_storage),
 ):
     book = await db.get(models.Book, book_id)
     if not book:
         raise HTTPException(status_code=404, detail="Book not found")
 
-    file_path = Path(book.file_path)
-    if not file_path.exists():
-        raise HTTPException(status_code=404, detail="Book file not found")
-
-    ext = file_path.suffix.lower()
-    if ext not in ALLOWED_EXTENSIONS:
-        raise HTTPException(status_code=400, detail="Unsupported file type for summarization")
-
-    file_bytes = file_path.read_bytes()
-    text = _extract_text(file_bytes, ext)
-    await generate_summary(book.id, text)
-
-    await db.refresh(book)
+    if not await discard_incomplete_text(db, storage, book.id):
+        # Uploaded before text artifacts existed, or extraction stopped early: the job extracts it.
+        if Path(book.file_path).suffix.lower() not in ALLOWED_EXTENSIONS:
+            raise HTTPException(status_code=400, detail="Unsupported file type for summarization")
+    # One pending refresh per book: repeated requests fold into the queued job.
+    queued = await jobs.enqueue(db, "generate_summary", {"book_id": book.id}, coalesce_key=f"summary:{book.id}")
+    await db.commit()
     return {
         "book_id": book.id,
-        "summary_status": _summary_status(book.summary),
+        "summary_status": summary_status(book.summary),
         "summary": book.summary,
+        "job": "queued" if queued else "coalesced",
     }
 
 
@@ -310,13 +430,14 @@ async def download_book(
         raise HTTPException(status_code=404, detail="Book not found")
 
     file_path = Path(book.file_path)
-    file_name = file_path.name.split("_", 1)[1] if "_" in file_path.name else file_path.name
+    file_name = _download_name(book)
     media_type = "application/pdf" if file_path.suffix.lower() == ".pdf" else "text/plain"
 
     signed_url = await storage.get_download_url(
         book.file_path,
         disposition="attachment",
         content_type=media_type,
+        filename=file_name,
     )
     if signed_url:
         return RedirectResponse(url=signed_url, status_code=307)
@@ -343,13 +464,14 @@ async def view_book(
         raise HTTPException(status_code=404, detail="Book not found")
 
     file_path = Path(book.file_path)
-    file_name = file_path.name.split("_", 1)[1] if "_" in file_path.name else file_path.name
+    file_name = _download_name(book)
     media_type = "application/pdf" if file_path.suffix.lower() == ".pdf" else "text/plain"
 
     signed_url = await storage.get_download_url(
         book.file_path,
         disposition="inline",
         content_type=media_type,
+        filename=file_name,
     )
     if signed_url:
         return RedirectResponse(url=signed_url, status_code=307)
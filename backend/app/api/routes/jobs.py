@@ -0,0 +1,12 @@
+from fastapi import APIRouter, Depends
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db.session import get_db
+from app.services.jobs import queue_status
+
+router = APIRouter()
+
+
+@router.get("/status")
+async def job_queue_status(db: AsyncSession = Depends(get_db)):
+    return await queue_status(db)
@@ -1,11 +1,16 @@
+import asyncio
+import json
 from typing import Literal
 
 import httpx
 from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
 
 from app.core.config import settings
-from app.services.llm import ollama_chat, ollama_status
+from app.core.metrics import metrics
+from app.services.circuit_breaker import CircuitOpenError
+from app.services.llm import ollama_chat, ollama_chat_stream, ollama_status
 
 router = APIRouter()
 
@@ -21,21 +26,11 @@ class ChatRequest(BaseModel):
 
 @router.get("/status")
 async def llm_connectivity_status():
-    try:
-        result = await ollama_status()
-        result["llm_url"] = settings.llm_url
-        result["llm_provider"] = settings.llm_provider
-        return result
-    except Exception as exc:
-        return {
-            "connected": False,
-            "llm_url": settings.llm_url,
-            "llm_provider": settings.llm_provider,
-            "configured_model": settings.llm_model,
-            "configured_model_ready": False,
-            "available_models": [],
-            "error": str(exc),
-        }
+    # Upstream errors are part of the cached snapshot (connected: false, error: ...).
+    result = await ollama_status()
+    result["llm_url"] = settings.llm_url
+    result["llm_provider"] = settings.llm_provider
+    return result
 
 
 @router.post("/chat")
@@ -43,6 +38,12 @@ async def llm_chat(payload: ChatRequest):
     messages = [{"role": m.role, "content": m.content.strip()} for m in payload.messages]
     try:
         answer = await ollama_chat(messages)
+    except CircuitOpenError as exc:
+        raise HTTPException(
+            status_code=503,
+            detail=f"LLM unavailable: {exc}",
+            headers={"Retry-After": str(int(settings.llm_breaker_reset_seconds))},
+        ) from exc
     except httpx.HTTPError as exc:
         raise HTTPException(status_code=502, detail=f"LLM upstream error: {exc}") from exc
     except Exception as exc:
@@ -51,3 +52,34 @@ async def llm_chat(payload: ChatRequest):
     if not answer:
         raise HTTPException(status_code=502, detail="LLM returned an empty response")
     return {"answer": answer}
+
+
+def _sse(data: dict, event: str | None = None) -> str:
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
+
+@router.post("/chat/stream")
+async def llm_chat_stream(payload: ChatRequest):
+    """Relay the answer as server-sent events: ``data`` deltas, then a ``done`` or ``error`` event."""
+    messages = [{"role": m.role, "content": m.content.strip()} for m in payload.messages]
+
+    async def events():
+        try:
+            async for delta in ollama_chat_stream(messages):
+                yield _sse({"delta": delta})
+            yield _sse({}, event="done")
+        except (asyncio.CancelledError, GeneratorExit):
+            # Client went away; leaving the generator closes the upstream request.
+            metrics.inc("llm.chat.stream_disconnects")
+            raise
+        except httpx.HTTPError as exc:
+            yield _sse({"detail": f"LLM upstream error: {exc}"}, event="error")
+        except Exception as exc:
+            yield _sse({"detail": f"LLM chat failed: {exc}"}, event="error")
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
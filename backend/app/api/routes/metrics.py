@@ -0,0 +1,10 @@
+from fastapi import APIRouter
+
+from app.core.metrics import metrics
+
+router = APIRouter()
+
+
+@router.get("/")
+async def read_metrics():
+    return metrics.snapshot()
@@ -25,6 +25,36 @@ class Settings(BaseSettings):
     s3_endpoint_url: str = ""  # e.g. http://minio:9000 for local MinIO
     s3_object_prefix: str = "books"
     s3_create_bucket_if_missing: bool = True
+    s3_max_pool_connections: int = 32
+    s3_multipart_part_bytes: int = 8 * 1024 * 1024
+    s3_multipart_concurrency: int = 4
+    storage_content_addressed: bool = False  # dedupe uploads by SHA-256
+    upload_max_bytes: int = 200 * 1024 * 1024
+    upload_chunk_bytes: int = 1024 * 1024
+
+    # text extraction
+    extraction_workers: int = 2
+    extraction_timeout_seconds: int = 120
+    extraction_max_pages: int = 2000
+    extraction_pages_per_batch: int = 20
+
+    # catalog
+    books_page_size: int = 10
+    books_max_page_size: int = 100
+    books_count_cache_seconds: int = 60
+    book_index_sync_seconds: float = 30.0  # how often the index picks up other processes' book writes
+    cf_neighbours: int = 50  # similar books kept per book for collaborative filtering
+    cf_rebuild_seconds: float = 3600.0
+    recommendation_cache_ttl_seconds: float = 300.0  # 0 disables the per-user result cache
+    recommendation_cache_max_entries: int = 10000
+    search_index_path: str = ""  # FTS5 file; defaults to search.sqlite3 under storage_path
+    search_sync_seconds: float = 30.0  # how often search picks up other processes' book writes
+    search_body_max_chars: int = 1_000_000  # extracted text indexed per book
+    search_max_candidates: int = 5000  # broader queries are narrowed before BM25 ranking
+    vector_path: str = ""  # book vectors and ANN index; defaults to vectors/ under storage_path
+    vector_dim: int = 64
+    vector_ann_probes: int = 8  # IVF lists scanned per query; more is slower and closer to exact
+    vector_rebuild_seconds: float = 24 * 3600.0
 
     # llm
     llm_provider: str = "local"  # or "openai" etc
@@ -32,6 +62,35 @@ class Settings(BaseSettings):
     llm_model: str = "phi3"
     llm_timeout_seconds: int = 180
     llm_max_input_chars: int = 12000
+    llm_max_concurrency: int = 2  # generations in flight against the model
+    llm_interactive_weight: int = 3  # chat grants per background grant when both queue
+    llm_max_connections: int = 20
+    llm_keepalive_seconds: float = 30.0
+    llm_breaker_failure_threshold: int = 5  # consecutive upstream failures that open the circuit
+    llm_breaker_reset_seconds: float = 30.0  # probe interval while the circuit is open
+    llm_health_ttl_seconds: float = 10.0  # max age of the snapshot behind GET /llm/status
+    llm_health_timeout_seconds: float = 5.0
+    sentiment_engine: str = "llm"  # or "lexicon": lexicon first, LLM for low confidence
+    sentiment_llm_min_confidence: float = 0.5  # lexicon results below this go to the LLM
+    sentiment_lexicon_path: str = ""  # JSON overlay for the built-in lexicon
+    sentiment_batch_size: int = 16
+    sentiment_batch_window_ms: int = 50
+    summary_chunk_chars: int = 12000  # text per map step in long-book summaries
+    summary_map_concurrency: int = 4
+    llm_cache_enabled: bool = True
+    llm_cache_ttl_seconds: int = 7 * 24 * 3600
+    llm_cache_memory_entries: int = 1024
+    llm_cache_max_rows: int = 50000
+    job_worker_in_process: bool = True  # run the job worker inside the API process
+    job_worker_concurrency: int = 4
+    job_poll_seconds: float = 1.0
+    job_max_attempts: int = 5
+    job_backoff_base_seconds: float = 2.0  # doubled per attempt, with jitter
+    job_backoff_max_seconds: float = 300.0
+    job_heartbeat_seconds: float = 30.0
+    job_lock_timeout_seconds: int = 600  # running jobs without a heartbeat this long are requeued
+    job_shutdown_grace_seconds: float = 10.0
+    consensus_debounce_seconds: float = 30.0  # reviews within this window share one recompute
 
     class Config:
         env_file = ".env"
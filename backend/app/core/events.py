@@ -0,0 +1,46 @@
+import logging
+from collections import defaultdict
+from typing import Any, Callable
+
+logger = logging.getLogger(__name__)
+
+# Published after the write is committed. Payload: book (loaded models.Book).
+BOOK_CHANGED = "book_changed"
+# Payload: book_id.
+BOOK_DELETED = "book_deleted"
+# Payload: review (loaded models.Review).
+REVIEW_CREATED = "review_created"
+# A book's indexed content differs from before, from this process or another.
+# Payload: book_id, tokens (set of keyword tokens), author (lower-cased or None).
+BOOK_INDEXED = "book_indexed"
+# Preference profiles were rewritten. Payload: user_ids.
+PREFERENCES_CHANGED = "preferences_changed"
+
+
+class EventBus:
+    """Minimal in-process publish/subscribe for keeping caches and indexes in step with writes.
+
+    Handlers run synchronously in the publisher; a failing handler is logged and
+    does not affect the publisher or the other handlers.
+    """
+
+    def __init__(self):
+        self._handlers: dict[str, list[Callable[..., Any]]] = defaultdict(list)
+
+    def subscribe(self, event: str, handler: Callable[..., Any]) -> None:
+        if handler not in self._handlers[event]:
+            self._handlers[event].append(handler)
+
+    def unsubscribe(self, event: str, handler: Callable[..., Any]) -> None:
+        if handler in self._handlers[event]:
+            self._handlers[event].remove(handler)
+
+    def publish(self, event: str, **payload: Any) -> None:
+        for handler in list(self._handlers[event]):
+            try:
+                handler(**payload)
+            except Exception:
+                logger.exception("Handler %r for event %s failed", handler, event)
+
+
+events = EventBus()
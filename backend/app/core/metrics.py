@@ -0,0 +1,59 @@
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any
+
+
+class Metrics:
+    """Minimal in-process metrics registry: counters, gauges and timings."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: dict[str, float] = {}
+        self._gauges: dict[str, float] = {}
+        self._timings: dict[str, dict[str, float]] = {}
+
+    def inc(self, name: str, value: float = 1) -> None:
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def set_gauge(self, name: str, value: float) -> None:
+        with self._lock:
+            self._gauges[name] = value
+
+    def add_gauge(self, name: str, delta: float) -> None:
+        with self._lock:
+            self._gauges[name] = self._gauges.get(name, 0) + delta
+
+    def observe(self, name: str, seconds: float) -> None:
+        with self._lock:
+            timing = self._timings.setdefault(
+                name, {"count": 0, "total": 0.0, "max": 0.0, "last": 0.0}
+            )
+            timing["count"] += 1
+            timing["total"] += seconds
+            timing["max"] = max(timing["max"], seconds)
+            timing["last"] = seconds
+
+    @contextmanager
+    def timer(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started)
+
+    def snapshot(self) -> dict[str, Any]:
+        with self._lock:
+            timings = {
+                name: {**timing, "avg": timing["total"] / timing["count"] if timing["count"] else 0.0}
+                for name, timing in self._timings.items()
+            }
+            return {
+                "counters": dict(self._counters),
+                "gauges": dict(self._gauges),
+                "timings": timings,
+            }
+
+
+metrics = Metrics()
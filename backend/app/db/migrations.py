@@ -0,0 +1,31 @@
+from pathlib import Path
+
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import inspect
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+BACKEND_DIR = Path(__file__).resolve().parents[2]
+BASELINE_REVISION = "0001_baseline"
+
+
+def _alembic_config(connection: Connection) -> Config:
+    cfg = Config(str(BACKEND_DIR / "alembic.ini"))
+    cfg.set_main_option("script_location", str(BACKEND_DIR / "alembic"))
+    cfg.attributes["connection"] = connection
+    return cfg
+
+
+def upgrade_to_head(connection: Connection) -> None:
+    cfg = _alembic_config(connection)
+    tables = set(inspect(connection).get_table_names())
+    if "alembic_version" not in tables and "users" in tables:
+        # Schema was created by the old create_all() startup hook.
+        command.stamp(cfg, BASELINE_REVISION)
+    command.upgrade(cfg, "head")
+
+
+async def run_migrations(engine: AsyncEngine) -> None:
+    async with engine.begin() as conn:
+        await conn.run_sync(upgrade_to_head)
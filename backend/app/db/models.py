@@ -1,5 +1,6 @@
 from datetime import datetime
 from sqlalchemy import (
+    BigInteger,
     Column,
     Integer,
     String,
@@ -8,8 +9,11 @@ from sqlalchemy import (
     ForeignKey,
     Boolean,
     Float,
+    Index,
     func,
     Table,
+    text,
+    true,
 )
 from sqlalchemy.orm import relationship
 
@@ -31,6 +35,9 @@ class User(Base):
     reviews = relationship("Review", back_populates="user")
     preferences = relationship("UserPreference", back_populates="user")
 
+    # auth routes look users up by func.lower(email)
+    __table_args__ = (Index("ix_users_email_lower", func.lower(email)),)
+
 
 class Book(Base):
     __tablename__ = "books"
@@ -40,11 +47,20 @@ class Book(Base):
     author = Column(String(255), nullable=True)
     description = Column(Text, nullable=True)
     file_path = Column(String, nullable=False)
+    original_filename = Column(String(255), nullable=True)
+    content_hash = Column(String(64), nullable=True, index=True)
     summary = Column(Text, nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     borrows = relationship("Borrow", back_populates="book")
     reviews = relationship("Review", back_populates="book")
+    stats = relationship("BookStats", back_populates="book", uselist=False)
+
+    __table_args__ = (
+        Index("ix_books_created_at_id", "created_at", "id"),
+        Index("ix_books_updated_at", "updated_at"),
+    )
 
 
 class Borrow(Base):
@@ -59,6 +75,18 @@ class Borrow(Base):
     user = relationship("User", back_populates="borrows")
     book = relationship("Book", back_populates="borrows")
 
+    __table_args__ = (
+        # at most one open borrow per book
+        Index(
+            "uq_borrows_active_book",
+            "book_id",
+            unique=True,
+            postgresql_where=text("returned_at IS NULL"),
+            sqlite_where=text("returned_at IS NULL"),
+        ),
+        Index("ix_borrows_user_id_book_id", "user_id", "book_id"),
+    )
+
 
 class Review(Base):
     __tablename__ = "reviews"
@@ -74,6 +102,11 @@ class Review(Base):
     user = relationship("User", back_populates="reviews")
     book = relationship("Book", back_populates="reviews")
 
+    __table_args__ = (
+        Index("ix_reviews_book_id_created_at", "book_id", "created_at"),
+        Index("ix_reviews_user_id_rating", "user_id", "rating"),
+    )
+
 
 class UserPreference(Base):
     __tablename__ = "user_preferences"
@@ -84,3 +117,128 @@ class UserPreference(Base):
     value = Column(String(255), nullable=False)
 
     user = relationship("User", back_populates="preferences")
+
+    __table_args__ = (Index("ix_user_preferences_user_id_key", "user_id", "key"),)
+
+
+class UserPreferenceCount(Base):
+    """How often an author or keyword occurs in a user's liked reviews."""
+
+    __tablename__ = "user_preference_counts"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    kind = Column(String(16), primary_key=True)  # author|keyword
+    term = Column(String(255), primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        Index("ix_user_preference_counts_top", "user_id", "kind", "count"),
+    )
+
+
+class BookStats(Base):
+    """Running per-book aggregates, maintained alongside review and borrow writes."""
+
+    __tablename__ = "book_stats"
+
+    book_id = Column(Integer, ForeignKey("books.id"), primary_key=True)
+    review_count = Column(Integer, nullable=False, default=0, server_default="0")
+    rating_sum = Column(Integer, nullable=False, default=0, server_default="0")
+    sentiment_sum = Column(Float, nullable=False, default=0.0, server_default="0")
+    sentiment_count = Column(Integer, nullable=False, default=0, server_default="0")
+    current_borrower_id = Column(Integer, ForeignKey("users.id"), nullable=True)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    book = relationship("Book", back_populates="stats")
+
+
+class Blob(Base):
+    """A content-addressed stored object shared by every book with the same bytes."""
+
+    __tablename__ = "blobs"
+
+    sha256 = Column(String(64), primary_key=True)
+    key = Column(String, nullable=False)
+    size = Column(BigInteger, nullable=False)
+    ref_count = Column(Integer, nullable=False, default=0, server_default="0")
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class BookText(Base):
+    """Pointer to a book's extracted text, stored as per-page zlib frames."""
+
+    __tablename__ = "book_texts"
+
+    book_id = Column(Integer, ForeignKey("books.id"), primary_key=True)
+    key = Column(String, nullable=False)
+    sha256 = Column(String(64), nullable=False)
+    page_offsets = Column(Text, nullable=False)  # JSON list of frame byte offsets
+    page_count = Column(Integer, nullable=False)
+    char_count = Column(Integer, nullable=False)
+    # False when extraction stopped early (timeout or parse error): never shared, re-extracted on refresh.
+    complete = Column(Boolean, nullable=False, default=True, server_default=true())
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class LLMCacheEntry(Base):
+    """Persistent tier of the LLM response cache, keyed on a hash of model, prompt version and input."""
+
+    __tablename__ = "llm_cache"
+
+    key = Column(String(64), primary_key=True)
+    kind = Column(String(32), nullable=False)
+    model = Column(String, nullable=False)
+    prompt_version = Column(Integer, nullable=False)
+    value = Column(Text, nullable=False)  # JSON
+    created_at = Column(DateTime, nullable=False)
+    expires_at = Column(DateTime, nullable=False, index=True)
+
+
+class SummaryChunk(Base):
+    """Checkpointed partial summary of a book, so an interrupted map-reduce run can resume."""
+
+    __tablename__ = "summary_chunks"
+
+    book_id = Column(Integer, ForeignKey("books.id"), primary_key=True)
+    level = Column(Integer, primary_key=True)  # 0 = section summaries, 1+ = combine rounds
+    chunk_index = Column(Integer, primary_key=True)
+    source_sha256 = Column(String(64), nullable=False)  # text artifact the run was built from
+    prompt_version = Column(Integer, nullable=False)
+    summary = Column(Text, nullable=False)
+    prompt_tokens = Column(Integer, nullable=False, default=0)
+    completion_tokens = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class Job(Base):
+    """Durable background job, claimed by workers with FOR UPDATE SKIP LOCKED."""
+
+    __tablename__ = "jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    kind = Column(String(64), nullable=False)
+    payload = Column(Text, nullable=False, default="{}")  # JSON
+    status = Column(String(16), nullable=False, default="queued")  # queued|running|succeeded|dead
+    idempotency_key = Column(String(255), unique=True)
+    # At most one queued job per coalesce key; later triggers fold into it.
+    coalesce_key = Column(String(255))
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False, default=5)
+    run_at = Column(DateTime, nullable=False)
+    locked_by = Column(String(255))
+    locked_at = Column(DateTime)
+    last_error = Column(Text)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    finished_at = Column(DateTime)
+
+    __table_args__ = (
+        Index("ix_jobs_status_run_at", "status", "run_at"),
+        Index(
+            "uq_jobs_coalesce_key_queued",
+            "coalesce_key",
+            unique=True,
+            postgresql_where=text("status = 'queued'"),
+            sqlite_where=text("status = 'queued'"),
+        ),
+        Index("ix_jobs_coalesce_key_status", "coalesce_key", "status"),
+    )
@@ -1,8 +1,17 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from app.api.routes import auth, books, llm
+from app.api.routes import auth, books, jobs, llm, metrics
+from app.core.config import settings
+from app.db.migrations import run_migrations
 from app.db.session import engine
-from app.db.base import Base
+from app.services.book_index import warm_book_index
+from app.services.book_vectors import warm_book_vectors
+from app.services.extraction import shutdown_extraction_pool, start_extraction_pool
+from app.services.item_similarity import warm_item_similarity
+from app.services.llm import shutdown_llm_client, start_llm_client
+from app.services.search_index import shutdown_search_indexer, start_search_indexer
+from app.services.storage import shutdown_storage, start_storage
+from app.tasks.worker import shutdown_worker, start_worker
 
 app = FastAPI(title="LuminaLib API")
 
@@ -17,11 +26,35 @@ app.add_middleware(
 
 app.include_router(auth.router, prefix="/auth", tags=["auth"])
 app.include_router(books.router, prefix="/books", tags=["books"])
+app.include_router(jobs.router, prefix="/jobs", tags=["jobs"])
 app.include_router(llm.router, prefix="/llm", tags=["llm"])
+app.include_router(metrics.router, prefix="/metrics", tags=["metrics"])
 
 
 @app.on_event("startup")
 async def on_startup():
-    # ensure database tables exist
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+    # bring the schema up to the latest Alembic revision
+    await run_migrations(engine)
+    start_extraction_pool()
+    # one backend (and S3 client / connection pool) shared by all requests and tasks
+    start_storage()
+    start_llm_client()
+    # inverted index behind content-based recommendations
+    await warm_book_index()
+    # the collaborative and vector models take seconds to build; recommendations skip them until then
+    warm_item_similarity()
+    await warm_book_vectors()
+    # keeps the on-disk full-text index behind GET /books/search current
+    start_search_indexer()
+    if settings.job_worker_in_process:
+        start_worker()
+
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    # stop claiming jobs first; running ones may still need storage and the LLM client
+    await shutdown_worker()
+    await shutdown_search_indexer()
+    shutdown_extraction_pool()
+    shutdown_storage()
+    await shutdown_llm_client()
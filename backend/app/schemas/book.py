@@ -37,4 +37,27 @@ class BookUpdate(BaseModel):
 
 class BookList(BaseModel):
     items: list[BookRead]
-    page: int
+    page: Optional[int] = None
+    page_size: int
+    next_cursor: Optional[str] = None
+    total_estimate: Optional[int] = None
+
+
+class BookSearchHit(BookRead):
+    score: float
+    snippet: Optional[str] = None
+
+
+class BookSearchResults(BaseModel):
+    items: list[BookSearchHit]
+    limit: int
+    offset: int
+    next_offset: Optional[int] = None
+
+
+class BookSimilarHit(BookRead):
+    score: float
+
+
+class BookSimilarList(BaseModel):
+    items: list[BookSimilarHit]
@@ -0,0 +1,85 @@
+from sqlalchemy import delete, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db import models
+from app.services.storage import StorageBackend, StoredObject
+
+SUMMARY_FAILED = "__SUMMARY_FAILED__"
+
+
+async def acquire_blob(db: AsyncSession, stored: StoredObject) -> str:
+    """Record one more reference to a content-addressed object; return its canonical key."""
+    dialect_insert = postgresql.insert if db.bind.dialect.name == "postgresql" else sqlite.insert
+    stmt = dialect_insert(models.Blob).values(
+        sha256=stored.sha256, key=stored.key, size=stored.size, ref_count=1
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[models.Blob.sha256],
+        set_={"ref_count": models.Blob.ref_count + 1},
+    ).returning(models.Blob.key)
+    return (await db.execute(stmt)).scalar_one()
+
+
+async def release_blob(db: AsyncSession, sha256: str) -> bool:
+    """Drop one reference; True once nothing refers to the blob, so ``reap_blob`` can remove it.
+
+    The row stays at zero until then, so an upload of the same bytes in between
+    takes it back and keeps the object.
+    """
+    row = (
+        await db.execute(
+            update(models.Blob)
+            .where(models.Blob.sha256 == sha256)
+            .values(ref_count=models.Blob.ref_count - 1)
+            .returning(models.Blob.ref_count)
+        )
+    ).first()
+    return row is not None and row.ref_count <= 0
+
+
+async def find_blob(db: AsyncSession, sha256: str | None, key: str) -> models.Blob | None:
+    """The blob row behind key, if the object is reference counted."""
+    if not sha256:
+        return None
+    blob = await db.get(models.Blob, sha256)
+    return blob if blob is not None and blob.key == key else None
+
+
+async def reap_blob(db: AsyncSession, storage: StorageBackend, sha256: str) -> None:
+    """Delete an unreferenced blob's row and object in one transaction. Commits.
+
+    The row is deleted first and stays locked while the object is removed, so an
+    upload of the same bytes waits for it and then, finding no row, stores the
+    bytes again (``acquire_blob`` runs before the existence check; see
+    ``StorageBackend.save_stream``). A blob referenced again meanwhile is kept.
+    """
+    key = (
+        await db.execute(
+            delete(models.Blob)
+            .where(models.Blob.sha256 == sha256, models.Blob.ref_count <= 0)
+            .returning(models.Blob.key)
+        )
+    ).scalar_one_or_none()
+    if key is not None:
+        try:
+            await storage.delete(key)
+        except BaseException:
+            await db.rollback()
+            raise
+    await db.commit()
+
+
+async def find_reusable_summary(db: AsyncSession, sha256: str) -> str | None:
+    """Summary of an earlier upload with identical content, if it finished."""
+    stmt = (
+        select(models.Book.summary)
+        .where(
+            models.Book.content_hash == sha256,
+            models.Book.summary.is_not(None),
+            models.Book.summary != SUMMARY_FAILED,
+        )
+        .order_by(models.Book.id)
+        .limit(1)
+    )
+    return (await db.execute(stmt)).scalar_one_or_none()
@@ -0,0 +1,170 @@
+"""In-memory inverted index over the catalog for content-based recommendations.
+
+Maps keyword tokens and lower-cased authors to book ids, so scoring a user's
+liked keywords and authors touches only the books that match them. Books are
+tokenized with the same rule that extracts keywords from reviews.
+
+The index is built on startup (or first use) and kept current by the
+``book_changed``/``book_deleted`` events published in this process. Writes made
+by other processes (a standalone job worker) are picked up every
+``book_index_sync_seconds`` by reading books whose ``updated_at`` moved.
+Either way, a book whose indexed content changed is announced with a
+``book_indexed`` event so result caches can drop what it affects.
+"""
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.events import BOOK_CHANGED, BOOK_DELETED, BOOK_INDEXED, events
+from app.core.metrics import metrics
+from app.db import models
+from app.db.session import AsyncSessionLocal
+from app.services.preferences import extract_keywords
+
+SYNC_OVERLAP_SECONDS = 60
+
+_COLUMNS = (
+    models.Book.id,
+    models.Book.title,
+    models.Book.author,
+    models.Book.description,
+    models.Book.summary,
+    models.Book.updated_at,
+)
+
+
+def book_tokens(title, author, description, summary) -> set[str]:
+    return set(extract_keywords(f"{title or ''} {author or ''} {description or ''} {summary or ''}"))
+
+
+class BookIndex:
+    def __init__(self):
+        self.keywords: dict[str, set[int]] = defaultdict(set)
+        self.authors: dict[str, set[int]] = defaultdict(set)
+        self._tokens: dict[int, set[str]] = {}
+        self._author: dict[int, str] = {}
+        self.watermark: datetime | None = None
+        self.synced_at = 0.0
+
+    def __len__(self) -> int:
+        return len(self._tokens)
+
+    def put(self, book_id: int, title, author, description, summary) -> bool:
+        """Index a book; return whether its tokens or author differ from before."""
+        tokens = book_tokens(title, author, description, summary)
+        key = author.strip().lower() if author else None
+        if book_id in self._tokens and self._tokens[book_id] == tokens and self._author.get(book_id) == key:
+            return False
+        self.remove(book_id)
+        for token in tokens:
+            self.keywords[token].add(book_id)
+        self._tokens[book_id] = tokens
+        if key:
+            self.authors[key].add(book_id)
+            self._author[book_id] = key
+        return True
+
+    def remove(self, book_id: int) -> None:
+        for token in self._tokens.pop(book_id, ()):
+            ids = self.keywords[token]
+            ids.discard(book_id)
+            if not ids:
+                del self.keywords[token]
+        author = self._author.pop(book_id, None)
+        if author is not None:
+            self.authors[author].discard(book_id)
+            if not self.authors[author]:
+                del self.authors[author]
+
+    def keyword_hits(self, keywords: set[str]) -> dict[int, int]:
+        hits: dict[int, int] = defaultdict(int)
+        for keyword in keywords:
+            for book_id in self.keywords.get(keyword, ()):
+                hits[book_id] += 1
+        return hits
+
+    def books_by_authors(self, authors: set[str]) -> set[int]:
+        matched: set[int] = set()
+        for author in authors:
+            matched |= self.authors.get(author, set())
+        return matched
+
+    def _load(self, rows, announce: bool = False) -> None:
+        for book_id, title, author, description, summary, updated_at in rows:
+            if self.put(book_id, title, author, description, summary) and announce:
+                self._announce(book_id)
+            if updated_at is not None and (self.watermark is None or updated_at > self.watermark):
+                self.watermark = updated_at
+
+    def _announce(self, book_id: int) -> None:
+        events.publish(
+            BOOK_INDEXED, book_id=book_id, tokens=self._tokens[book_id], author=self._author.get(book_id)
+        )
+
+
+_index: BookIndex | None = None
+
+
+def _on_book_changed(book: models.Book) -> None:
+    if _index is not None and _index.put(book.id, book.title, book.author, book.description, book.summary):
+        _index._announce(book.id)
+
+
+def _on_book_deleted(book_id: int) -> None:
+    if _index is not None:
+        _index.remove(book_id)
+
+
+events.subscribe(BOOK_CHANGED, _on_book_changed)
+events.subscribe(BOOK_DELETED, _on_book_deleted)
+
+
+async def build_book_index(db: AsyncSession) -> BookIndex:
+    """Index the whole catalog and make it the current index."""
+    global _index
+    started = time.perf_counter()
+    index = BookIndex()
+    result = await db.stream(select(*_COLUMNS).execution_options(yield_per=1000))
+    async for rows in result.partitions():
+        index._load(rows)
+    index.synced_at = time.monotonic()
+    _index = index
+    metrics.observe("book_index.build_seconds", time.perf_counter() - started)
+    metrics.set_gauge("book_index.books", len(index))
+    metrics.set_gauge("book_index.tokens", len(index.keywords))
+    return index
+
+
+async def get_book_index(db: AsyncSession) -> BookIndex:
+    """The current index, built on first use and caught up with other processes' writes."""
+    if _index is None:
+        return await build_book_index(db)
+    if time.monotonic() - _index.synced_at >= settings.book_index_sync_seconds:
+        await _catch_up(db, _index)
+    return _index
+
+
+async def _catch_up(db: AsyncSession, index: BookIndex) -> None:
+    stmt = select(*_COLUMNS)
+    if index.watermark is not None:
+        # Overlap the window: a write stamped before the watermark may commit after we read it.
+        # Re-indexing a book is idempotent.
+        since = index.watermark - timedelta(seconds=SYNC_OVERLAP_SECONDS)
+        stmt = stmt.where(models.Book.updated_at >= since)
+    index._load((await db.execute(stmt)).all(), announce=True)
+    index.synced_at = time.monotonic()
+    metrics.inc("book_index.syncs")
+
+
+async def warm_book_index() -> None:
+    async with AsyncSessionLocal() as db:
+        await build_book_index(db)
+
+
+def reset_book_index() -> None:
+    global _index
+    _index = None
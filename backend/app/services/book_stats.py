@@ -0,0 +1,146 @@
+import logging
+
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db import models
+
+logger = logging.getLogger(__name__)
+
+# The helpers below only stage changes on the caller's session. Call them after
+# staging the review/borrow write they describe, then commit both together.
+
+
+async def init_book_stats(db: AsyncSession, book_id: int) -> None:
+    db.add(models.BookStats(book_id=book_id))
+
+
+async def record_review(db: AsyncSession, book_id: int, rating: int) -> None:
+    await _apply(
+        db,
+        book_id,
+        review_count=models.BookStats.review_count + 1,
+        rating_sum=models.BookStats.rating_sum + rating,
+    )
+
+
+async def record_sentiment(
+    db: AsyncSession, book_id: int, previous: float | None, score: float | None
+) -> None:
+    if previous is None and score is None:
+        return
+    count_delta = (score is not None) - (previous is not None)
+    sum_delta = (score or 0.0) - (previous or 0.0)
+    await _apply(
+        db,
+        book_id,
+        sentiment_sum=models.BookStats.sentiment_sum + sum_delta,
+        sentiment_count=models.BookStats.sentiment_count + count_delta,
+    )
+
+
+async def set_current_borrower(db: AsyncSession, book_id: int, user_id: int | None) -> None:
+    await _apply(db, book_id, current_borrower_id=user_id)
+
+
+async def get_book_stats(db: AsyncSession, book_id: int) -> models.BookStats | None:
+    return await db.get(models.BookStats, book_id)
+
+
+async def delete_book_stats(db: AsyncSession, book_id: int) -> None:
+    await db.execute(delete(models.BookStats).where(models.BookStats.book_id == book_id))
+
+
+async def _apply(db: AsyncSession, book_id: int, **values) -> None:
+    result = await db.execute(
+        update(models.BookStats)
+        .where(models.BookStats.book_id == book_id)
+        .values(**values)
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount == 0:
+        # Row missing (e.g. removed by hand): derive it from the source tables,
+        # which already include the caller's pending write after autoflush.
+        expected = await _compute_stats(db, [book_id])
+        db.add(models.BookStats(book_id=book_id, **expected.get(book_id, _empty_stats())))
+
+
+def _empty_stats() -> dict:
+    return {
+        "review_count": 0,
+        "rating_sum": 0,
+        "sentiment_sum": 0.0,
+        "sentiment_count": 0,
+        "current_borrower_id": None,
+    }
+
+
+async def _compute_stats(db: AsyncSession, book_ids: list[int] | None = None) -> dict[int, dict]:
+    review_stmt = select(
+        models.Review.book_id,
+        func.count(models.Review.id),
+        func.coalesce(func.sum(models.Review.rating), 0),
+        func.coalesce(func.sum(models.Review.sentiment_score), 0.0),
+        func.count(models.Review.sentiment_score),
+    ).group_by(models.Review.book_id)
+    borrow_stmt = (
+        select(models.Borrow.book_id, models.Borrow.user_id)
+        .where(models.Borrow.returned_at.is_(None))
+        .order_by(models.Borrow.borrowed_at)
+    )
+    book_stmt = select(models.Book.id)
+    if book_ids is not None:
+        review_stmt = review_stmt.where(models.Review.book_id.in_(book_ids))
+        borrow_stmt = borrow_stmt.where(models.Borrow.book_id.in_(book_ids))
+        book_stmt = book_stmt.where(models.Book.id.in_(book_ids))
+
+    expected = {book_id: _empty_stats() for (book_id,) in (await db.execute(book_stmt)).all()}
+    for book_id, count, rating_sum, sentiment_sum, sentiment_count in (await db.execute(review_stmt)).all():
+        if book_id in expected:
+            expected[book_id].update(
+                review_count=count,
+                rating_sum=int(rating_sum),
+                sentiment_sum=float(sentiment_sum),
+                sentiment_count=sentiment_count,
+            )
+    for book_id, user_id in (await db.execute(borrow_stmt)).all():
+        if book_id in expected:
+            expected[book_id]["current_borrower_id"] = user_id
+    return expected
+
+
+async def rebuild_book_stats(db: AsyncSession) -> int:
+    """Recompute every book_stats row from the source tables; return rows corrected."""
+    expected = await _compute_stats(db)
+    existing = {row.book_id: row for row in (await db.execute(select(models.BookStats))).scalars()}
+
+    corrected = 0
+    for book_id, values in expected.items():
+        row = existing.pop(book_id, None)
+        if row is None:
+            db.add(models.BookStats(book_id=book_id, **values))
+            corrected += 1
+            continue
+        drift = {
+            field: value
+            for field, value in values.items()
+            if not _same(getattr(row, field), value)
+        }
+        if drift:
+            logger.warning("book_stats drift for book_id=%s: %s", book_id, drift)
+            for field, value in drift.items():
+                setattr(row, field, value)
+            corrected += 1
+
+    for orphan in existing.values():
+        await db.delete(orphan)
+        corrected += 1
+
+    await db.commit()
+    return corrected
+
+
+def _same(current, value) -> bool:
+    if isinstance(value, float):
+        return current is not None and abs(float(current) - value) < 1e-9
+    return current == value
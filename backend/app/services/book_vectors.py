@@ -0,0 +1,470 @@
+"""Dense book vectors for similar-book lookups, computed locally on CPU.
+
+A book's title, author, description and summary become a TF-IDF vector over
+hashed tokens (``HASH_FEATURES`` buckets, so no vocabulary is kept), which a
+randomized truncated SVD reduces to ``vector_dim`` dimensions (latent semantic
+analysis). Vectors are L2-normalised, so a dot product is their cosine.
+
+The vectors are written to ``vector_path`` as a float32 matrix and served from
+a memory map, next to the model (IDF weights and SVD components) and an IVF
+index: k-means splits the vectors into about sqrt(n) lists, and a query scans
+only the ``vector_ann_probes`` lists whose centroids are closest.
+
+Books changed after the build are projected with the stored model on the
+``book_changed`` event and kept in memory beside the matrix until the next
+rebuild (every ``vector_rebuild_seconds``, once that overlay outgrows
+``EXTRA_REBUILD_FRACTION`` of the catalog, or ``python -m app.tasks.vector_tasks``).
+Writes from other processes are read from ``books.updated_at`` every
+``book_index_sync_seconds``.
+
+Builds in different processes take a lock file in ``vector_path``; one that gets
+the lock after another process saved a newer build loads that instead of fitting.
+"""
+import asyncio
+import fcntl
+import math
+import os
+import time
+import zipfile
+import zlib
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from pathlib import Path
+from uuid import uuid4
+
+import numpy as np
+from scipy import sparse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.events import BOOK_CHANGED, BOOK_DELETED, events
+from app.core.metrics import metrics
+from app.db import models
+from app.db.session import AsyncSessionLocal
+from app.services.preferences import extract_keywords
+
+HASH_FEATURES = 1 << 16
+SVD_OVERSAMPLE = 10
+SVD_POWER_ITERATIONS = 2
+KMEANS_ITERATIONS = 10
+KMEANS_SAMPLE = 50_000
+ASSIGN_CHUNK = 10_000
+SYNC_OVERLAP_SECONDS = 60
+MIN_SIMILARITY = 0.01  # below this, books share nothing but hash collisions and noise
+EXTRA_REBUILD_FRACTION = 0.1
+EXTRA_REBUILD_MIN = 1000
+VECTORS_FILE = "vectors.f32"
+MODEL_FILE = "model.npz"
+LOCK_FILE = "build.lock"
+BUILD_ID_BYTES = 16  # header of the vectors file; must match the model's build_id
+
+_COLUMNS = (
+    models.Book.id,
+    models.Book.title,
+    models.Book.author,
+    models.Book.description,
+    models.Book.summary,
+    models.Book.updated_at,
+)
+
+
+def book_features(title, author, description, summary) -> Counter:
+    """Hashed token counts of a book; the author counts as one extra token."""
+    words = extract_keywords(f"{title or ''} {description or ''} {summary or ''}")
+    if author:
+        words.append(f"author:{author.strip().lower()}")
+    return Counter(zlib.crc32(word.encode("utf-8")) % HASH_FEATURES for word in words)
+
+
+def _tfidf(features: list[Counter], idf: np.ndarray | None) -> tuple[sparse.csr_matrix, np.ndarray]:
+    """Rows of sublinear TF-IDF, L2-normalised; computes the IDF weights when not given."""
+    indptr, indices, data = [0], [], []
+    for counts in features:
+        indices.extend(counts)
+        data.extend(1.0 + math.log(count) for count in counts.values())
+        indptr.append(len(indices))
+    matrix = sparse.csr_matrix(
+        (np.asarray(data, np.float32), np.asarray(indices, np.int64), np.asarray(indptr, np.int64)),
+        shape=(len(features), HASH_FEATURES),
+    )
+    if idf is None:
+        df = np.bincount(matrix.indices, minlength=HASH_FEATURES)
+        idf = (np.log((1 + len(features)) / (1 + df)) + 1).astype(np.float32)
+    matrix = (matrix @ sparse.diags(idf)).tocsr()
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    matrix = (sparse.diags(1 / np.maximum(norms, 1e-12)) @ matrix).tocsr()
+    return matrix, idf
+
+
+def _normalise(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return (vectors / np.maximum(norms, 1e-12)).astype(np.float32)
+
+
+def _svd_components(matrix: sparse.csr_matrix, dim: int, rng: np.random.Generator) -> np.ndarray:
+    """Top ``dim`` right singular vectors (features x dim) by randomized range finding."""
+    rank = min(dim + SVD_OVERSAMPLE, *matrix.shape)
+    sketch = matrix @ rng.standard_normal((matrix.shape[1], rank), dtype=np.float32)
+    for _ in range(SVD_POWER_ITERATIONS):
+        sketch, _ = np.linalg.qr(sketch)
+        sketch = matrix @ (matrix.T @ sketch)
+    basis, _ = np.linalg.qr(sketch)
+    _, _, vt = np.linalg.svd(np.asarray((matrix.T @ basis).T), full_matrices=False)
+    return np.ascontiguousarray(vt[:dim].T, dtype=np.float32)
+
+
+def _ivf(vectors: np.ndarray, rng: np.random.Generator) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Spherical k-means over about sqrt(n) lists; return centroids, row order and list offsets."""
+    n = len(vectors)
+    lists = max(1, round(math.sqrt(n)))
+    sample = vectors[rng.choice(n, min(n, KMEANS_SAMPLE), replace=False)]
+    centroids = sample[rng.choice(len(sample), lists, replace=False)]
+    for _ in range(KMEANS_ITERATIONS):
+        assign = np.argmax(sample @ centroids.T, axis=1)
+        members = sparse.csr_matrix(
+            (np.ones(len(sample), np.float32), (assign, np.arange(len(sample)))), shape=(lists, len(sample))
+        )
+        sums = np.asarray(members @ sample)
+        filled = np.asarray(members.sum(axis=1)).ravel() > 0
+        centroids[filled] = _normalise(sums[filled])
+    assign = np.concatenate(
+        [np.argmax(vectors[i : i + ASSIGN_CHUNK] @ centroids.T, axis=1) for i in range(0, n, ASSIGN_CHUNK)]
+    )
+    offsets = np.concatenate([[0], np.cumsum(np.bincount(assign, minlength=lists))])
+    return centroids, np.argsort(assign, kind="stable"), offsets
+
+
+def fit(ids: list[int], features: list[Counter], dim: int, seed: int = 0) -> dict[str, np.ndarray]:
+    """Fit the model on a catalog and return everything ``save`` writes."""
+    rng = np.random.default_rng(seed)
+    matrix, idf = _tfidf(features, None)
+    dim = max(1, min(dim, len(ids)))
+    if not ids:
+        empty = np.empty(0, np.int64)
+        return {
+            "ids": empty,
+            "vectors": np.zeros((0, dim), np.float32),
+            "idf": idf,
+            "components": np.zeros((HASH_FEATURES, dim), np.float32),
+            "centroids": np.zeros((0, dim), np.float32),
+            "list_order": empty,
+            "list_offsets": np.zeros(1, np.int64),
+        }
+    components = _svd_components(matrix, dim, rng)
+    vectors = _normalise(np.asarray(matrix @ components))
+    centroids, list_order, list_offsets = _ivf(vectors, rng)
+    return {
+        "ids": np.asarray(ids, np.int64),
+        "vectors": vectors,
+        "idf": idf,
+        "components": components,
+        "centroids": centroids,
+        "list_order": list_order,
+        "list_offsets": list_offsets,
+    }
+
+
+def save(directory: Path, arrays: dict[str, np.ndarray], watermark: datetime | None) -> None:
+    directory.mkdir(parents=True, exist_ok=True)
+    build_id = uuid4().bytes
+    tmp_vectors = directory / f".{os.getpid()}.{build_id.hex()}.{VECTORS_FILE}"
+    tmp_model = directory / f".{os.getpid()}.{build_id.hex()}.{MODEL_FILE}"
+    try:
+        with open(tmp_vectors, "wb") as f:
+            f.write(build_id)
+            arrays["vectors"].astype(np.float32).tofile(f)
+        model = {name: array for name, array in arrays.items() if name != "vectors"}
+        stamp = np.array(watermark.isoformat() if watermark else "")
+        np.savez(tmp_model, watermark=stamp, build_id=np.frombuffer(build_id, np.uint8), **model)
+        # Readers map the old file until they reload; replacing it leaves their mapping intact.
+        os.replace(tmp_vectors, directory / VECTORS_FILE)
+        os.replace(tmp_model, directory / MODEL_FILE)
+    finally:
+        tmp_vectors.unlink(missing_ok=True)
+        tmp_model.unlink(missing_ok=True)
+
+
+@contextmanager
+def build_lock(directory: Path):
+    """Hold the cross-process build lock for ``directory``."""
+    directory.mkdir(parents=True, exist_ok=True)
+    with open(directory / LOCK_FILE, "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+class BookVectors:
+    def __init__(self, arrays: dict[str, np.ndarray], watermark: datetime | None, probes: int):
+        self.ids = arrays["ids"]
+        self.vectors = arrays["vectors"]
+        self.idf = arrays["idf"]
+        self.components = arrays["components"]
+        self.centroids = arrays["centroids"]
+        self.list_order = arrays["list_order"]
+        self.list_offsets = arrays["list_offsets"]
+        self.probes = max(1, probes)
+        self.row_of = {int(book_id): row for row, book_id in enumerate(self.ids)}
+        # Changes since the build: re-projected books, and books to leave out.
+        self.extra: dict[int, np.ndarray] = {}
+        self.removed: set[int] = set()
+        self._overlay: tuple[np.ndarray, np.ndarray, np.ndarray] | None = None
+        self.watermark = watermark
+        self.synced_at = 0.0
+        self.model_mtime = 0.0
+
+    @property
+    def dim(self) -> int:
+        return self.components.shape[1]
+
+    def project(self, title, author, description, summary) -> np.ndarray:
+        matrix, _ = _tfidf([book_features(title, author, description, summary)], self.idf)
+        return _normalise(np.asarray(matrix @ self.components)[0])
+
+    def put(self, book_id: int, title, author, description, summary) -> None:
+        self.extra[book_id] = self.project(title, author, description, summary)
+        self.removed.discard(book_id)
+        self._overlay = None
+
+    def remove(self, book_id: int) -> None:
+        self.extra.pop(book_id, None)
+        self.removed.add(book_id)
+        self._overlay = None
+
+    def overlay(self) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Ids and stacked vectors of the changed books, and the base ids they shadow."""
+        if self._overlay is None:
+            ids = np.fromiter(self.extra, np.int64, len(self.extra))
+            matrix = np.zeros((0, self.dim), np.float32)
+            if self.extra:
+                matrix = np.stack(list(self.extra.values()))
+            self._overlay = ids, matrix, np.fromiter({*self.removed, *self.extra}, np.int64)
+        return self._overlay
+
+    @property
+    def outgrown(self) -> bool:
+        """Whether enough books changed since the build that queries should wait for a refit."""
+        return len(self.extra) > max(EXTRA_REBUILD_MIN, EXTRA_REBUILD_FRACTION * len(self.ids))
+
+    def vector_for(self, book_id: int) -> np.ndarray | None:
+        if book_id in self.extra:
+            return self.extra[book_id]
+        row = self.row_of.get(book_id)
+        if row is None or book_id in self.removed:
+            return None
+        return np.asarray(self.vectors[row])
+
+    def nearest(self, query: np.ndarray, k: int, exclude=()) -> list[tuple[int, float]]:
+        """Approximately the k book ids most similar to ``query``, best first."""
+        extra_ids, extra_vectors, stale = self.overlay()
+        ids = np.empty(0, np.int64)
+        sims = np.empty(0, np.float32)
+        if len(self.centroids):
+            probes = min(self.probes, len(self.centroids))
+            lists = np.argpartition(-(self.centroids @ query), probes - 1)[:probes]
+            rows = np.concatenate(
+                [self.list_order[self.list_offsets[i] : self.list_offsets[i + 1]] for i in lists]
+            )
+            rows.sort()  # sequential reads from the memory map
+            # Base rows of re-projected or removed books are stale.
+            rows = rows[~np.isin(self.ids[rows], stale)]
+            ids, sims = self.ids[rows], np.asarray(self.vectors[rows]) @ query
+        if len(extra_ids):
+            ids = np.concatenate([ids, extra_ids])
+            sims = np.concatenate([sims, extra_vectors @ query])
+        keep = sims >= MIN_SIMILARITY
+        if exclude:
+            keep &= ~np.isin(ids, np.fromiter(exclude, np.int64))
+        ids, sims = ids[keep], sims[keep]
+        if len(ids) > k:
+            top = np.argpartition(-sims, k - 1)[:k]
+            ids, sims = ids[top], sims[top]
+        order = np.lexsort((ids, -sims))
+        return [(int(ids[i]), float(sims[i])) for i in order]
+
+    def scores_for(self, liked_book_ids: set[int], exclude: set[int], k: int) -> dict[int, float]:
+        """Cosine of the nearest books to the mean of the liked books' vectors."""
+        liked = [vector for book_id in liked_book_ids if (vector := self.vector_for(book_id)) is not None]
+        if not liked:
+            return {}
+        profile = _normalise(np.sum(liked, axis=0))
+        return dict(self.nearest(profile, k, exclude))
+
+
+def load(directory: Path, probes: int) -> BookVectors | None:
+    """Open a saved build, memory-mapping the vectors; None when missing or torn."""
+    model_path, vectors_path = directory / MODEL_FILE, directory / VECTORS_FILE
+    try:
+        model_mtime = model_path.stat().st_mtime
+        with np.load(model_path) as model:
+            arrays = {name: model[name] for name in model.files if name not in ("watermark", "build_id")}
+            stamp = str(model["watermark"])
+            build_id = model["build_id"].tobytes()
+        n, dim = len(arrays["ids"]), arrays["components"].shape[1]
+        with open(vectors_path, "rb") as f:
+            header = f.read(BUILD_ID_BYTES)
+            size = os.fstat(f.fileno()).st_size
+    except (OSError, ValueError, KeyError, zipfile.BadZipFile):
+        return None  # missing, or written by something other than save()
+    if header != build_id or size != BUILD_ID_BYTES + n * dim * 4:
+        return None  # the two files are from different builds (between the renames in save())
+    if n:
+        arrays["vectors"] = np.memmap(
+            vectors_path, dtype=np.float32, mode="r", offset=BUILD_ID_BYTES, shape=(n, dim)
+        )
+    else:
+        arrays["vectors"] = np.zeros((0, dim), np.float32)  # an empty file cannot be mapped
+    vectors = BookVectors(arrays, datetime.fromisoformat(stamp) if stamp else None, probes)
+    vectors.model_mtime = model_mtime
+    return vectors
+
+
+_vectors: BookVectors | None = None
+_building: asyncio.Task | None = None
+
+
+def vector_dir() -> Path:
+    return Path(settings.vector_path or Path(settings.storage_path) / "vectors")
+
+
+def _on_book_changed(book: models.Book) -> None:
+    if _vectors is not None:
+        _vectors.put(book.id, book.title, book.author, book.description, book.summary)
+
+
+def _on_book_deleted(book_id: int) -> None:
+    if _vectors is not None:
+        _vectors.remove(book_id)
+
+
+events.subscribe(BOOK_CHANGED, _on_book_changed)
+events.subscribe(BOOK_DELETED, _on_book_deleted)
+
+
+async def build_book_vectors(db: AsyncSession) -> BookVectors:
+    """Fit and save vectors for the whole catalog and make them current."""
+    global _vectors
+    started = time.perf_counter()
+    ids, features, watermark = [], [], None
+    result = await db.stream(select(*_COLUMNS).order_by(models.Book.id).execution_options(yield_per=1000))
+    async for rows in result.partitions():
+        for book_id, title, author, description, summary, updated_at in rows:
+            ids.append(book_id)
+            features.append(book_features(title, author, description, summary))
+            if updated_at is not None and (watermark is None or updated_at > watermark):
+                watermark = updated_at
+
+    started_at = time.time()
+
+    def _fit_and_save() -> BookVectors:
+        directory = vector_dir()
+        with build_lock(directory):
+            # Another process saved a build while we waited: it is at least as recent as ours.
+            latest = load(directory, settings.vector_ann_probes)
+            if latest is not None and latest.model_mtime >= started_at:
+                return latest
+            save(directory, fit(ids, features, settings.vector_dim), watermark)
+            return load(directory, settings.vector_ann_probes)
+
+    # SVD and k-means are CPU-bound; keep them off the event loop.
+    vectors = await asyncio.to_thread(_fit_and_save)
+    if _vectors is not None:
+        # Deletions seen while the build ran; changes are re-read from updated_at.
+        vectors.removed |= _vectors.removed
+    _vectors = vectors
+    metrics.observe("vectors.build_seconds", time.perf_counter() - started)
+    metrics.set_gauge("vectors.books", len(ids))
+    return vectors
+
+
+async def get_book_vectors(db: AsyncSession, wait: bool = True) -> BookVectors | None:
+    """The current vectors: loaded from disk or built on first use, then kept in step.
+
+    Concurrent first requests wait for one shared build rather than each running
+    their own. With ``wait=False`` they get None until that build is done.
+    """
+    global _vectors, _building
+    if _vectors is None:
+        await warm_book_vectors()
+        if _vectors is None:
+            if not wait:
+                return None
+            # Shielded: a cancelled request must not cancel the build the others wait on.
+            await asyncio.shield(_building)
+    stale = time.time() - _vectors.model_mtime >= settings.vector_rebuild_seconds
+    if (stale or _vectors.outgrown) and (_building is None or _building.done()):
+        _building = asyncio.create_task(_rebuild())
+    if time.monotonic() - _vectors.synced_at >= settings.book_index_sync_seconds:
+        await _sync(db)
+    return _vectors
+
+
+async def _sync(db: AsyncSession) -> None:
+    global _vectors
+    # Rebuilt by another process (the rebuild command): switch to the new files.
+    model_path = vector_dir() / MODEL_FILE
+    if model_path.exists() and model_path.stat().st_mtime > _vectors.model_mtime:
+        loaded = await asyncio.to_thread(load, vector_dir(), settings.vector_ann_probes)
+        if loaded is not None:
+            loaded.removed |= _vectors.removed
+            _vectors = loaded
+    vectors = _vectors
+    stmt = select(*_COLUMNS)
+    if vectors.watermark is not None:
+        # Overlap the window: a write stamped before the watermark may commit after we read it.
+        since = vectors.watermark - timedelta(seconds=SYNC_OVERLAP_SECONDS)
+        stmt = stmt.where(models.Book.updated_at >= since)
+    for book_id, title, author, description, summary, updated_at in (await db.execute(stmt)).all():
+        vectors.put(book_id, title, author, description, summary)
+        if updated_at is not None and (vectors.watermark is None or updated_at > vectors.watermark):
+            vectors.watermark = updated_at
+    vectors.synced_at = time.monotonic()
+
+
+async def _rebuild() -> None:
+    async with AsyncSessionLocal() as db:
+        await build_book_vectors(db)
+
+
+async def warm_book_vectors() -> None:
+    """Load the saved vectors, or start building them in the background if there are none."""
+    global _vectors, _building
+    if _vectors is not None or (_building is not None and not _building.done()):
+        return
+    loaded = await asyncio.to_thread(load, vector_dir(), settings.vector_ann_probes)
+    if loaded is not None:
+        _vectors = loaded
+    elif _building is None or _building.done():
+        _building = asyncio.create_task(_rebuild())
+
+
+async def similar_books(db: AsyncSession, book: models.Book, limit: int) -> list[tuple[models.Book, float]]:
+    """Books nearest to ``book`` with their cosine similarity, best first."""
+    vectors = await get_book_vectors(db)
+    query = vectors.vector_for(book.id)
+    if query is None:
+        query = vectors.project(book.title, book.author, book.description, book.summary)
+    started = time.perf_counter()
+    hits = vectors.nearest(query, limit, exclude={book.id})
+    metrics.observe("vectors.query_seconds", time.perf_counter() - started)
+    if not hits:
+        return []
+    ids = [book_id for book_id, _ in hits]
+    books = {
+        found.id: found
+        for found in (await db.execute(select(models.Book).where(models.Book.id.in_(ids)))).scalars()
+    }
+    for book_id in ids:
+        if book_id not in books:
+            vectors.remove(book_id)  # deleted by another process since the last sync
+    return [(books[book_id], sim) for book_id, sim in hits if book_id in books]
+
+
+def reset_book_vectors() -> None:
+    global _vectors, _building
+    _vectors = None
+    _building = None
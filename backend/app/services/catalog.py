@@ -0,0 +1,191 @@
+import base64
+import json
+import time
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Sequence
+
+from sqlalchemy import and_, func, or_, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.db import models
+
+RECENT_REVIEW_LIMIT = 5
+
+_count_cache: dict[str, tuple[float, int]] = {}
+
+
+def summary_status(summary: str | None) -> str:
+    if not summary:
+        return "pending"
+    if summary.strip() == "__SUMMARY_FAILED__":
+        return "failed"
+    return "ready"
+
+
+def clamp_page_size(page_size: int | None) -> int:
+    if not page_size or page_size < 1:
+        return settings.books_page_size
+    return min(page_size, settings.books_max_page_size)
+
+
+def encode_cursor(book: models.Book) -> str:
+    created_at = book.created_at.isoformat() if book.created_at else None
+    raw = json.dumps([created_at, book.id], separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime | None, int]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, book_id = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        return (datetime.fromisoformat(created_at) if created_at else None, int(book_id))
+    except (ValueError, TypeError) as exc:
+        raise ValueError("Invalid cursor") from exc
+
+
+async def fetch_book_page(
+    db: AsyncSession,
+    offset: int = 0,
+    limit: int = 10,
+    after: tuple[datetime | None, int] | None = None,
+    review_limit: int = RECENT_REVIEW_LIMIT,
+) -> tuple[list[dict[str, Any]], str | None]:
+    """Load a page of books with borrowers and review snippets in three queries.
+
+    Pages are ordered on ``(created_at, id)``. When ``after`` is given the page
+    starts right after that position (keyset mode) and ``offset`` is ignored.
+    Returns the page items and the cursor for the next page, if any.
+    """
+    stmt = select(models.Book).order_by(models.Book.created_at, models.Book.id)
+    if after is not None:
+        after_created, after_id = after
+        # Compare against the anchor row's stored value when it still exists, so
+        # the timestamp round-trip through the cursor cannot shift the boundary.
+        anchor_created = func.coalesce(
+            select(models.Book.created_at).where(models.Book.id == after_id).scalar_subquery(),
+            after_created,
+        )
+        stmt = stmt.where(
+            or_(
+                models.Book.created_at > anchor_created,
+                and_(models.Book.created_at == anchor_created, models.Book.id > after_id),
+            )
+        )
+    else:
+        stmt = stmt.offset(offset)
+
+    books = (await db.execute(stmt.limit(limit + 1))).scalars().all()
+    next_cursor = encode_cursor(books[limit - 1]) if len(books) > limit else None
+    items = await build_book_cards(db, books[:limit], review_limit=review_limit)
+    return items, next_cursor
+
+
+async def approximate_book_count(db: AsyncSession) -> int:
+    """Return a cheap, cached estimate of the catalog size."""
+    cached = _count_cache.get("books")
+    now = time.monotonic()
+    if cached and cached[0] > now:
+        return cached[1]
+
+    estimate = -1
+    if db.bind.dialect.name == "postgresql":
+        # Planner statistics; -1 means the table has not been analyzed yet.
+        row = (
+            await db.execute(
+                text("SELECT reltuples::bigint FROM pg_class WHERE oid = 'books'::regclass")
+            )
+        ).first()
+        estimate = int(row[0]) if row else -1
+    if estimate < 0:
+        estimate = (await db.execute(select(func.count(models.Book.id)))).scalar_one()
+
+    _count_cache["books"] = (now + settings.books_count_cache_seconds, estimate)
+    return estimate
+
+
+async def build_book_cards(
+    db: AsyncSession,
+    books: Sequence[models.Book],
+    review_limit: int = RECENT_REVIEW_LIMIT,
+) -> list[dict[str, Any]]:
+    if not books:
+        return []
+
+    book_ids = [book.id for book in books]
+    borrowers = await _current_borrowers(db, book_ids)
+    snippets = await _recent_review_snippets(db, book_ids, review_limit)
+
+    return [
+        {
+            "id": book.id,
+            "title": book.title,
+            "author": book.author,
+            "description": book.description,
+            "summary": book.summary,
+            "summary_status": summary_status(book.summary),
+            "current_borrower": borrowers.get(book.id),
+            "recent_reviews": snippets.get(book.id, []),
+        }
+        for book in books
+    ]
+
+
+async def _current_borrowers(db: AsyncSession, book_ids: list[int]) -> dict[int, str]:
+    stmt = (
+        select(models.BookStats.book_id, models.User.full_name, models.User.email)
+        .join(models.User, models.User.id == models.BookStats.current_borrower_id)
+        .where(models.BookStats.book_id.in_(book_ids))
+    )
+    rows = (await db.execute(stmt)).all()
+    return {book_id: full_name or email for book_id, full_name, email in rows}
+
+
+async def _recent_review_snippets(
+    db: AsyncSession, book_ids: list[int], review_limit: int
+) -> dict[int, list[dict[str, Any]]]:
+    ranked = (
+        select(
+            models.Review.book_id,
+            models.Review.user_id,
+            models.Review.rating,
+            models.Review.comment,
+            func.row_number()
+            .over(
+                partition_by=models.Review.book_id,
+                order_by=(models.Review.created_at.desc(), models.Review.id.desc()),
+            )
+            .label("rn"),
+        )
+        .where(
+            models.Review.book_id.in_(book_ids),
+            models.Review.comment.is_not(None),
+            models.Review.comment != "",
+        )
+        .subquery()
+    )
+    stmt = (
+        select(
+            ranked.c.book_id,
+            models.User.full_name,
+            models.User.email,
+            ranked.c.rating,
+            ranked.c.comment,
+        )
+        .join(models.User, models.User.id == ranked.c.user_id)
+        .where(ranked.c.rn <= review_limit)
+        .order_by(ranked.c.book_id, ranked.c.rn)
+    )
+    rows = (await db.execute(stmt)).all()
+
+    snippets: dict[int, list[dict[str, Any]]] = defaultdict(list)
+    for book_id, full_name, email, rating, comment in rows:
+        snippets[book_id].append(
+            {
+                "reviewer": full_name or email,
+                "rating": rating,
+                "comment": comment,
+            }
+        )
+    return snippets
@@ -0,0 +1,104 @@
+"""Circuit breaker for a flaky upstream.
+
+After ``failure_threshold`` consecutive failures the circuit opens and calls fail
+at once with ``CircuitOpenError`` instead of waiting out their timeouts. While
+open, a background task probes the upstream every ``reset_seconds`` (the circuit
+is half-open during a probe) and closes the circuit when a probe succeeds.
+"""
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Awaitable, Callable
+
+from app.core.metrics import metrics
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling an upstream whose circuit is open."""
+
+
+class CircuitBreaker:
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int,
+        reset_seconds: float,
+        probe: Callable[[], Awaitable[bool]],
+        is_failure: Callable[[BaseException], bool] = lambda exc: True,
+    ):
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_seconds = reset_seconds
+        self.probe = probe
+        self.is_failure = is_failure
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at: float | None = None
+        self._prober: asyncio.Task | None = None
+
+    def check(self) -> None:
+        if self.state != CLOSED:
+            metrics.inc(f"{self.name}.breaker.rejected")
+            raise CircuitOpenError(f"{self.name} circuit is {self.state}; failing fast")
+
+    @asynccontextmanager
+    async def guard(self):
+        """Fail fast when open; otherwise run the block and record how it went."""
+        self.check()
+        try:
+            yield
+        except Exception as exc:
+            if self.is_failure(exc):
+                self.record_failure()
+            raise
+        self.record_success()
+
+    def record_success(self) -> None:
+        self.failures = 0
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.state == CLOSED and self.failures >= self.failure_threshold:
+            self._open()
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.failures,
+            "open_seconds": round(time.monotonic() - self.opened_at, 3) if self.opened_at else 0.0,
+        }
+
+    def close(self) -> None:
+        """Stop the background prober (application shutdown)."""
+        if self._prober is not None:
+            self._prober.cancel()
+            self._prober = None
+
+    def _open(self) -> None:
+        self.state = OPEN
+        self.opened_at = time.monotonic()
+        metrics.inc(f"{self.name}.breaker.opened")
+        metrics.set_gauge(f"{self.name}.breaker.open", 1)
+        if self._prober is None or self._prober.done():
+            self._prober = asyncio.create_task(self._probe_until_healthy())
+
+    async def _probe_until_healthy(self) -> None:
+        while True:
+            await asyncio.sleep(self.reset_seconds)
+            self.state = HALF_OPEN
+            try:
+                healthy = await self.probe()
+            except Exception:
+                healthy = False
+            metrics.inc(f"{self.name}.breaker.probes")
+            if healthy:
+                break
+            self.state = OPEN
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = None
+        metrics.set_gauge(f"{self.name}.breaker.open", 0)
@@ -0,0 +1,198 @@
+"""Text extraction in a bounded process pool, off the event loop."""
+import asyncio
+import codecs
+import logging
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import AsyncIterator
+
+from pypdf import PdfReader
+
+from app.core.config import settings
+from app.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+SUPPORTED_SUFFIXES = frozenset({".txt", ".pdf"})
+# Plain-text files have no pages; they are read in chunks of this size and cut at line breaks.
+TEXT_PAGE_BYTES = 64 * 1024
+
+_executor: ProcessPoolExecutor | None = None
+_slots: asyncio.Semaphore | None = None
+_slots_loop: asyncio.AbstractEventLoop | None = None
+
+
+class ExtractionTimeout(Exception):
+    """Raised when a document takes longer than extraction_timeout_seconds."""
+
+
+def _new_pool() -> ProcessPoolExecutor:
+    # spawn: forking a process that already runs an event loop and DB threads is unsafe
+    return ProcessPoolExecutor(
+        max_workers=settings.extraction_workers,
+        mp_context=multiprocessing.get_context("spawn"),
+    )
+
+
+def start_extraction_pool() -> None:
+    global _executor
+    if _executor is None:
+        _executor = _new_pool()
+
+
+def shutdown_extraction_pool() -> None:
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+    _executor = None
+
+
+def _get_slots() -> asyncio.Semaphore:
+    # One submission slot per worker, so waiting documents queue here where we can count them.
+    global _slots, _slots_loop
+    loop = asyncio.get_running_loop()
+    if _slots is None or _slots_loop is not loop:
+        _slots = asyncio.Semaphore(settings.extraction_workers)
+        _slots_loop = loop
+    return _slots
+
+
+def _count_pages(path: str) -> int:
+    return len(PdfReader(path).pages)
+
+
+def _extract_page_range(path: str, start: int, stop: int) -> list[str]:
+    reader = PdfReader(path)
+    return [(reader.pages[i].extract_text() or "") for i in range(start, stop)]
+
+
+def _recycle_pool(executor: ProcessPoolExecutor) -> None:
+    """Kill the workers of a pool running a timed-out batch and put a fresh pool in its place.
+
+    A pool cannot stop one task, and leaving it running would hand its worker's slot to the next
+    document while the process is still busy. Batches that shared the old pool are resubmitted.
+    """
+    global _executor
+    if executor is not _executor:
+        return  # already replaced for another timeout
+    _executor = _new_pool()
+    for process in list((executor._processes or {}).values()):
+        process.kill()
+    executor.shutdown(wait=False, cancel_futures=True)
+    metrics.inc("extraction.pool_recycles")
+
+
+class _Budget:
+    """Seconds of worker time left for one document; waiting for a free worker is not counted."""
+
+    def __init__(self, seconds: float):
+        self.remaining = seconds
+
+
+async def _run_in_pool(budget: _Budget, fn, *args):
+    start_extraction_pool()
+    slots = _get_slots()
+    loop = asyncio.get_running_loop()
+    if budget.remaining <= 0:
+        raise ExtractionTimeout()
+
+    metrics.add_gauge("extraction.queue_depth", 1)
+    try:
+        await slots.acquire()
+    finally:
+        metrics.add_gauge("extraction.queue_depth", -1)
+
+    metrics.add_gauge("extraction.in_flight", 1)
+    started = loop.time()
+    deadline = started + budget.remaining
+    try:
+        while True:
+            if loop.time() >= deadline:
+                raise ExtractionTimeout()
+            executor = _executor
+            try:
+                return await asyncio.wait_for(
+                    loop.run_in_executor(executor, fn, *args), deadline - loop.time()
+                )
+            except asyncio.TimeoutError:
+                # Before the slot is released: the next document must get an idle worker.
+                _recycle_pool(executor)
+                raise ExtractionTimeout() from None
+            except BrokenProcessPool:
+                if executor is _executor:
+                    raise
+                # Killed along with another document's timed-out batch; run it on the new pool.
+    finally:
+        budget.remaining -= loop.time() - started
+        metrics.add_gauge("extraction.in_flight", -1)
+        slots.release()
+
+
+async def iter_pages(path: Path, ext: str) -> AsyncIterator[str]:
+    """Yield document text page by page (fixed-size chunks for plain text)."""
+    budget = _Budget(settings.extraction_timeout_seconds)
+
+    if ext == ".pdf":
+        page_count = await _run_in_pool(budget, _count_pages, str(path))
+        limit = min(page_count, settings.extraction_max_pages)
+        batch = max(1, settings.extraction_pages_per_batch)
+        for start in range(0, limit, batch):
+            pages = await _run_in_pool(budget, _extract_page_range, str(path), start, min(start + batch, limit))
+            for page in pages:
+                yield page
+        return
+
+    # Cut plain text at line breaks so joining pages with "\n" restores it exactly.
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    buffer = ""
+    with open(path, "rb") as f:
+        while chunk := await asyncio.to_thread(f.read, TEXT_PAGE_BYTES):
+            buffer += decoder.decode(chunk)
+            cut = buffer.rfind("\n")
+            if cut != -1:
+                yield buffer[:cut]
+                buffer = buffer[cut + 1 :]
+    buffer += decoder.decode(b"", final=True)
+    if buffer:
+        yield buffer
+
+
+class ExtractedPages:
+    """Pages of a document, stopping quietly on timeout or parse errors, with metrics.
+
+    Iterate once; afterwards ``complete`` tells whether the whole document was read,
+    so a partial text is not kept as if it were the book's.
+    """
+
+    def __init__(self, path: Path, ext: str):
+        self.path = path
+        self.ext = ext
+        self.complete = False
+
+    def __aiter__(self) -> AsyncIterator[str]:
+        return self._pages()
+
+    async def _pages(self) -> AsyncIterator[str]:
+        started = time.perf_counter()
+        count = 0
+        try:
+            async for page in iter_pages(self.path, self.ext):
+                count += 1
+                metrics.inc("extraction.pages")
+                yield page
+            self.complete = True
+        except ExtractionTimeout:
+            metrics.inc("extraction.timeouts")
+            logger.warning("Text extraction timed out for %s after %s pages", self.path, count)
+        except Exception:
+            metrics.inc("extraction.errors")
+            logger.exception("Text extraction failed for %s", self.path)
+        finally:
+            metrics.observe("extraction.latency_seconds", time.perf_counter() - started)
+
+
+def extracted_pages(path: Path, ext: str) -> ExtractedPages:
+    return ExtractedPages(path, ext)
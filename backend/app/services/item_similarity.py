@@ -0,0 +1,290 @@
+"""Item-item collaborative filtering over liked reviews (rating >= 4).
+
+Two books are similar when the same users liked both: cosine similarity of their
+columns in the binary user x book "liked" matrix. Only the ``cf_neighbours``
+most similar books are kept per book, so recommending for a user is a lookup of
+the neighbours of the books they liked.
+
+The model is built from the ``reviews`` table with SciPy sparse matrices, in a
+worker thread. New likes are folded in as they happen: the liked book's
+neighbour row is recomputed exactly, and the books the same user liked before
+get the updated pair score. Other books' scores for the liked book drift
+slightly (its popularity grew) until the next rebuild, every
+``cf_rebuild_seconds``.
+
+Likes from other processes are read by review id. Ids are not committed in
+order, so each read goes back over the ids passed in the last
+``SYNC_OVERLAP_SECONDS``; folding in a like twice is a no-op.
+"""
+import asyncio
+import time
+from collections import defaultdict, deque
+
+import numpy as np
+from scipy import sparse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.events import BOOK_DELETED, REVIEW_CREATED, events
+from app.core.metrics import metrics
+from app.db import models
+from app.db.session import AsyncSessionLocal
+from app.services.preferences import LIKED_RATING
+
+Neighbours = tuple[np.ndarray, np.ndarray]  # (book indices, similarities), best first
+
+SYNC_OVERLAP_SECONDS = 60
+
+
+class ItemSimilarity:
+    def __init__(self, user_ids: np.ndarray, book_ids: np.ndarray, likes: sparse.csr_matrix, k: int):
+        self.k = max(1, k)
+        self.user_ids = user_ids
+        self.book_ids = list(book_ids)
+        self.user_index = {int(u): i for i, u in enumerate(user_ids)}
+        self.book_index = {int(b): i for i, b in enumerate(book_ids)}
+        self.by_user = likes.tocsr()
+        self.by_book = likes.tocsc()
+        self.popularity = np.asarray(likes.sum(axis=0), dtype=np.float64).ravel()
+        # Likes since the build, outside the matrices: user id -> book indices, book index -> user ids.
+        self.extra_by_user: dict[int, set[int]] = defaultdict(set)
+        self.extra_by_book: dict[int, set[int]] = defaultdict(set)
+        self.neighbours: dict[int, Neighbours] = {}
+        self.built_at = time.monotonic()
+        self.review_watermark = 0
+        # (when, watermark before that read) for the reads of the last SYNC_OVERLAP_SECONDS.
+        self.passed: deque[tuple[float, int]] = deque()
+
+    @classmethod
+    def build(cls, pairs: np.ndarray, k: int) -> "ItemSimilarity":
+        """Build from an (n, 2) array of distinct (user id, book id) likes."""
+        users, user_rows = np.unique(pairs[:, 0], return_inverse=True)
+        books, book_cols = np.unique(pairs[:, 1], return_inverse=True)
+        likes = sparse.csr_matrix(
+            (np.ones(len(pairs), dtype=np.float32), (user_rows, book_cols)),
+            shape=(len(users), len(books)),
+        )
+        model = cls(users, books, likes, k)
+        if not len(pairs):
+            return model
+
+        # Co-likes, scaled to cosine: S = D (R^T R) D with D = diag(1 / sqrt(popularity)).
+        co = (model.by_book.T @ model.by_user).tocsr()
+        co.setdiag(0)
+        co.eliminate_zeros()
+        scale = sparse.diags(1.0 / np.sqrt(np.maximum(model.popularity, 1.0)))
+        sims = (scale @ co @ scale).tocsr()
+        for row in range(sims.shape[0]):
+            start, end = sims.indptr[row], sims.indptr[row + 1]
+            if start < end:
+                model.neighbours[row] = model._top_k(sims.indices[start:end], sims.data[start:end])
+        return model
+
+    def add_like(self, user_id: int, book_id: int) -> None:
+        book = self._book(book_id)
+        if book in self._liked_by(user_id):
+            return
+        self.extra_by_user[user_id].add(book)
+        self.extra_by_book[book].add(user_id)
+        self.popularity[book] += 1
+
+        co = self._co_likes(book)
+        others = np.flatnonzero(co)
+        sims = co[others] / np.sqrt(self.popularity[book] * np.maximum(self.popularity[others], 1.0))
+        if len(others):
+            self.neighbours[book] = self._top_k(others, sims)
+        # Pairs that just gained a co-like: the user's other liked books.
+        for other in self._liked_by(user_id) - {book}:
+            position = np.searchsorted(others, other)
+            if position < len(others) and others[position] == other:
+                self._offer(other, book, float(sims[position]))
+        metrics.inc("cf.updates")
+
+    def scores_for(self, liked_book_ids: set[int], exclude: set[int]) -> dict[int, float]:
+        """Sum of similarities from the user's liked books to each candidate book id."""
+        scores: dict[int, float] = defaultdict(float)
+        for book_id in liked_book_ids:
+            book = self.book_index.get(book_id)
+            if book is None or book not in self.neighbours:
+                continue
+            indices, sims = self.neighbours[book]
+            for index, sim in zip(indices.tolist(), sims.tolist()):
+                candidate = self.book_ids[index]
+                if candidate not in exclude:
+                    scores[candidate] += sim
+        return scores
+
+    def advance(self, watermark: int) -> None:
+        if watermark > self.review_watermark:
+            self.passed.append((time.monotonic(), self.review_watermark))
+            self.review_watermark = watermark
+
+    def rescan_from(self) -> int:
+        """Review id to read from: the watermark as it stood ``SYNC_OVERLAP_SECONDS`` ago."""
+        cutoff = time.monotonic() - SYNC_OVERLAP_SECONDS
+        while self.passed and self.passed[0][0] < cutoff:
+            self.passed.popleft()
+        return self.passed[0][1] if self.passed else self.review_watermark
+
+    def remove_book(self, book_id: int) -> None:
+        book = self.book_index.get(book_id)
+        if book is not None:
+            self.neighbours.pop(book, None)
+
+    def _book(self, book_id: int) -> int:
+        book = self.book_index.get(book_id)
+        if book is None:
+            book = len(self.book_ids)
+            self.book_ids.append(book_id)
+            self.book_index[book_id] = book
+            self.popularity = np.append(self.popularity, 0.0)
+        return book
+
+    def _liked_by(self, user_id: int) -> set[int]:
+        liked = set(self.extra_by_user.get(user_id, ()))
+        row = self.user_index.get(user_id)
+        if row is not None:
+            start, end = self.by_user.indptr[row], self.by_user.indptr[row + 1]
+            liked.update(self.by_user.indices[start:end].tolist())
+        return liked
+
+    def _co_likes(self, book: int) -> np.ndarray:
+        """For every book, how many users liked both it and ``book``."""
+        co = np.zeros(len(self.book_ids), dtype=np.float64)
+        users = set(self.extra_by_book.get(book, ()))
+        if book < self.by_book.shape[1]:
+            start, end = self.by_book.indptr[book], self.by_book.indptr[book + 1]
+            users.update(self.user_ids[self.by_book.indices[start:end]].tolist())
+        rows = [self.user_index[u] for u in users if u in self.user_index]
+        if rows:
+            built = np.asarray(self.by_user[rows].sum(axis=0)).ravel()
+            co[: len(built)] += built
+        for user in users:
+            for other in self.extra_by_user.get(user, ()):
+                co[other] += 1
+        co[book] = 0
+        return co
+
+    def _top_k(self, indices: np.ndarray, sims: np.ndarray) -> Neighbours:
+        if len(indices) > self.k:
+            keep = np.argpartition(-sims, self.k - 1)[: self.k]
+            indices, sims = indices[keep], sims[keep]
+        order = np.argsort(-sims, kind="stable")
+        return indices[order].astype(np.int32), sims[order].astype(np.float32)
+
+    def _offer(self, book: int, other: int, sim: float) -> None:
+        indices, sims = self.neighbours.get(book, (np.empty(0, np.int32), np.empty(0, np.float32)))
+        hit = np.flatnonzero(indices == other)
+        if len(hit):
+            sims = sims.copy()
+            sims[hit[0]] = sim
+        elif len(indices) < self.k or sim > sims[-1]:
+            indices, sims = np.append(indices, other), np.append(sims, sim)
+        else:
+            return
+        self.neighbours[book] = self._top_k(indices, sims)
+
+
+_model: ItemSimilarity | None = None
+_building: asyncio.Task | None = None
+
+
+def _on_review_created(review: models.Review) -> None:
+    if _model is not None and review.rating >= LIKED_RATING:
+        # The watermark stays put: reviews of other processes with lower ids may not be committed yet.
+        _model.add_like(review.user_id, review.book_id)
+
+
+def _on_book_deleted(book_id: int) -> None:
+    if _model is not None:
+        _model.remove_book(book_id)
+
+
+events.subscribe(REVIEW_CREATED, _on_review_created)
+events.subscribe(BOOK_DELETED, _on_book_deleted)
+
+
+async def build_item_similarity(db: AsyncSession) -> ItemSimilarity:
+    """Build from all liked reviews and make it the current model."""
+    global _model
+    started = time.perf_counter()
+    watermark = (
+        await db.execute(select(models.Review.id).order_by(models.Review.id.desc()).limit(1))
+    ).scalar_one_or_none() or 0
+    result = await db.stream(
+        select(models.Review.user_id, models.Review.book_id)
+        .join(models.Book, models.Book.id == models.Review.book_id)
+        .where(models.Review.rating >= LIKED_RATING, models.Review.id <= watermark)
+        .distinct()
+        .execution_options(yield_per=50000)
+    )
+    chunks = [np.asarray(rows, dtype=np.int64).reshape(-1, 2) async for rows in result.partitions()]
+    pairs = np.concatenate(chunks) if chunks else np.empty((0, 2), dtype=np.int64)
+    # The matrix products are CPU-bound; keep them off the event loop.
+    model = await asyncio.to_thread(ItemSimilarity.build, pairs, settings.cf_neighbours)
+    model.review_watermark = watermark
+    # Fold in likes committed while the build ran, and keep re-reading the old model's recent window.
+    if _model is not None:
+        model.passed = deque(_model.passed)
+        model.passed.append((time.monotonic(), min(_model.review_watermark, watermark)))
+        await _catch_up(db, model)
+    _model = model
+    metrics.observe("cf.build_seconds", time.perf_counter() - started)
+    metrics.set_gauge("cf.books", len(model.neighbours))
+    return model
+
+
+async def get_item_similarity(db: AsyncSession, wait: bool = True) -> ItemSimilarity | None:
+    """The current model; built on first use, rebuilt in the background when old.
+
+    Concurrent first requests wait for one shared build rather than each running
+    their own. With ``wait=False`` they get None until that build is done.
+    """
+    global _building
+    if _model is None:
+        if _building is None or _building.done():
+            _building = asyncio.create_task(_rebuild())
+        if not wait:
+            return None
+        # Shielded: a cancelled request must not cancel the build the others wait on.
+        await asyncio.shield(_building)
+    elif time.monotonic() - _model.built_at >= settings.cf_rebuild_seconds and (
+        _building is None or _building.done()
+    ):
+        _building = asyncio.create_task(_rebuild())
+    await _catch_up(db, _model)
+    return _model
+
+
+async def _rebuild() -> None:
+    async with AsyncSessionLocal() as db:
+        await build_item_similarity(db)
+
+
+def warm_item_similarity() -> None:
+    """Start the first build in the background, so it is not paid for by a request."""
+    global _building
+    if _model is None and (_building is None or _building.done()):
+        _building = asyncio.create_task(_rebuild())
+
+
+async def _catch_up(db: AsyncSession, model: ItemSimilarity) -> None:
+    # Likes written by other processes or replicas, which did not reach our event handler.
+    rows = (
+        await db.execute(
+            select(models.Review.id, models.Review.user_id, models.Review.book_id)
+            .where(models.Review.id > model.rescan_from(), models.Review.rating >= LIKED_RATING)
+            .order_by(models.Review.id)
+        )
+    ).all()
+    for _, user_id, book_id in rows:
+        model.add_like(user_id, book_id)
+    if rows:
+        model.advance(rows[-1][0])
+
+
+def reset_item_similarity() -> None:
+    global _model, _building
+    _model = None
+    _building = None
@@ -0,0 +1,283 @@
+"""Durable job queue on top of the application database.
+
+Jobs are enqueued in the caller's transaction, so they exist exactly when the
+rows they refer to do. Workers claim them with ``FOR UPDATE SKIP LOCKED`` on
+PostgreSQL (SQLite serializes writers, so the same UPDATE is already exclusive),
+retry failures with exponential backoff and move exhausted jobs to ``dead``.
+
+Jobs with a ``coalesce_key`` are coalesced: at most one is queued and one running
+per key. A trigger that finds one already queued is folded into it, and a queued
+job is not claimed while another with its key is running.
+"""
+import asyncio
+import json
+import random
+from datetime import datetime, timedelta
+from typing import Any, Collection
+
+from sqlalchemy import case, delete, func, select, update
+from sqlalchemy.orm import aliased
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.db import models
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+DEAD = "dead"
+COALESCED = "coalesced"  # a retry folded into a queued job with the same coalesce key
+
+# Set by enqueue() so an in-process worker picks new jobs up without waiting for its poll.
+_wakeup: asyncio.Event | None = None
+_wakeup_loop: asyncio.AbstractEventLoop | None = None
+
+
+def _utcnow() -> datetime:
+    return datetime.utcnow()
+
+
+def wakeup_event() -> asyncio.Event:
+    global _wakeup, _wakeup_loop
+    loop = asyncio.get_running_loop()
+    if _wakeup is None or _wakeup_loop is not loop:
+        _wakeup = asyncio.Event()
+        _wakeup_loop = loop
+    return _wakeup
+
+
+async def enqueue(
+    db: AsyncSession,
+    kind: str,
+    payload: dict[str, Any],
+    idempotency_key: str | None = None,
+    delay_seconds: float = 0,
+    max_attempts: int | None = None,
+    coalesce_key: str | None = None,
+) -> bool:
+    """Add a job in the caller's transaction. Caller commits.
+
+    A second job with the same idempotency key is ignored, whatever the state of the
+    first; one with the coalesce key of a queued job is folded into it. Returns whether
+    a new job was added.
+    """
+    dialect_insert = postgresql.insert if db.bind.dialect.name == "postgresql" else sqlite.insert
+    stmt = dialect_insert(models.Job).values(
+        kind=kind,
+        payload=json.dumps(payload),
+        status=QUEUED,
+        idempotency_key=idempotency_key,
+        coalesce_key=coalesce_key,
+        attempts=0,
+        max_attempts=max_attempts or settings.job_max_attempts,
+        run_at=_utcnow() + timedelta(seconds=delay_seconds),
+    )
+    # No conflict target: either the idempotency key or the partial coalesce index may match.
+    result = await db.execute(stmt.on_conflict_do_nothing())
+    if not result.rowcount:
+        if coalesce_key is not None:
+            metrics.inc(f"jobs.{kind}.coalesced")
+        return False
+    wakeup_event().set()
+    return True
+
+
+async def make_due(db: AsyncSession, idempotency_key: str) -> None:
+    """Run a queued job now rather than at its scheduled time. Caller commits."""
+    result = await db.execute(
+        update(models.Job)
+        .where(models.Job.idempotency_key == idempotency_key, models.Job.status == QUEUED)
+        .values(run_at=_utcnow())
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount:
+        wakeup_event().set()
+
+
+async def discard_queued(db: AsyncSession, coalesce_keys: list[str]) -> int:
+    """Drop the queued jobs of a row being deleted. Caller commits.
+
+    Running ones finish; their handlers skip rows that are gone.
+    """
+    result = await db.execute(
+        delete(models.Job)
+        .where(models.Job.coalesce_key.in_(coalesce_keys), models.Job.status == QUEUED)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount or 0
+
+
+def _queued_sibling():
+    """True for a row whose coalesce key already has a (different) queued job."""
+    sibling = aliased(models.Job)
+    return (
+        select(sibling.id)
+        .where(
+            sibling.coalesce_key == models.Job.coalesce_key,
+            sibling.status == QUEUED,
+            sibling.id != models.Job.id,
+        )
+        .exists()
+    )
+
+
+def _requeued_status():
+    # Requeueing must not break the one-queued-per-key index; the queued job covers the retry.
+    return case((_queued_sibling(), COALESCED), else_=QUEUED)
+
+
+async def claim_jobs(
+    db: AsyncSession,
+    worker_id: str,
+    limit: int,
+    kinds: Collection[str] | None = None,
+    exclude_kinds: Collection[str] = (),
+) -> list[models.Job]:
+    """Atomically move up to ``limit`` due jobs to running for this worker and return them.
+
+    ``kinds`` restricts the claim to those kinds, ``exclude_kinds`` leaves those out.
+    """
+    running = aliased(models.Job)
+    busy_key = (
+        select(running.id)
+        .where(running.coalesce_key == models.Job.coalesce_key, running.status == RUNNING)
+        .exists()
+    )
+    due = select(models.Job.id).where(models.Job.status == QUEUED, models.Job.run_at <= _utcnow(), ~busy_key)
+    if kinds is not None:
+        due = due.where(models.Job.kind.in_(kinds))
+    if exclude_kinds:
+        due = due.where(models.Job.kind.not_in(exclude_kinds))
+    due = (
+        due.order_by(models.Job.run_at, models.Job.id)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+    stmt = (
+        update(models.Job)
+        .where(models.Job.id.in_(due))
+        .values(
+            status=RUNNING,
+            locked_by=worker_id,
+            locked_at=_utcnow(),
+            attempts=models.Job.attempts + 1,
+        )
+        .returning(models.Job)
+        .execution_options(synchronize_session=False)
+    )
+    jobs = list((await db.execute(stmt)).scalars())
+    await db.commit()
+    return sorted(jobs, key=lambda job: (job.run_at, job.id))
+
+
+async def complete_job(db: AsyncSession, job_id: int) -> None:
+    await db.execute(
+        update(models.Job)
+        .where(models.Job.id == job_id)
+        .values(status=SUCCEEDED, finished_at=_utcnow(), locked_by=None, last_error=None)
+    )
+    await db.commit()
+
+
+async def fail_job(db: AsyncSession, job: models.Job, error: str) -> str:
+    """Schedule a retry with backoff, or dead-letter the job; returns the new status."""
+    if job.attempts >= job.max_attempts:
+        status, run_at, finished_at = DEAD, job.run_at, _utcnow()
+    else:
+        backoff = min(
+            settings.job_backoff_max_seconds,
+            settings.job_backoff_base_seconds * 2 ** (job.attempts - 1),
+        )
+        status, finished_at = _requeued_status(), None
+        run_at = _utcnow() + timedelta(seconds=backoff * random.uniform(0.8, 1.2))
+    new_status = (
+        await db.execute(
+            update(models.Job)
+            .where(models.Job.id == job.id)
+            .values(
+                status=status,
+                run_at=run_at,
+                finished_at=finished_at,
+                locked_by=None,
+                last_error=error[:4000],
+            )
+            .returning(models.Job.status)
+            .execution_options(synchronize_session=False)
+        )
+    ).scalar_one()
+    await db.commit()
+    return new_status
+
+
+async def release_job(db: AsyncSession, job_id: int) -> None:
+    """Put a job interrupted by shutdown back in the queue without using up an attempt."""
+    await db.execute(
+        update(models.Job)
+        .where(models.Job.id == job_id, models.Job.status == RUNNING)
+        .values(status=_requeued_status(), locked_by=None, attempts=models.Job.attempts - 1)
+        .execution_options(synchronize_session=False)
+    )
+    await db.commit()
+
+
+async def recover_stale_jobs(db: AsyncSession) -> int:
+    """Requeue (or dead-letter) running jobs whose worker stopped heartbeating, e.g. after a crash."""
+    cutoff = _utcnow() - timedelta(seconds=settings.job_lock_timeout_seconds)
+    result = await db.execute(
+        update(models.Job)
+        .where(models.Job.status == RUNNING, models.Job.locked_at < cutoff)
+        .values(
+            status=case(
+                (models.Job.attempts >= models.Job.max_attempts, DEAD),
+                (_queued_sibling(), COALESCED),
+                else_=QUEUED,
+            ),
+            locked_by=None,
+            last_error="worker lost",
+        )
+        .execution_options(synchronize_session=False)
+    )
+    await db.commit()
+    return result.rowcount or 0
+
+
+async def heartbeat(db: AsyncSession, job_ids: list[int], worker_id: str) -> None:
+    if not job_ids:
+        return
+    await db.execute(
+        update(models.Job)
+        .where(models.Job.id.in_(job_ids), models.Job.locked_by == worker_id)
+        .values(locked_at=_utcnow())
+        .execution_options(synchronize_session=False)
+    )
+    await db.commit()
+
+
+async def queue_status(db: AsyncSession) -> dict[str, Any]:
+    rows = (
+        await db.execute(
+            select(models.Job.kind, models.Job.status, func.count())
+            .group_by(models.Job.kind, models.Job.status)
+        )
+    ).all()
+    by_status: dict[str, int] = {QUEUED: 0, RUNNING: 0, SUCCEEDED: 0, DEAD: 0, COALESCED: 0}
+    by_kind: dict[str, dict[str, int]] = {}
+    for kind, status, count in rows:
+        by_status[status] = by_status.get(status, 0) + count
+        by_kind.setdefault(kind, {})[status] = count
+
+    oldest = (
+        await db.execute(
+            select(func.min(models.Job.run_at)).where(
+                models.Job.status == QUEUED, models.Job.run_at <= _utcnow()
+            )
+        )
+    ).scalar_one_or_none()
+    return {
+        "depth": by_status[QUEUED],
+        "by_status": by_status,
+        "by_kind": by_kind,
+        "oldest_due_seconds": (_utcnow() - oldest).total_seconds() if oldest else 0.0,
+    }
@@ -1,10 +1,38 @@
 from abc import ABC, abstractmethod
-from typing import Any
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Any, AsyncIterator
+import asyncio
 import json
+import time
 
 import httpx
 
 from app.core.config import settings
+from app.core.metrics import metrics
+from app.services.circuit_breaker import CircuitBreaker, CircuitOpenError
+from app.services.llm_cache import get_cached, put_cached
+from app.services.llm_scheduler import Priority, get_scheduler
+from app.services.sentiment_lexicon import lexicon_sentiment
+
+# Bump when a prompt changes so cached responses from the old prompt are not reused.
+SUMMARY_PROMPT_VERSION = 1
+SENTIMENT_PROMPT_VERSION = 1
+
+_client: httpx.AsyncClient | None = None
+_breaker: CircuitBreaker | None = None
+_breaker_loop: asyncio.AbstractEventLoop | None = None
+_health: dict[str, Any] | None = None
+_health_at = 0.0
+_health_check: asyncio.Task | None = None
+
+
+@dataclass
+class LLMResult:
+    text: str
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cached: bool = False
 
 
 class LLMProvider(ABC):
@@ -12,81 +40,333 @@ class LLMProvider(ABC):
     async def summarize(self, text: str) -> str:
         pass
 
+    @abstractmethod
+    async def summarize_section(self, text: str) -> LLMResult:
+        """Summarize one section of a longer book (map step)."""
+
+    @abstractmethod
+    async def combine_summaries(self, parts: list[str], final: bool) -> LLMResult:
+        """Merge section summaries, in order, into one (reduce step)."""
+
     @abstractmethod
     async def analyze_sentiment(self, text: str) -> dict[str, Any]:
         pass
 
+    @abstractmethod
+    async def analyze_sentiment_batch(self, texts: list[str]) -> list[dict[str, Any]]:
+        """Score several reviews in one prompt; results are in input order."""
+
 
 class LocalLLM(LLMProvider):
     async def summarize(self, text: str) -> str:
+        cached = await get_cached("summary", SUMMARY_PROMPT_VERSION, text)
+        if cached is not None:
+            return cached
         prompt = (
             "Summarize the following book content in 6-8 concise bullet points. "
             "Focus on plot, themes, style, and key takeaways.\n\n"
             f"{text}"
         )
-        response = await _ollama_generate(prompt)
-        return _clean_text(response) or _fallback_summary(text)
+        summary = _clean_text(await _ollama_generate(prompt))
+        if not summary:
+            return _fallback_summary(text)
+        await put_cached("summary", SUMMARY_PROMPT_VERSION, text, summary)
+        return summary
+
+    async def summarize_section(self, text: str) -> LLMResult:
+        prompt = (
+            "Summarize this section of a longer book in 3-5 concise bullet points. "
+            "Keep names, events and ideas that later sections may depend on.\n\n"
+            f"{text}"
+        )
+        return await _cached_generate("summary_section", text, prompt)
+
+    async def combine_summaries(self, parts: list[str], final: bool) -> LLMResult:
+        joined = "\n\n".join(f"Section {i}:\n{part}" for i, part in enumerate(parts, start=1))
+        if final:
+            instruction = (
+                "These are summaries of consecutive sections of one book. Combine them into "
+                "6-8 concise bullet points. Focus on plot, themes, style, and key takeaways."
+            )
+        else:
+            instruction = (
+                "These are summaries of consecutive sections of one book. Condense them into "
+                "one summary of 4-6 bullet points, keeping the order of events."
+            )
+        kind = "summary_final" if final else "summary_combine"
+        return await _cached_generate(kind, joined, f"{instruction}\n\n{joined}")
 
     async def analyze_sentiment(self, text: str) -> dict[str, Any]:
+        cached = await get_cached("sentiment", SENTIMENT_PROMPT_VERSION, text)
+        if cached is not None:
+            return cached
         prompt = (
             "Analyze the sentiment of this review. "
             "Return ONLY JSON object with keys: score (float from -1 to 1), "
             "label (positive|neutral|negative), rationale (short string).\n\n"
             f"Review:\n{text}"
         )
-        response = await _ollama_generate(prompt)
+        try:
+            response = await _ollama_generate(prompt)
+        except CircuitOpenError:
+            metrics.inc("sentiment.breaker_fallbacks")
+            return _heuristic_sentiment(text)
         parsed = _parse_sentiment_json(response)
         if parsed:
+            await put_cached("sentiment", SENTIMENT_PROMPT_VERSION, text, parsed)
             return parsed
         return _heuristic_sentiment(text)
 
+    async def analyze_sentiment_batch(self, texts: list[str]) -> list[dict[str, Any]]:
+        results: list[dict[str, Any] | None] = [None] * len(texts)
+        misses: list[int] = []
+        for i, text in enumerate(texts):
+            if not (text or "").strip():
+                results[i] = _heuristic_sentiment(text)
+            elif (cached := await get_cached("sentiment", SENTIMENT_PROMPT_VERSION, text)) is not None:
+                results[i] = cached
+            else:
+                misses.append(i)
+
+        if len(misses) > 1:
+            reviews = "\n\n".join(f"Review {n}:\n{texts[i]}" for n, i in enumerate(misses, start=1))
+            prompt = (
+                "Analyze the sentiment of each review below. "
+                "Return ONLY a JSON array with one object per review, with keys: "
+                "id (the review number), score (float from -1 to 1), "
+                "label (positive|neutral|negative), rationale (short string).\n\n"
+                f"{reviews}"
+            )
+            try:
+                parsed = _parse_sentiment_batch(await _ollama_generate(prompt), len(misses))
+            except CircuitOpenError:
+                # Each miss falls back to the lexicon in analyze_sentiment without a model call.
+                parsed = {}
+            if parsed is None:
+                metrics.inc("sentiment.batch_fallbacks")
+                parsed = {}
+            for n, i in enumerate(misses, start=1):
+                if n in parsed:
+                    results[i] = parsed[n]
+                    await put_cached("sentiment", SENTIMENT_PROMPT_VERSION, texts[i], parsed[n])
+            misses = [i for i in misses if results[i] is None]
+
+        # Anything the batch did not answer is scored one review at a time.
+        singles = await asyncio.gather(*(self.analyze_sentiment(texts[i]) for i in misses))
+        for i, result in zip(misses, singles):
+            results[i] = result
+        return results
+
+
+def _build_client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        timeout=httpx.Timeout(settings.llm_timeout_seconds),
+        limits=httpx.Limits(
+            max_connections=settings.llm_max_connections,
+            max_keepalive_connections=settings.llm_max_connections,
+            keepalive_expiry=settings.llm_keepalive_seconds,
+        ),
+    )
+
+
+def start_llm_client() -> None:
+    global _client
+    if _client is None:
+        _client = _build_client()
+
+
+async def shutdown_llm_client() -> None:
+    global _client
+    if _breaker is not None:
+        _breaker.close()
+    if _client is not None:
+        await _client.aclose()
+    _client = None
+
+
+def get_breaker() -> CircuitBreaker:
+    # The prober task belongs to the running loop, so keep one breaker per loop.
+    global _breaker, _breaker_loop
+    loop = asyncio.get_running_loop()
+    if _breaker is None or _breaker_loop is not loop:
+        _breaker = CircuitBreaker(
+            "llm",
+            settings.llm_breaker_failure_threshold,
+            settings.llm_breaker_reset_seconds,
+            probe=_probe_health,
+            is_failure=_is_upstream_failure,
+        )
+        _breaker_loop = loop
+    return _breaker
+
+
+def _is_upstream_failure(exc: BaseException) -> bool:
+    # Connection errors, timeouts and 5xx mean Ollama is unwell; a 4xx is our request.
+    if isinstance(exc, httpx.HTTPStatusError):
+        return exc.response.status_code >= 500
+    return isinstance(exc, httpx.TransportError)
+
+
+async def _probe_health() -> bool:
+    return (await _refresh_health())["connected"]
+
+
+@asynccontextmanager
+async def _http() -> AsyncIterator[httpx.AsyncClient]:
+    """The app-scoped pooled client; scripts outside the app get a short-lived one."""
+    if _client is not None:
+        yield _client
+        return
+    async with _build_client() as client:
+        yield client
+
 
-async def _ollama_generate(prompt: str) -> str:
+async def _ollama_generate(prompt: str, priority: Priority = "background") -> str:
+    return (await _ollama_generate_result(prompt, priority)).text
+
+
+async def _ollama_generate_result(prompt: str, priority: Priority = "background") -> LLMResult:
     payload = {
         "model": settings.llm_model,
         "prompt": prompt,
         "stream": False,
     }
-    timeout = httpx.Timeout(settings.llm_timeout_seconds)
-    async with httpx.AsyncClient(timeout=timeout) as client:
+    async with get_breaker().guard(), get_scheduler().slot(priority), _http() as client:
         resp = await client.post(f"{settings.llm_url}/api/generate", json=payload)
         resp.raise_for_status()
         data = resp.json()
-        return data.get("response", "")
+    # Ollama reports token counts as prompt_eval_count / eval_count.
+    result = LLMResult(
+        text=data.get("response", ""),
+        prompt_tokens=int(data.get("prompt_eval_count") or 0),
+        completion_tokens=int(data.get("eval_count") or 0),
+    )
+    metrics.inc("llm.tokens.prompt", result.prompt_tokens)
+    metrics.inc("llm.tokens.completion", result.completion_tokens)
+    return result
+
+
+async def _cached_generate(kind: str, cache_input: str, prompt: str) -> LLMResult:
+    """Generate with the response cache; cache hits cost no tokens. Empty answers are not cached."""
+    cached = await get_cached(kind, SUMMARY_PROMPT_VERSION, cache_input)
+    if cached is not None:
+        return LLMResult(text=cached, cached=True)
+    result = await _ollama_generate_result(prompt)
+    result.text = _clean_text(result.text)
+    if result.text:
+        await put_cached(kind, SUMMARY_PROMPT_VERSION, cache_input, result.text)
+    return result
 
 
 async def ollama_status() -> dict[str, Any]:
-    timeout = httpx.Timeout(settings.llm_timeout_seconds)
-    async with httpx.AsyncClient(timeout=timeout) as client:
-        resp = await client.get(f"{settings.llm_url}/api/tags")
-        resp.raise_for_status()
-        data = resp.json()
+    """Health from a snapshot at most ``llm_health_ttl_seconds`` old, plus live queue and breaker state."""
+    if _health is not None and time.monotonic() - _health_at < settings.llm_health_ttl_seconds:
+        metrics.inc("llm.health.cache_hits")
+        snapshot = _health
+    else:
+        snapshot = await _refresh_health()
+    return {
+        **snapshot,
+        "checked_seconds_ago": round(time.monotonic() - _health_at, 3),
+        "scheduler": get_scheduler().stats(),
+        "breaker": get_breaker().stats(),
+    }
+
+
+async def _refresh_health() -> dict[str, Any]:
+    # Concurrent callers share one in-flight check instead of each calling Ollama.
+    global _health_check
+    if _health_check is None or _health_check.done() or _health_check.get_loop() is not asyncio.get_running_loop():
+        _health_check = asyncio.create_task(_check_health())
+    return await asyncio.shield(_health_check)
+
+
+async def _check_health() -> dict[str, Any]:
+    # Health checks bypass the scheduler and the breaker so they answer even when generations queue.
+    global _health, _health_at
+    configured = settings.llm_model
+    try:
+        async with _http() as client:
+            resp = await client.get(
+                f"{settings.llm_url}/api/tags", timeout=settings.llm_health_timeout_seconds
+            )
+            resp.raise_for_status()
+            data = resp.json()
+    except Exception as exc:
+        snapshot = {
+            "connected": False,
+            "configured_model": configured,
+            "configured_model_ready": False,
+            "available_models": [],
+            "error": str(exc),
+        }
+    else:
         models = [m.get("name") for m in data.get("models", []) if m.get("name")]
-        configured = settings.llm_model
-        configured_ready = any(
-            name == configured or name.startswith(f"{configured}:") for name in models
-        )
-        return {
+        snapshot = {
             "connected": True,
             "configured_model": configured,
-            "configured_model_ready": configured_ready,
+            "configured_model_ready": any(
+                name == configured or name.startswith(f"{configured}:") for name in models
+            ),
             "available_models": models,
         }
+    metrics.inc("llm.health.checks")
+    _health, _health_at = snapshot, time.monotonic()
+    return snapshot
 
 
-async def ollama_chat(messages: list[dict[str, str]]) -> str:
+async def ollama_chat(messages: list[dict[str, str]], priority: Priority = "interactive") -> str:
     payload = {
         "model": settings.llm_model,
         "messages": messages,
         "stream": False,
     }
-    timeout = httpx.Timeout(settings.llm_timeout_seconds)
-    async with httpx.AsyncClient(timeout=timeout) as client:
+    started = time.perf_counter()
+    async with get_breaker().guard(), get_scheduler().slot(priority), _http() as client:
         resp = await client.post(f"{settings.llm_url}/api/chat", json=payload)
         resp.raise_for_status()
         data = resp.json()
-        message = data.get("message", {})
-        return (message.get("content") or "").strip()
+    # Nothing reaches the user before the whole answer, so first token == last token.
+    metrics.observe("llm.chat.ttft_seconds.blocking", time.perf_counter() - started)
+    message = data.get("message", {})
+    return (message.get("content") or "").strip()
+
+
+async def ollama_chat_stream(
+    messages: list[dict[str, str]], priority: Priority = "interactive"
+) -> AsyncIterator[str]:
+    """Yield content deltas as Ollama produces them.
+
+    The next line is only read from Ollama once the caller asks for it, so a slow
+    consumer slows the upstream read instead of buffering. Closing or cancelling the
+    generator closes the upstream response, which stops the generation.
+    """
+    payload = {
+        "model": settings.llm_model,
+        "messages": messages,
+        "stream": True,
+    }
+    started = time.perf_counter()
+    first = True
+    async with get_breaker().guard(), get_scheduler().slot(priority), _http() as client:
+        async with client.stream("POST", f"{settings.llm_url}/api/chat", json=payload) as resp:
+            resp.raise_for_status()
+            async for line in resp.aiter_lines():
+                if not line.strip():
+                    continue
+                data = json.loads(line)
+                if data.get("error"):
+                    raise httpx.HTTPError(str(data["error"]))
+                delta = (data.get("message") or {}).get("content") or ""
+                if delta:
+                    if first:
+                        metrics.observe("llm.chat.ttft_seconds.stream", time.perf_counter() - started)
+                        first = False
+                    yield delta
+                if data.get("done"):
+                    metrics.inc("llm.tokens.prompt", int(data.get("prompt_eval_count") or 0))
+                    metrics.inc("llm.tokens.completion", int(data.get("eval_count") or 0))
+                    break
 
 
 def _clean_text(value: str) -> str:
@@ -117,6 +397,35 @@ def _parse_sentiment_json(response: str) -> dict[str, Any] | None:
         except json.JSONDecodeError:
             return None
 
+    return _coerce_sentiment(parsed)
+
+
+def _parse_sentiment_batch(response: str, count: int) -> dict[int, dict[str, Any]] | None:
+    """Results keyed by review number (1-based); None when the output is not a JSON array."""
+    raw = (response or "").strip()
+    start = raw.find("[")
+    end = raw.rfind("]")
+    if start == -1 or end <= start:
+        return None
+    try:
+        items = json.loads(raw[start : end + 1])
+    except json.JSONDecodeError:
+        return None
+    if not isinstance(items, list):
+        return None
+    results: dict[int, dict[str, Any]] = {}
+    for item in items:
+        if not isinstance(item, dict) or not isinstance(item.get("id"), int):
+            continue
+        result = _coerce_sentiment(item)
+        if result and 1 <= item["id"] <= count:
+            results[item["id"]] = result
+    return results
+
+
+def _coerce_sentiment(parsed: Any) -> dict[str, Any] | None:
+    if not isinstance(parsed, dict):
+        return None
     score = parsed.get("score")
     label = parsed.get("label")
     rationale = parsed.get("rationale", "")
@@ -130,18 +439,9 @@ def _parse_sentiment_json(response: str) -> dict[str, Any] | None:
 
 
 def _heuristic_sentiment(text: str) -> dict[str, Any]:
-    t = (text or "").lower()
-    if not t.strip():
+    if not (text or "").strip():
         return {"score": 0.0, "label": "neutral", "rationale": "empty review"}
-    positive_terms = ["great", "excellent", "love", "good", "amazing", "insightful"]
-    negative_terms = ["bad", "poor", "boring", "hate", "terrible", "awful"]
-    pos = sum(1 for term in positive_terms if term in t)
-    neg = sum(1 for term in negative_terms if term in t)
-    if pos > neg:
-        return {"score": min(1.0, 0.25 + 0.15 * pos), "label": "positive", "rationale": "keyword signal"}
-    if neg > pos:
-        return {"score": max(-1.0, -0.25 - 0.15 * neg), "label": "negative", "rationale": "keyword signal"}
-    return {"score": 0.0, "label": "neutral", "rationale": "balanced keyword signal"}
+    return lexicon_sentiment(text)
 
 
 def get_llm() -> LLMProvider:
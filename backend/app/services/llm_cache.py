@@ -0,0 +1,146 @@
+"""Two-tier cache for LLM responses: an in-process LRU in front of the ``llm_cache`` table.
+
+Entries are keyed on (provider, model, kind, prompt version, normalized input), so
+switching models or bumping a prompt version starts from an empty cache; the old
+entries simply expire. Both tiers evict on TTL and on size.
+"""
+import hashlib
+import json
+import logging
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.dialects import postgresql, sqlite
+
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.db import models
+from app.db.session import AsyncSessionLocal
+
+logger = logging.getLogger(__name__)
+
+# The persistent tier is pruned once every this many writes.
+PRUNE_EVERY_WRITES = 100
+
+_memory: "OrderedDict[str, tuple[float, Any]]" = OrderedDict()
+_writes_since_prune = 0
+
+
+def cache_key(kind: str, prompt_version: int, text: str) -> str:
+    normalized = " ".join((text or "").split())
+    raw = json.dumps(
+        [settings.llm_provider, settings.llm_model, kind, prompt_version, normalized],
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _utcnow() -> datetime:
+    return datetime.utcnow()
+
+
+async def get_cached(kind: str, prompt_version: int, text: str) -> Any | None:
+    if not settings.llm_cache_enabled:
+        return None
+    key = cache_key(kind, prompt_version, text)
+
+    entry = _memory.get(key)
+    if entry is not None:
+        if entry[0] > time.monotonic():
+            _memory.move_to_end(key)
+            metrics.inc("llm_cache.hits.memory")
+            return entry[1]
+        del _memory[key]
+
+    try:
+        async with AsyncSessionLocal() as db:
+            row = await db.get(models.LLMCacheEntry, key)
+    except Exception:
+        metrics.inc("llm_cache.errors")
+        logger.exception("LLM cache lookup failed")
+        row = None
+
+    if row is not None and row.expires_at > _utcnow():
+        value = json.loads(row.value)
+        remaining = (row.expires_at - _utcnow()).total_seconds()
+        _remember(key, value, remaining)
+        metrics.inc("llm_cache.hits.db")
+        return value
+
+    metrics.inc("llm_cache.misses")
+    return None
+
+
+async def put_cached(kind: str, prompt_version: int, text: str, value: Any) -> None:
+    """Store a successful model response. Failures to persist are logged, never raised."""
+    global _writes_since_prune
+    if not settings.llm_cache_enabled:
+        return
+    key = cache_key(kind, prompt_version, text)
+    ttl = settings.llm_cache_ttl_seconds
+    _remember(key, value, ttl)
+
+    now = _utcnow()
+    row = {
+        "key": key,
+        "kind": kind,
+        "model": settings.llm_model,
+        "prompt_version": prompt_version,
+        "value": json.dumps(value),
+        "created_at": now,
+        "expires_at": now + timedelta(seconds=ttl),
+    }
+    try:
+        async with AsyncSessionLocal() as db:
+            dialect_insert = postgresql.insert if db.bind.dialect.name == "postgresql" else sqlite.insert
+            stmt = dialect_insert(models.LLMCacheEntry).values(**row)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[models.LLMCacheEntry.key],
+                set_={k: stmt.excluded[k] for k in ("value", "created_at", "expires_at")},
+            )
+            await db.execute(stmt)
+            _writes_since_prune += 1
+            if _writes_since_prune >= PRUNE_EVERY_WRITES:
+                _writes_since_prune = 0
+                await _prune(db)
+            await db.commit()
+    except Exception:
+        metrics.inc("llm_cache.errors")
+        logger.exception("LLM cache write failed")
+
+
+def clear_memory_cache() -> None:
+    _memory.clear()
+
+
+def _remember(key: str, value: Any, ttl_seconds: float) -> None:
+    _memory[key] = (time.monotonic() + ttl_seconds, value)
+    _memory.move_to_end(key)
+    while len(_memory) > settings.llm_cache_memory_entries:
+        _memory.popitem(last=False)
+        metrics.inc("llm_cache.evictions.memory")
+
+
+async def _prune(db) -> None:
+    expired = await db.execute(
+        delete(models.LLMCacheEntry).where(models.LLMCacheEntry.expires_at <= _utcnow())
+    )
+    evicted = expired.rowcount or 0
+
+    total = (await db.execute(select(func.count()).select_from(models.LLMCacheEntry))).scalar_one()
+    excess = total - settings.llm_cache_max_rows
+    if excess > 0:
+        oldest = (
+            select(models.LLMCacheEntry.key)
+            .order_by(models.LLMCacheEntry.created_at)
+            .limit(excess)
+            .scalar_subquery()
+        )
+        result = await db.execute(
+            delete(models.LLMCacheEntry).where(models.LLMCacheEntry.key.in_(oldest))
+        )
+        evicted += result.rowcount or 0
+    metrics.inc("llm_cache.evictions.db", evicted)
@@ -0,0 +1,106 @@
+"""Bounded, fair admission of LLM generations.
+
+At most ``llm_max_concurrency`` generations run against the model at once. When
+requests queue, interactive ones (chat) are preferred, but every
+``llm_interactive_weight`` interactive grants let one background request
+(summaries, sentiment) through, so neither class can starve the other.
+"""
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, Literal
+
+from app.core.config import settings
+from app.core.metrics import metrics
+
+Priority = Literal["interactive", "background"]
+PRIORITIES: tuple[Priority, ...] = ("interactive", "background")
+
+_scheduler: "LLMScheduler | None" = None
+_scheduler_loop: asyncio.AbstractEventLoop | None = None
+
+
+class LLMScheduler:
+    def __init__(self, limit: int, interactive_weight: int = 3):
+        self.limit = max(1, limit)
+        self.interactive_weight = max(1, interactive_weight)
+        self.in_flight = 0
+        self._waiters: dict[str, deque[asyncio.Future]] = {p: deque() for p in PRIORITIES}
+        self._interactive_streak = 0
+
+    @asynccontextmanager
+    async def slot(self, priority: Priority = "background"):
+        started = time.perf_counter()
+        await self._acquire(priority)
+        metrics.observe(f"llm.queue_wait.{priority}", time.perf_counter() - started)
+        try:
+            yield
+        finally:
+            self._release()
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "limit": self.limit,
+            "in_flight": self.in_flight,
+            "queued": {p: len(self._waiters[p]) for p in PRIORITIES},
+        }
+
+    async def _acquire(self, priority: Priority) -> None:
+        if self.in_flight < self.limit and not any(self._waiters.values()):
+            self.in_flight += 1
+            self._publish()
+            return
+
+        waiter = asyncio.get_running_loop().create_future()
+        queue = self._waiters[priority]
+        queue.append(waiter)
+        self._publish()
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # Granted a slot just as we were cancelled: hand it on.
+                self._release()
+            elif waiter in queue:
+                queue.remove(waiter)
+                self._publish()
+            raise
+
+    def _release(self) -> None:
+        self.in_flight -= 1
+        while self.in_flight < self.limit:
+            queue = self._next_queue()
+            if queue is None:
+                break
+            waiter = queue.popleft()
+            if waiter.done():
+                continue
+            self.in_flight += 1
+            waiter.set_result(None)
+        self._publish()
+
+    def _next_queue(self) -> deque[asyncio.Future] | None:
+        interactive, background = self._waiters["interactive"], self._waiters["background"]
+        if interactive and (not background or self._interactive_streak < self.interactive_weight):
+            self._interactive_streak += 1
+            return interactive
+        if background:
+            self._interactive_streak = 0
+            return background
+        return None
+
+    def _publish(self) -> None:
+        metrics.set_gauge("llm.in_flight", self.in_flight)
+        for priority in PRIORITIES:
+            metrics.set_gauge(f"llm.queued.{priority}", len(self._waiters[priority]))
+
+
+def get_scheduler() -> LLMScheduler:
+    # Waiters are futures of the running loop, so keep one scheduler per loop.
+    global _scheduler, _scheduler_loop
+    loop = asyncio.get_running_loop()
+    if _scheduler is None or _scheduler_loop is not loop:
+        _scheduler = LLMScheduler(settings.llm_max_concurrency, settings.llm_interactive_weight)
+        _scheduler_loop = loop
+    return _scheduler
@@ -0,0 +1,248 @@
+"""Per-user preference profiles maintained from stored counters.
+
+``user_preference_counts`` holds, per user, how often each author and keyword
+occurs in their liked reviews. A review touches only its author's counters, and
+that user's ``liked_authors``/``liked_keywords`` rows are re-derived from the top
+counts, so the work per review does not grow with the number of reviews.
+
+Like ``book_stats``, the helpers only stage changes on the caller's session;
+call them next to the write they describe and commit both together.
+"""
+import re
+from collections import Counter
+
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db import models
+
+LIKED_RATING = 4
+TOP_AUTHORS = 5
+TOP_KEYWORDS = 10
+AUTHOR = "author"
+KEYWORD = "keyword"
+PROFILE_KEYS = {"liked_authors": (AUTHOR, TOP_AUTHORS), "liked_keywords": (KEYWORD, TOP_KEYWORDS)}
+# Counter terms and joined profile values both land in String(255) columns.
+MAX_TERM_CHARS = 64
+MAX_PROFILE_CHARS = 255
+
+STOPWORDS = {
+    "the",
+    "and",
+    "for",
+    "that",
+    "with",
+    "this",
+    "from",
+    "have",
+    "were",
+    "been",
+    "into",
+    "about",
+    "would",
+    "could",
+    "their",
+    "there",
+    "they",
+    "them",
+    "book",
+    "story",
+    "very",
+    "really",
+}
+
+_WORD = re.compile(r"[a-zA-Z]{4,}")
+
+Terms = Counter  # (kind, term) -> occurrences
+
+
+def extract_keywords(text: str) -> list[str]:
+    words = _WORD.findall((text or "").lower())
+    return [w for w in words if w not in STOPWORDS]
+
+
+def review_terms(rating: int, comment: str | None, author: str | None) -> Terms:
+    """What one review contributes to its author's counters; empty unless it is a like."""
+    terms: Terms = Counter()
+    if rating < LIKED_RATING:
+        return terms
+    if author:
+        terms[(AUTHOR, author)] += 1
+    if comment:
+        # A "word" longer than this is noise (a URL, a keyboard mash), not an interest.
+        terms.update((KEYWORD, word) for word in extract_keywords(comment) if len(word) <= MAX_TERM_CHARS)
+    return terms
+
+
+def profile_value(top: list[str]) -> str:
+    """Join the top terms, dropping the lowest ranked ones that would overflow the column."""
+    value = ""
+    for term in top:
+        joined = f"{value},{term}" if value else term
+        if len(joined) > MAX_PROFILE_CHARS:
+            break
+        value = joined
+    return value
+
+
+async def record_review(
+    db: AsyncSession, user_id: int, rating: int, comment: str | None, author: str | None
+) -> None:
+    terms = review_terms(rating, comment, author)
+    if terms:
+        await _add_counts(db, user_id, terms)
+        await refresh_user_preferences(db, user_id)
+
+
+async def forget_book(db: AsyncSession, book: models.Book) -> list[int]:
+    """Take a book's liked reviews out of their users' counters before it is deleted.
+
+    Returns the users whose profiles were rewritten.
+    """
+    rows = (
+        await db.execute(
+            select(models.Review.user_id, models.Review.rating, models.Review.comment).where(
+                models.Review.book_id == book.id, models.Review.rating >= LIKED_RATING
+            )
+        )
+    ).all()
+    by_user: dict[int, Terms] = {}
+    for user_id, rating, comment in rows:
+        by_user.setdefault(user_id, Counter()).update(review_terms(rating, comment, book.author))
+    for user_id, terms in by_user.items():
+        await _add_counts(db, user_id, terms, sign=-1)
+        await refresh_user_preferences(db, user_id)
+    return list(by_user)
+
+
+async def change_book_author(
+    db: AsyncSession, book_id: int, old_author: str | None, new_author: str | None
+) -> list[int]:
+    """Move the author counters of everyone who liked the book to its new author.
+
+    Returns the users whose profiles were rewritten.
+    """
+    if old_author == new_author:
+        return []
+    rows = (
+        await db.execute(
+            select(models.Review.user_id, func.count())
+            .where(models.Review.book_id == book_id, models.Review.rating >= LIKED_RATING)
+            .group_by(models.Review.user_id)
+        )
+    ).all()
+    for user_id, likes in rows:
+        if old_author:
+            await _add_counts(db, user_id, Counter({(AUTHOR, old_author): likes}), sign=-1)
+        if new_author:
+            await _add_counts(db, user_id, Counter({(AUTHOR, new_author): likes}))
+        await refresh_user_preferences(db, user_id)
+    return [user_id for user_id, _ in rows]
+
+
+async def refresh_user_preferences(db: AsyncSession, user_id: int) -> None:
+    """Rewrite one user's profile rows from the top of their counters."""
+    await db.execute(
+        delete(models.UserPreference).where(
+            models.UserPreference.user_id == user_id,
+            models.UserPreference.key.in_(PROFILE_KEYS),
+        )
+    )
+    for key, (kind, limit) in PROFILE_KEYS.items():
+        top = (
+            await db.execute(
+                select(models.UserPreferenceCount.term)
+                .where(
+                    models.UserPreferenceCount.user_id == user_id,
+                    models.UserPreferenceCount.kind == kind,
+                )
+                .order_by(models.UserPreferenceCount.count.desc(), models.UserPreferenceCount.term)
+                .limit(limit)
+            )
+        ).scalars().all()
+        if value := profile_value(top):
+            db.add(models.UserPreference(user_id=user_id, key=key, value=value))
+
+
+async def rebuild_preferences(db: AsyncSession, users_per_batch: int = 500) -> int:
+    """Recompute every counter and profile from reviews; return the number of users profiled.
+
+    Offline repair for drift or a changed keyword rule. Works through users in
+    batches so memory stays bounded at any review count.
+    """
+    await db.execute(delete(models.UserPreferenceCount))
+    await db.execute(delete(models.UserPreference).where(models.UserPreference.key.in_(PROFILE_KEYS)))
+
+    profiled, after = 0, 0
+    while True:
+        user_ids = (
+            await db.execute(
+                select(models.Review.user_id)
+                .where(models.Review.user_id > after, models.Review.rating >= LIKED_RATING)
+                .distinct()
+                .order_by(models.Review.user_id)
+                .limit(users_per_batch)
+            )
+        ).scalars().all()
+        if not user_ids:
+            break
+        after = user_ids[-1]
+        rows = await db.execute(
+            select(models.Review.user_id, models.Review.rating, models.Review.comment, models.Book.author)
+            .join(models.Book, models.Book.id == models.Review.book_id)
+            .where(models.Review.user_id.in_(user_ids), models.Review.rating >= LIKED_RATING)
+        )
+        by_user: dict[int, Terms] = {}
+        for user_id, rating, comment, author in rows:
+            by_user.setdefault(user_id, Counter()).update(review_terms(rating, comment, author))
+        counts = [
+            {"user_id": user_id, "kind": kind, "term": term, "count": count}
+            for user_id, terms in by_user.items()
+            for (kind, term), count in terms.items()
+        ]
+        profiles = [
+            {"user_id": user_id, "key": key, "value": value}
+            for user_id, terms in by_user.items()
+            for key, (kind, limit) in PROFILE_KEYS.items()
+            if (value := profile_value(_top_terms(terms, kind, limit)))
+        ]
+        if counts:
+            await db.execute(insert(models.UserPreferenceCount), counts)
+        if profiles:
+            await db.execute(insert(models.UserPreference), profiles)
+        profiled += len(by_user)
+    await db.commit()
+    return profiled
+
+
+def _top_terms(terms: Terms, kind: str, limit: int) -> list[str]:
+    # Same order as refresh_user_preferences: count descending, then term.
+    ranked = sorted(
+        ((count, term) for (term_kind, term), count in terms.items() if term_kind == kind),
+        key=lambda item: (-item[0], item[1]),
+    )
+    return [term for _, term in ranked[:limit]]
+
+
+async def _add_counts(db: AsyncSession, user_id: int, terms: Terms, sign: int = 1) -> None:
+    dialect_insert = postgresql.insert if db.bind.dialect.name == "postgresql" else sqlite.insert
+    stmt = dialect_insert(models.UserPreferenceCount).values(
+        [
+            {"user_id": user_id, "kind": kind, "term": term, "count": sign * count}
+            for (kind, term), count in terms.items()
+        ]
+    )
+    await db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=["user_id", "kind", "term"],
+            set_={"count": models.UserPreferenceCount.count + stmt.excluded.count},
+        )
+    )
+    if sign < 0:
+        await db.execute(
+            delete(models.UserPreferenceCount).where(
+                models.UserPreferenceCount.user_id == user_id,
+                models.UserPreferenceCount.count <= 0,
+            )
+        )
@@ -3,7 +3,14 @@ from typing import List
 
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.metrics import metrics
 from app.db import models
+from app.services.book_index import get_book_index
+from app.services.book_vectors import get_book_vectors
+from app.services.item_similarity import get_item_similarity
+from app.services.recommendation_cache import recommendation_cache
+
+RESULT_LIMIT = 10
 
 
 def _split_csv(value: str | None) -> set[str]:
@@ -12,14 +19,45 @@ def _split_csv(value: str | None) -> set[str]:
     return {item.strip().lower() for item in value.split(",") if item.strip()}
 
 
-def _book_text(book: models.Book) -> str:
-    return f"{book.title or ''} {book.author or ''} {book.description or ''} {book.summary or ''}".lower()
-
-
 async def get_recommendations_for_user(db: AsyncSession, user: models.User) -> List[models.Book]:
-    books = (await db.execute(select(models.Book))).scalars().all()
-    if not books:
-        return []
+    # Catch the index up first: its sync announces other processes' book writes to the cache.
+    await get_book_index(db)
+    cached_ids = recommendation_cache.get(user.id)
+    if cached_ids is not None:
+        books = await _load_books(db, cached_ids)
+        if len(books) == len(cached_ids):
+            return [books[book_id] for book_id in cached_ids]
+        # A book was deleted by another process; score again so the index drops it too.
+        recommendation_cache.invalidate_users([user.id])
+
+    with metrics.timer("recommendations.compute_seconds"):
+        top, liked_keywords, liked_authors, complete = await _compute(db, user)
+    if complete:
+        recommendation_cache.put(user.id, [book.id for book in top], liked_keywords, liked_authors)
+    else:
+        # Scored without a model still being built; the next request should use it.
+        metrics.inc("recommendations.partial")
+    return top
+
+
+async def _load_books(db: AsyncSession, book_ids: List[int]) -> dict[int, models.Book]:
+    if not book_ids:
+        return {}
+    return {
+        book.id: book
+        for book in (await db.execute(select(models.Book).where(models.Book.id.in_(book_ids)))).scalars()
+    }
+
+
+async def _compute(
+    db: AsyncSession, user: models.User
+) -> tuple[List[models.Book], set[str], set[str], bool]:
+    """Score the catalog for a user; also return the liked keywords and authors used.
+
+    The last item is False when the collaborative or vector signal was left out
+    because its first build has not finished.
+    """
+    index = await get_book_index(db)
 
     pref_rows = (
         await db.execute(
@@ -39,55 +77,51 @@ async def get_recommendations_for_user(db: AsyncSession, user: models.User) -> L
     ).all()
     already_seen = {book_id for book_id, _ in reviewed_rows}
 
-    # Collaborative signal: users who liked the same books as current user.
+    # Collaborative signal: books most similar to the ones this user liked.
     my_liked_book_ids = {book_id for book_id, rating in reviewed_rows if rating >= 4}
-    similar_user_ids = set()
-    if my_liked_book_ids:
-        similar_rows = (
-            await db.execute(
-                select(models.Review.user_id)
-                .where(models.Review.book_id.in_(my_liked_book_ids), models.Review.rating >= 4)
-                .distinct()
-            )
-        ).all()
-        similar_user_ids = {uid for (uid,) in similar_rows if uid != user.id}
-
-    collaborative_scores = defaultdict(float)
-    if similar_user_ids:
-        collab_rows = (
-            await db.execute(
-                select(models.Review.book_id, models.Review.rating).where(
-                    models.Review.user_id.in_(similar_user_ids), models.Review.rating >= 4
-                )
-            )
-        ).all()
-        for book_id, rating in collab_rows:
-            collaborative_scores[book_id] += float(rating)
-
-    scored = []
-    for book in books:
-        if book.id in already_seen:
-            continue
-
-        score = 0.0
-        author_lower = (book.author or "").lower()
-        if author_lower and author_lower in liked_authors:
-            score += 3.0
-
-        text = _book_text(book)
-        if liked_keywords:
-            keyword_hits = sum(1 for kw in liked_keywords if kw in text)
-            score += min(3.0, keyword_hits * 0.5)
-
-        score += min(4.0, collaborative_scores.get(book.id, 0.0) / 5.0)
-
-        if score > 0:
-            scored.append((score, book))
-
-    scored.sort(key=lambda item: item[0], reverse=True)
-    top = [book for _, book in scored[:10]]
-    if top:
-        return top
+    # Neither build is waited for: at 1M reviews or 100k books it takes seconds.
+    similarity = await get_item_similarity(db, wait=False)
+    collaborative_scores = {}
+    if similarity is not None:
+        collaborative_scores = similarity.scores_for(my_liked_book_ids, exclude=already_seen)
+
+    # Vector signal: books whose text is close to what this user liked, even without shared keywords.
+    vectors = await get_book_vectors(db, wait=False)
+    vector_scores = {}
+    if vectors is not None:
+        vector_scores = vectors.scores_for(my_liked_book_ids, exclude=already_seen, k=RESULT_LIMIT * 5)
+    complete = similarity is not None and vectors is not None
+
+    # Content signal from the inverted index: only books matching a liked author or keyword.
+    author_matches = index.books_by_authors(liked_authors)
+    keyword_hits = index.keyword_hits(liked_keywords)
+
+    scores = defaultdict(float)
+    for book_id in author_matches:
+        scores[book_id] += 3.0
+    for book_id, hits in keyword_hits.items():
+        scores[book_id] += min(3.0, hits * 0.5)
+    for book_id, collaborative in collaborative_scores.items():
+        scores[book_id] += min(4.0, 4.0 * collaborative)
+    for book_id, cosine in vector_scores.items():
+        scores[book_id] += 2.0 * cosine
+
+    ranked = sorted(
+        ((score, book_id) for book_id, score in scores.items() if score > 0 and book_id not in already_seen),
+        key=lambda item: (-item[0], item[1]),
+    )
+    top_ids = [book_id for _, book_id in ranked[:RESULT_LIMIT * 2]]
+    if top_ids:
+        books = await _load_books(db, top_ids)
+        for book_id in top_ids:
+            if book_id not in books:
+                index.remove(book_id)  # deleted by another process since the last sync
+        top = [books[book_id] for book_id in top_ids if book_id in books][:RESULT_LIMIT]
+        if top:
+            return top, liked_keywords, liked_authors, complete
 
     # Cold-start fallback
-    return books[:10]
+    fallback = list(
+        (await db.execute(select(models.Book).order_by(models.Book.id).limit(RESULT_LIMIT))).scalars()
+    )
+    return fallback, liked_keywords, liked_authors, complete
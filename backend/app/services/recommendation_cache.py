@@ -0,0 +1,137 @@
+"""Per-user cache of recommendation results.
+
+An entry holds the ids of the books recommended to a user, together with the
+liked keywords and authors they were scored from. It lives for
+``recommendation_cache_ttl_seconds`` at most, and the least recently used entries
+are evicted beyond ``recommendation_cache_max_entries``. Writes that change a
+result drop only the entries they affect:
+
+- ``review_created`` and ``preferences_changed`` drop the users concerned;
+- ``book_indexed`` drops entries that contain the book or whose liked keywords
+  or authors match it, so it may now rank;
+- ``book_deleted`` drops entries that contain the book.
+
+The collaborative part of a score also moves when other users review; that is
+left to the TTL.
+"""
+import time
+from collections import OrderedDict, defaultdict
+from dataclasses import dataclass
+
+from app.core.config import settings
+from app.core.events import BOOK_DELETED, BOOK_INDEXED, PREFERENCES_CHANGED, REVIEW_CREATED, events
+from app.core.metrics import metrics
+from app.db import models
+
+
+@dataclass
+class _Entry:
+    book_ids: list[int]
+    keywords: set[str]
+    authors: set[str]
+    expires_at: float
+
+
+class RecommendationCache:
+    def __init__(self):
+        self._entries: "OrderedDict[int, _Entry]" = OrderedDict()
+        # Reverse maps for targeted invalidation: book id / keyword / author -> user ids.
+        self._by_book: dict[int, set[int]] = defaultdict(set)
+        self._by_keyword: dict[str, set[int]] = defaultdict(set)
+        self._by_author: dict[str, set[int]] = defaultdict(set)
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, user_id: int) -> list[int] | None:
+        entry = self._entries.get(user_id)
+        if entry is not None and entry.expires_at <= time.monotonic():
+            self.invalidate_users([user_id])
+            entry = None
+        if entry is None:
+            self.misses += 1
+            metrics.inc("recommendation_cache.misses")
+        else:
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+            metrics.inc("recommendation_cache.hits")
+        metrics.set_gauge("recommendation_cache.hit_rate", self.hits / (self.hits + self.misses))
+        return entry.book_ids if entry is not None else None
+
+    def put(self, user_id: int, book_ids: list[int], keywords: set[str], authors: set[str]) -> None:
+        if settings.recommendation_cache_ttl_seconds <= 0:
+            return
+        self._drop(user_id)
+        expires_at = time.monotonic() + settings.recommendation_cache_ttl_seconds
+        self._entries[user_id] = _Entry(list(book_ids), set(keywords), set(authors), expires_at)
+        for book_id in book_ids:
+            self._by_book[book_id].add(user_id)
+        for keyword in keywords:
+            self._by_keyword[keyword].add(user_id)
+        for author in authors:
+            self._by_author[author].add(user_id)
+        while len(self._entries) > settings.recommendation_cache_max_entries:
+            self._drop(next(iter(self._entries)))
+            metrics.inc("recommendation_cache.evictions")
+        metrics.set_gauge("recommendation_cache.entries", len(self._entries))
+
+    def invalidate_users(self, user_ids) -> None:
+        dropped = sum(self._drop(user_id) for user_id in set(user_ids))
+        if dropped:
+            metrics.inc("recommendation_cache.invalidations", dropped)
+            metrics.set_gauge("recommendation_cache.entries", len(self._entries))
+
+    def invalidate_book(self, book_id: int, tokens=(), author: str | None = None) -> None:
+        affected = set(self._by_book.get(book_id, ()))
+        for token in tokens:
+            affected |= self._by_keyword.get(token, set())
+        if author:
+            affected |= self._by_author.get(author, set())
+        self.invalidate_users(affected)
+
+    def clear(self) -> None:
+        self.invalidate_users(list(self._entries))
+
+    def _drop(self, user_id: int) -> bool:
+        entry = self._entries.pop(user_id, None)
+        if entry is None:
+            return False
+        for index, keys in (
+            (self._by_book, entry.book_ids),
+            (self._by_keyword, entry.keywords),
+            (self._by_author, entry.authors),
+        ):
+            for key in keys:
+                users = index.get(key)
+                if users is not None:
+                    users.discard(user_id)
+                    if not users:
+                        del index[key]
+        return True
+
+
+recommendation_cache = RecommendationCache()
+
+
+def _on_review_created(review: models.Review) -> None:
+    recommendation_cache.invalidate_users([review.user_id])
+
+
+def _on_preferences_changed(user_ids) -> None:
+    recommendation_cache.invalidate_users(user_ids)
+
+
+def _on_book_indexed(book_id: int, tokens, author: str | None) -> None:
+    recommendation_cache.invalidate_book(book_id, tokens, author)
+
+
+def _on_book_deleted(book_id: int) -> None:
+    recommendation_cache.invalidate_book(book_id)
+
+
+events.subscribe(REVIEW_CREATED, _on_review_created)
+events.subscribe(PREFERENCES_CHANGED, _on_preferences_changed)
+events.subscribe(BOOK_INDEXED, _on_book_indexed)
+events.subscribe(BOOK_DELETED, _on_book_deleted)
@@ -0,0 +1,374 @@
+"""Full-text catalog search: BM25 ranking over an SQLite FTS5 index on disk.
+
+The index is its own SQLite file (``search_index_path``), apart from the
+application database, so it behaves the same whichever database backs the app.
+Each book is one FTS5 row keyed by book id, with the title, author,
+description, summary and extracted text (up to ``search_body_max_chars``) as
+columns; ``bm25()`` ranks matches with the column weights below.
+
+One indexer task per API process keeps the file current. ``book_changed`` and
+``book_deleted`` events queue the books they name, and every
+``search_sync_seconds`` the indexer also reads books whose ``updated_at`` moved,
+which covers writes made by other processes. Books deleted elsewhere are pruned
+when a search finds them gone. ``python -m app.tasks.search_tasks`` rebuilds the
+index from scratch.
+"""
+import asyncio
+import logging
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from sqlalchemy import or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.events import BOOK_CHANGED, BOOK_DELETED, events
+from app.core.metrics import metrics
+from app.db import models
+from app.db.session import AsyncSessionLocal
+from app.services.storage import StorageBackend, get_storage
+from app.services.text_store import read_book_text
+
+logger = logging.getLogger(__name__)
+
+# title, author, description, summary, text
+COLUMN_WEIGHTS = (10.0, 8.0, 3.0, 2.0, 1.0)
+MAX_QUERY_TERMS = 16
+SYNC_BATCH = 500
+SYNC_OVERLAP_SECONDS = 60
+SHUTDOWN_GRACE_SECONDS = 10.0
+
+_SCHEMA = f"""
+CREATE VIRTUAL TABLE IF NOT EXISTS books USING fts5(
+    title, author, description, summary, body,
+    tokenize = 'porter unicode61 remove_diacritics 2',
+    prefix = '2 3'
+);
+INSERT INTO books(books, rank) VALUES ('rank', 'bm25({", ".join(map(str, COLUMN_WEIGHTS))})');
+CREATE TABLE IF NOT EXISTS indexed_text (book_id INTEGER PRIMARY KEY, text_key TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+"""
+
+_TERM = re.compile(r"\w+")
+
+
+def match_expression(query: str) -> str | None:
+    """Turn free text into an FTS5 query: every word must match, the last one as a prefix."""
+    terms = _TERM.findall((query or "").lower())[:MAX_QUERY_TERMS]
+    if not terms:
+        return None
+    quoted = [f'"{term}"' for term in terms]
+    quoted[-1] += "*"  # the last word may still be being typed
+    return " ".join(quoted)
+
+
+class SearchIndex:
+    """The FTS5 file. Methods are blocking; call them through ``asyncio.to_thread``."""
+
+    def __init__(self, path: str | Path):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        # One connection writes and one reads, so searches are not queued behind a large write.
+        self._writer = self._connect(path)
+        self._reader = self._connect(path)
+        self._write_lock = threading.Lock()
+        self._read_lock = threading.Lock()
+        with self._write_lock:
+            if not self._writer.execute("SELECT 1 FROM sqlite_master WHERE name = 'books'").fetchone():
+                self._writer.executescript(f"BEGIN IMMEDIATE; {_SCHEMA} COMMIT;")
+
+    @staticmethod
+    def _connect(path) -> sqlite3.Connection:
+        conn = sqlite3.connect(str(path), check_same_thread=False, isolation_level=None, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    @contextmanager
+    def _write(self):
+        with self._write_lock:
+            self._writer.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._writer
+            except BaseException:
+                self._writer.execute("ROLLBACK")
+                raise
+            self._writer.execute("COMMIT")
+
+    def __len__(self) -> int:
+        with self._read_lock:
+            return self._reader.execute("SELECT count(*) FROM books").fetchone()[0]
+
+    def put_books(self, rows) -> None:
+        """Index (id, title, author, description, summary) rows, keeping any indexed text."""
+        with self._write() as conn:
+            for book_id, title, author, description, summary in rows:
+                fields = (title or "", author or "", description or "", summary or "")
+                updated = conn.execute(
+                    "UPDATE books SET title = ?, author = ?, description = ?, summary = ? WHERE rowid = ?",
+                    (*fields, book_id),
+                ).rowcount
+                if not updated:
+                    conn.execute(
+                        "INSERT INTO books(rowid, title, author, description, summary, body) "
+                        "VALUES (?, ?, ?, ?, ?, '')",
+                        (book_id, *fields),
+                    )
+
+    def put_text(self, book_id: int, text_key: str, text: str) -> None:
+        with self._write() as conn:
+            if conn.execute("UPDATE books SET body = ? WHERE rowid = ?", (text, book_id)).rowcount:
+                conn.execute(
+                    "INSERT OR REPLACE INTO indexed_text(book_id, text_key) VALUES (?, ?)", (book_id, text_key)
+                )
+
+    def delete(self, book_ids) -> None:
+        params = [(book_id,) for book_id in book_ids]
+        with self._write() as conn:
+            conn.executemany("DELETE FROM books WHERE rowid = ?", params)
+            conn.executemany("DELETE FROM indexed_text WHERE book_id = ?", params)
+
+    def text_keys(self, book_ids) -> dict[int, str]:
+        """The text artifact each book was indexed from."""
+        ids = list(book_ids)
+        if not ids:
+            return {}
+        with self._read_lock:
+            rows = self._reader.execute(
+                f"SELECT book_id, text_key FROM indexed_text WHERE book_id IN ({','.join('?' * len(ids))})",
+                ids,
+            ).fetchall()
+        return dict(rows)
+
+    def search(
+        self, match: str, limit: int, offset: int = 0, max_candidates: int | None = None
+    ) -> list[tuple[int, float, str]]:
+        """(book id, score, snippet) of the best matches; a higher score is better.
+
+        BM25 scores every match, so a query made of very common words would cost time
+        in proportion to the catalog. Past ``max_candidates`` matches the query is
+        narrowed to titles and authors, and if that is still too broad, only the
+        newest ``max_candidates`` of those are ranked.
+        """
+        with self._read_lock:
+            floor = self._floor(match, max_candidates) if max_candidates else None
+            if floor is not None:
+                metrics.inc("search.narrowed")
+                match = f"{{title author}} : ({match})"
+                floor = self._floor(match, max_candidates)
+            rows = self._reader.execute(
+                "SELECT rowid, rank, snippet(books, -1, '[', ']', '…', 12) FROM books "
+                "WHERE books MATCH ? AND rowid > ? ORDER BY rank LIMIT ? OFFSET ?",
+                (match, floor or 0, limit, offset),
+            ).fetchall()
+        # FTS5 ranks with negated BM25 so that ascending order is best first.
+        return [(book_id, -rank, snippet) for book_id, rank, snippet in rows]
+
+    def _floor(self, match: str, max_candidates: int) -> int | None:
+        # Rowid just below the newest max_candidates matches; None when there are no more than that.
+        row = self._reader.execute(
+            "SELECT rowid FROM books WHERE books MATCH ? ORDER BY rowid DESC LIMIT 1 OFFSET ?",
+            (match, max_candidates),
+        ).fetchone()
+        return row[0] if row else None
+
+    def get_meta(self, key: str) -> str | None:
+        with self._read_lock:
+            row = self._reader.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key: str, value: str) -> None:
+        with self._write() as conn:
+            conn.execute("INSERT OR REPLACE INTO meta(key, value) VALUES (?, ?)", (key, value))
+
+    def clear(self) -> None:
+        with self._write() as conn:
+            conn.execute("DELETE FROM books")
+            conn.execute("DELETE FROM indexed_text")
+            conn.execute("DELETE FROM meta")
+
+    def close(self) -> None:
+        self._writer.close()
+        self._reader.close()
+
+
+_index: SearchIndex | None = None
+_pending: set[int] = set()
+_deleted: set[int] = set()
+_wakeup: asyncio.Event | None = None
+_indexer: asyncio.Task | None = None
+_stopping = False
+
+
+def index_path() -> Path:
+    return Path(settings.search_index_path or Path(settings.storage_path) / "search.sqlite3")
+
+
+def get_search_index() -> SearchIndex:
+    global _index
+    if _index is None:
+        _index = SearchIndex(index_path())
+    return _index
+
+
+def _on_book_changed(book: models.Book) -> None:
+    if _indexer is not None:
+        _pending.add(book.id)
+        _wakeup.set()
+
+
+def _on_book_deleted(book_id: int) -> None:
+    if _indexer is not None:
+        _deleted.add(book_id)
+        _wakeup.set()
+
+
+events.subscribe(BOOK_CHANGED, _on_book_changed)
+events.subscribe(BOOK_DELETED, _on_book_deleted)
+
+
+async def search_books(
+    db: AsyncSession, query: str, limit: int, offset: int = 0
+) -> list[tuple[models.Book, float, str]]:
+    """Books matching ``query`` with their BM25 score and a text snippet, best first."""
+    match = match_expression(query)
+    if match is None:
+        return []
+    index = get_search_index()
+    while True:
+        started = time.perf_counter()
+        hits = await asyncio.to_thread(index.search, match, limit, offset, settings.search_max_candidates)
+        metrics.observe("search.query_seconds", time.perf_counter() - started)
+        if not hits:
+            return []
+        ids = [book_id for book_id, _, _ in hits]
+        books = {
+            book.id: book
+            for book in (await db.execute(select(models.Book).where(models.Book.id.in_(ids)))).scalars()
+        }
+        gone = [book_id for book_id in ids if book_id not in books]
+        if not gone:
+            return [(books[book_id], score, snippet) for book_id, score, snippet in hits]
+        # Deleted by another process since the last sync. Search again without them, so the
+        # page stays full and the caller can tell whether another one follows.
+        await asyncio.to_thread(index.delete, gone)
+
+
+async def sync_search_index(db: AsyncSession, storage: StorageBackend) -> int:
+    """Index the queued books and those whose ``updated_at`` moved; return how many were indexed."""
+    index = get_search_index()
+    deleted, pending = set(_deleted), set(_pending)
+    if deleted:
+        await asyncio.to_thread(index.delete, deleted)
+        _deleted.difference_update(deleted)
+
+    stored = await asyncio.to_thread(index.get_meta, "watermark")
+    watermark = datetime.fromisoformat(stored) if stored else None
+    stmt = select(
+        models.Book.id,
+        models.Book.title,
+        models.Book.author,
+        models.Book.description,
+        models.Book.summary,
+        models.Book.updated_at,
+    ).order_by(models.Book.id)
+    if watermark is not None:
+        # Overlap the window: a write stamped before the watermark may commit after we read it.
+        since = watermark - timedelta(seconds=SYNC_OVERLAP_SECONDS)
+        changed = models.Book.updated_at >= since
+        stmt = stmt.where(or_(changed, models.Book.id.in_(pending)) if pending else changed)
+
+    indexed, newest = 0, watermark
+    result = await db.stream(stmt.execution_options(yield_per=SYNC_BATCH))
+    try:
+        async for rows in result.partitions():
+            await asyncio.to_thread(index.put_books, [row[:5] for row in rows])
+            await _index_texts(db, storage, index, [row[0] for row in rows])
+            indexed += len(rows)
+            for row in rows:
+                if row[5] is not None and (newest is None or row[5] > newest):
+                    newest = row[5]
+            if _stopping:
+                # Rows come in id order, so the watermark only moves after a full pass.
+                return indexed
+    finally:
+        await result.close()
+    if newest != watermark:
+        await asyncio.to_thread(index.set_meta, "watermark", newest.isoformat())
+    _pending.difference_update(pending)
+    metrics.inc("search.indexed_books", indexed)
+    return indexed
+
+
+async def _index_texts(db: AsyncSession, storage: StorageBackend, index: SearchIndex, book_ids) -> None:
+    # Extracted text is re-read only when the book points at a different artifact than was indexed.
+    texts = (
+        await db.execute(select(models.BookText).where(models.BookText.book_id.in_(book_ids)))
+    ).scalars().all()
+    indexed_keys = await asyncio.to_thread(index.text_keys, [text.book_id for text in texts])
+    for book_text in texts:
+        if indexed_keys.get(book_text.book_id) == book_text.key:
+            continue
+        try:
+            text = await read_book_text(storage, book_text, max_chars=settings.search_body_max_chars)
+        except Exception:
+            # Title and metadata stay searchable; the text is retried on the book's next sync.
+            metrics.inc("search.text_errors")
+            logger.exception("Could not read extracted text of book %s for search", book_text.book_id)
+            continue
+        await asyncio.to_thread(index.put_text, book_text.book_id, book_text.key, text)
+
+
+async def rebuild_search_index(db: AsyncSession, storage: StorageBackend) -> int:
+    """Drop the index and index the whole catalog again; return the number of books."""
+    index = get_search_index()
+    await asyncio.to_thread(index.clear)
+    _pending.clear()
+    _deleted.clear()
+    return await sync_search_index(db, storage)
+
+
+async def _run_indexer() -> None:
+    while not _stopping:
+        try:
+            await asyncio.wait_for(_wakeup.wait(), timeout=settings.search_sync_seconds)
+        except asyncio.TimeoutError:
+            pass
+        _wakeup.clear()
+        if _stopping:
+            break
+        try:
+            async with AsyncSessionLocal() as db:
+                await sync_search_index(db, get_storage())
+        except Exception:
+            metrics.inc("search.sync_errors")
+            logger.exception("Search index sync failed")
+
+
+def start_search_indexer() -> None:
+    global _wakeup, _indexer
+    if _indexer is None:
+        _wakeup = asyncio.Event()
+        _wakeup.set()  # catch up with whatever changed while the process was down
+        _indexer = asyncio.create_task(_run_indexer())
+
+
+async def shutdown_search_indexer() -> None:
+    global _index, _indexer, _stopping
+    if _indexer is not None:
+        # Stopped between batches rather than cancelled: a query cancelled in flight leaves
+        # its SQLite cursor open, and the read lock with it, until garbage collection.
+        _stopping = True
+        _wakeup.set()
+        try:
+            await asyncio.wait_for(_indexer, timeout=SHUTDOWN_GRACE_SECONDS)
+        except (asyncio.TimeoutError, asyncio.CancelledError):
+            pass
+        _indexer, _stopping = None, False
+    if _index is not None:
+        _index.close()
+        _index = None
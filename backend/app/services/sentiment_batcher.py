@@ -0,0 +1,74 @@
+"""Collect reviews that arrive close together and score them in one LLM prompt.
+
+A batch is sent when ``sentiment_batch_size`` reviews are waiting or
+``sentiment_batch_window_ms`` after the first one arrived, whichever comes first.
+"""
+import asyncio
+from typing import Any, Callable
+
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.services.llm import get_llm
+
+_batcher: "SentimentBatcher | None" = None
+_batcher_loop: asyncio.AbstractEventLoop | None = None
+
+
+class SentimentBatcher:
+    def __init__(self, llm_factory: Callable, max_batch: int, window_seconds: float):
+        self.llm_factory = llm_factory
+        self.max_batch = max(1, max_batch)
+        self.window_seconds = window_seconds
+        self._pending: list[tuple[str, asyncio.Future]] = []
+        self._timer: asyncio.Task | None = None
+        self._running: set[asyncio.Task] = set()
+
+    async def score(self, text: str) -> dict[str, Any]:
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((text, future))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = asyncio.create_task(self._flush_after_window())
+        return await future
+
+    async def _flush_after_window(self) -> None:
+        await asyncio.sleep(self.window_seconds)
+        self._timer = None
+        self._flush()
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.create_task(self._run(batch))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _run(self, batch: list[tuple[str, asyncio.Future]]) -> None:
+        metrics.inc("sentiment.batches")
+        metrics.inc("sentiment.batched_reviews", len(batch))
+        try:
+            results = await self.llm_factory().analyze_sentiment_batch([text for text, _ in batch])
+        except Exception as exc:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(exc)
+            return
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+
+def get_sentiment_batcher() -> SentimentBatcher:
+    # Futures belong to the running loop, so keep one batcher per loop.
+    global _batcher, _batcher_loop
+    loop = asyncio.get_running_loop()
+    if _batcher is None or _batcher_loop is not loop:
+        _batcher = SentimentBatcher(
+            get_llm, settings.sentiment_batch_size, settings.sentiment_batch_window_ms / 1000
+        )
+        _batcher_loop = loop
+    return _batcher
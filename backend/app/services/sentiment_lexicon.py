@@ -0,0 +1,156 @@
+"""Fast lexicon-based review sentiment, in the spirit of VADER.
+
+Handles negation ("not good"), intensifiers ("really good"), contrast
+("slow start but brilliant") and exclamation marks. Pure Python; a review is a
+regex split plus dictionary lookups, so thousands score in well under a second.
+"""
+import json
+import math
+import re
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any
+
+from app.core.config import settings
+
+# Hyphenated compounds ("page-turner", "must-read") stay one token.
+TOKEN_RE = re.compile(r"[a-z]+(?:['-][a-z]+)*|[!?.,;:]")
+CLAUSE_BREAKS = frozenset("!?.,;:")
+
+# Normalization constant: a raw sum of ~4 maps to ~0.7.
+ALPHA = 15.0
+NEGATION_SCALE = -0.74
+NEGATION_WINDOW = 3
+NEUTRAL_BAND = 0.05
+
+DEFAULT_WORDS: dict[str, float] = {
+    # positive
+    "good": 1.9, "great": 3.1, "excellent": 3.2, "amazing": 2.8, "awesome": 3.1,
+    "wonderful": 2.7, "brilliant": 2.8, "fantastic": 2.6, "superb": 3.0, "outstanding": 3.0,
+    "masterpiece": 3.1, "love": 3.2, "loved": 2.9, "loves": 2.7, "lovely": 2.8, "like": 1.5,
+    "liked": 1.8, "enjoy": 2.2, "enjoyed": 2.3, "enjoyable": 1.9, "beautiful": 2.9,
+    "beautifully": 2.7, "compelling": 2.0, "captivating": 2.4, "gripping": 2.1, "engaging": 1.9,
+    "insightful": 2.2, "thoughtful": 1.6, "clever": 1.9, "witty": 1.6, "funny": 1.9,
+    "charming": 2.4, "moving": 1.8, "powerful": 1.8, "fascinating": 2.5, "interesting": 1.7,
+    "recommend": 1.5, "recommended": 1.8, "favorite": 2.0, "favourite": 2.0, "best": 3.2,
+    "perfect": 2.7, "fun": 2.3, "delightful": 2.8, "inspiring": 2.4, "memorable": 2.0,
+    "vivid": 1.4, "rich": 1.3, "satisfying": 2.0, "solid": 1.2, "nice": 1.8, "pleasant": 2.0,
+    "happy": 2.7, "worth": 1.2, "page-turner": 2.4, "unputdownable": 2.8, "touching": 1.8,
+    "immersive": 1.9, "stunning": 2.7, "impressive": 2.1, "refreshing": 1.8, "well": 1.1,
+    "must-read": 2.4, "well-written": 2.3,
+    # negative
+    "bad": -2.5, "poor": -2.1, "terrible": -3.0, "awful": -3.1, "horrible": -2.5,
+    "worst": -3.1, "boring": -1.3, "bored": -1.1, "dull": -1.7, "tedious": -1.9, "slow": -0.8,
+    "hate": -2.7, "hated": -3.2, "dislike": -1.6, "disliked": -1.7, "disappointing": -2.2,
+    "disappointed": -1.9, "disappointment": -2.3, "waste": -1.8, "wasted": -2.2,
+    "confusing": -1.3, "confused": -1.3, "predictable": -1.1, "shallow": -1.4, "flat": -1.0,
+    "weak": -1.9, "annoying": -1.7, "pointless": -1.7, "mediocre": -1.3, "overrated": -1.6,
+    "forgettable": -1.5, "clumsy": -1.6, "cliche": -1.2, "cliched": -1.4, "painful": -1.9,
+    "unreadable": -2.4, "sloppy": -1.8, "bland": -1.5, "messy": -1.5, "frustrating": -2.0,
+    "drags": -1.2, "dragged": -1.3, "tiresome": -1.7, "stupid": -2.4, "ridiculous": -1.5,
+    "sad": -1.3, "unfortunately": -1.5, "lacking": -1.3, "lacks": -1.1, "fails": -1.9,
+    "failed": -2.0, "avoid": -1.2, "meh": -0.9, "uninspired": -1.8, "repetitive": -1.3,
+}
+
+DEFAULT_NEGATORS = frozenset(
+    {
+        "not", "no", "never", "none", "nothing", "neither", "nor", "without", "hardly",
+        "isn't", "wasn't", "aren't", "weren't", "don't", "doesn't", "didn't",
+        "can't", "couldn't", "won't", "wouldn't", "shouldn't", "ain't", "nobody",
+    }
+)
+
+DEFAULT_INTENSIFIERS: dict[str, float] = {
+    "very": 0.293, "really": 0.293, "extremely": 0.4, "incredibly": 0.4, "absolutely": 0.35,
+    "so": 0.25, "truly": 0.3, "totally": 0.3, "utterly": 0.35, "highly": 0.3, "super": 0.3,
+    "most": 0.25, "deeply": 0.3, "quite": 0.15, "too": 0.2,
+    "somewhat": -0.293, "slightly": -0.293, "kinda": -0.2, "fairly": -0.15, "barely": -0.3,
+    "little": -0.2, "mildly": -0.25,
+}
+
+CONTRAST_WORDS = frozenset({"but", "however", "though", "although", "yet"})
+
+
+@dataclass(frozen=True)
+class Lexicon:
+    words: dict[str, float] = field(default_factory=lambda: dict(DEFAULT_WORDS))
+    negators: frozenset[str] = DEFAULT_NEGATORS
+    intensifiers: dict[str, float] = field(default_factory=lambda: dict(DEFAULT_INTENSIFIERS))
+
+
+@lru_cache(maxsize=4)
+def load_lexicon(path: str | None = None) -> Lexicon:
+    """Built-in lexicon, overlaid with a JSON file of ``words``, ``negators`` and ``intensifiers``."""
+    if not path:
+        return Lexicon()
+    with open(path, encoding="utf-8") as f:
+        extra = json.load(f)
+    return Lexicon(
+        words={**DEFAULT_WORDS, **{k.lower(): float(v) for k, v in extra.get("words", {}).items()}},
+        negators=DEFAULT_NEGATORS | {w.lower() for w in extra.get("negators", [])},
+        intensifiers={
+            **DEFAULT_INTENSIFIERS,
+            **{k.lower(): float(v) for k, v in extra.get("intensifiers", {}).items()},
+        },
+    )
+
+
+def lexicon_sentiment(text: str, lexicon: Lexicon | None = None) -> dict[str, Any]:
+    """Score one review; ``confidence`` in [0, 1] says how much the lexicon evidence agrees."""
+    lexicon = lexicon or load_lexicon(settings.sentiment_lexicon_path)
+    tokens = TOKEN_RE.findall((text or "").lower())
+    words = lexicon.words
+    valences: list[float] = []
+    contrast_at = -1
+
+    for i, token in enumerate(tokens):
+        if token in CONTRAST_WORDS:
+            contrast_at = len(valences)
+            continue
+        valence = words.get(token)
+        if valence is None and token.endswith("s"):
+            valence = words.get(token[:-1])
+        if valence is None:
+            continue
+        for distance, prior in enumerate(reversed(tokens[max(0, i - NEGATION_WINDOW) : i]), start=1):
+            # Negation does not reach across punctuation or another sentiment word.
+            if prior in CLAUSE_BREAKS or prior in words:
+                break
+            boost = lexicon.intensifiers.get(prior)
+            if boost is not None and distance == 1:
+                valence *= 1 + boost  # dampeners (negative boosts) shrink it
+            if prior in lexicon.negators:
+                valence *= NEGATION_SCALE
+                break
+        valences.append(valence)
+
+    if not valences:
+        return {"score": 0.0, "label": "neutral", "rationale": "lexicon: no sentiment words", "confidence": 0.0}
+
+    if contrast_at >= 0:
+        # "slow start, but brilliant": what follows the contrast word dominates.
+        valences = [v * (0.5 if i < contrast_at else 1.5) for i, v in enumerate(valences)]
+
+    raw = sum(valences)
+    exclamations = min(tokens.count("!"), 4)
+    raw += math.copysign(0.292 * exclamations, raw) if raw else 0.0
+    score = raw / math.sqrt(raw * raw + ALPHA)
+
+    positive = sum(v for v in valences if v > 0)
+    negative = -sum(v for v in valences if v < 0)
+    agreement = abs(positive - negative) / (positive + negative)
+    coverage = min(1.0, len(valences) / 2)
+    confidence = round(agreement * coverage, 3)
+
+    if score >= NEUTRAL_BAND:
+        label = "positive"
+    elif score <= -NEUTRAL_BAND:
+        label = "negative"
+    else:
+        label = "neutral"
+    return {
+        "score": round(score, 4),
+        "label": label,
+        "rationale": f"lexicon: {len(valences)} sentiment words",
+        "confidence": confidence,
+    }
@@ -1,19 +1,98 @@
+import asyncio
+import hashlib
+import os
+import tempfile
 from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from functools import partial
 from pathlib import Path
-from typing import BinaryIO
+from typing import AsyncIterator, Awaitable, BinaryIO, Callable
 from uuid import uuid4
 
 import boto3
+from botocore.config import Config as BotoConfig
 from botocore.exceptions import ClientError
 
 from app.core.config import settings
 
 
+# S3 rejects multipart parts smaller than this (except the last one).
+S3_MIN_PART_BYTES = 5 * 1024 * 1024
+
+
+class UploadTooLargeError(Exception):
+    """Raised when a streamed upload exceeds the configured size limit."""
+
+
+@dataclass
+class StoredObject:
+    key: str
+    size: int
+    sha256: str
+
+
+class _UploadMeter:
+    """Tracks size and SHA-256 of a stream as it passes through."""
+
+    def __init__(self, max_bytes: int | None):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.digest = hashlib.sha256()
+
+    def update(self, chunk: bytes) -> None:
+        self.size += len(chunk)
+        if self.max_bytes is not None and self.size > self.max_bytes:
+            raise UploadTooLargeError(f"Upload exceeds {self.max_bytes} bytes")
+        self.digest.update(chunk)
+
+    def result(self, key: str) -> StoredObject:
+        return StoredObject(key=key, size=self.size, sha256=self.digest.hexdigest())
+
+
+def _content_name(sha256: str, filename: str) -> str:
+    # Sharded by hash prefix; the extension keeps media-type detection working.
+    return f"cas/{sha256[:2]}/{sha256}{Path(filename).suffix.lower()}"
+
+
+# Given the stored object once its hash is known, returns the key the content lives under.
+Claim = Callable[[StoredObject], Awaitable[str]]
+
+
 class StorageBackend(ABC):
     @abstractmethod
     async def save(self, fileobj: BinaryIO, filename: str) -> str:
         """Save the file object and return a path or key."""
 
+    @abstractmethod
+    async def save_stream(
+        self,
+        chunks: AsyncIterator[bytes],
+        filename: str,
+        max_bytes: int | None = None,
+        claim: Claim | None = None,
+    ) -> StoredObject:
+        """Write chunks as they arrive; raise UploadTooLargeError past max_bytes.
+
+        ``claim`` records the reference to the content (see ``acquire_blob``) and
+        returns its canonical key. Content-addressed backends claim before they
+        check whether the object exists, so a reference is already held when they
+        skip the write; others claim after writing their uniquely named copy and
+        drop it when an earlier copy is canonical.
+        """
+
+    @abstractmethod
+    def open_local(self, key: str):
+        """Async context manager yielding a local filesystem path for the object.
+
+        Raises FileNotFoundError when the object does not exist.
+        """
+
+    @abstractmethod
+    async def read_range(self, key: str, start: int, end: int) -> bytes:
+        """Return bytes [start, end) of the object."""
+
     @abstractmethod
     async def delete(self, key: str) -> None:
         """Remove the file identified by key."""
@@ -25,14 +104,21 @@ class StorageBackend(ABC):
         expires_seconds: int = 3600,
         disposition: str = "attachment",
         content_type: str | None = None,
+        filename: str | None = None,
     ) -> str | None:
         """Return a temporary URL when storage supports it (e.g. S3)."""
 
+    def close(self) -> None:
+        """Release clients and threads held by the backend."""
+
 
 class LocalStorage(StorageBackend):
-    def __init__(self, base_path: str | Path | None = None):
+    def __init__(self, base_path: str | Path | None = None, content_addressed: bool | None = None):
         self.base = Path(base_path or settings.storage_path)
         self.base.mkdir(parents=True, exist_ok=True)
+        if content_addressed is None:
+            content_addressed = settings.storage_content_addressed
+        self.content_addressed = content_addressed
 
     async def save(self, fileobj: BinaryIO, filename: str) -> str:
         safe_name = Path(filename).name
@@ -42,6 +128,55 @@ class LocalStorage(StorageBackend):
             f.write(fileobj.read())
         return str(dest)
 
+    async def save_stream(
+        self,
+        chunks: AsyncIterator[bytes],
+        filename: str,
+        max_bytes: int | None = None,
+        claim: Claim | None = None,
+    ) -> StoredObject:
+        safe_name = Path(filename).name
+        dest = self.base / f"{uuid4().hex}_{safe_name}"
+        meter = _UploadMeter(max_bytes)
+        try:
+            with open(dest, "wb") as f:
+                async for chunk in chunks:
+                    meter.update(chunk)
+                    await asyncio.to_thread(f.write, chunk)
+            key = str(dest)
+            if self.content_addressed:
+                key = str(self.base / _content_name(meter.digest.hexdigest(), safe_name))
+            if claim is not None:
+                key = await claim(meter.result(key))
+        except BaseException:
+            dest.unlink(missing_ok=True)
+            raise
+
+        if key != str(dest):
+            final = Path(key)
+            if final.exists():
+                # Same hash means same bytes: keep the copy already there.
+                dest.unlink()
+            else:
+                final.parent.mkdir(parents=True, exist_ok=True)
+                os.replace(dest, final)
+        return meter.result(key)
+
+    @asynccontextmanager
+    async def open_local(self, key: str):
+        path = Path(key)
+        if not path.exists():
+            raise FileNotFoundError(key)
+        yield path
+
+    async def read_range(self, key: str, start: int, end: int) -> bytes:
+        def _read() -> bytes:
+            with open(key, "rb") as f:
+                f.seek(start)
+                return f.read(end - start)
+
+        return await asyncio.to_thread(_read)
+
     async def delete(self, key: str) -> None:
         p = Path(key)
         if p.exists():
@@ -53,28 +188,49 @@ class LocalStorage(StorageBackend):
         expires_seconds: int = 3600,
         disposition: str = "attachment",
         content_type: str | None = None,
+        filename: str | None = None,
     ) -> str | None:
         return None
 
 
 class S3Storage(StorageBackend):
+    """S3 backend that keeps boto3's blocking calls off the event loop.
+
+    Calls run on a dedicated thread pool sized to the client's connection pool,
+    so concurrent requests reuse pooled keep-alive connections. Objects larger
+    than one part are sent as multipart uploads with parts in flight in parallel.
+    """
+
     def __init__(
         self,
         bucket: str | None = None,
         region: str | None = None,
         endpoint_url: str | None = None,
+        content_addressed: bool | None = None,
     ):
         self.bucket = bucket or settings.s3_bucket
+        if content_addressed is None:
+            content_addressed = settings.storage_content_addressed
+        self.content_addressed = content_addressed
         if not self.bucket:
             raise ValueError("s3_bucket must be configured when STORAGE_BACKEND=s3")
 
         self.prefix = settings.s3_object_prefix.strip("/") if settings.s3_object_prefix else ""
+        self.part_size = max(settings.s3_multipart_part_bytes, S3_MIN_PART_BYTES)
         self.client = boto3.client(
             "s3",
             region_name=region or settings.s3_region or None,
             endpoint_url=endpoint_url or settings.s3_endpoint_url or None,
             aws_access_key_id=settings.s3_access_key or None,
             aws_secret_access_key=settings.s3_secret_key or None,
+            config=BotoConfig(
+                max_pool_connections=settings.s3_max_pool_connections,
+                tcp_keepalive=True,
+                retries={"max_attempts": 5, "mode": "adaptive"},
+            ),
+        )
+        self._executor = ThreadPoolExecutor(
+            max_workers=settings.s3_max_pool_connections, thread_name_prefix="s3"
         )
 
         if settings.s3_create_bucket_if_missing:
@@ -87,18 +243,163 @@ class S3Storage(StorageBackend):
             # Works for AWS S3 and local S3-compatible providers like MinIO.
             self.client.create_bucket(Bucket=self.bucket)
 
+    async def _call(self, fn, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, partial(fn, *args, **kwargs))
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False)
+        self.client.close()
+
     def _build_key(self, filename: str) -> str:
         safe_name = Path(filename).name
         name = f"{uuid4().hex}_{safe_name}"
         return f"{self.prefix}/{name}" if self.prefix else name
 
+    def _content_key(self, sha256: str, filename: str) -> str:
+        name = _content_name(sha256, filename)
+        return f"{self.prefix}/{name}" if self.prefix else name
+
+    def _object_exists(self, key: str) -> bool:
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=key)
+            return True
+        except ClientError:
+            return False
+
+    async def _stream_parts(self, chunks: AsyncIterator[bytes], meter: _UploadMeter) -> AsyncIterator[bytes]:
+        buffer = bytearray()
+        async for chunk in chunks:
+            meter.update(chunk)
+            buffer += chunk
+            while len(buffer) >= self.part_size:
+                yield bytes(buffer[: self.part_size])
+                del buffer[: self.part_size]
+        if buffer:
+            yield bytes(buffer)
+
+    async def _file_parts(self, fileobj: BinaryIO) -> AsyncIterator[bytes]:
+        while part := await asyncio.to_thread(fileobj.read, self.part_size):
+            yield part
+
+    async def _upload(self, key: str, parts: AsyncIterator[bytes]) -> None:
+        """PUT small objects directly; otherwise multipart with parallel parts.
+
+        At most s3_multipart_concurrency parts are buffered or in flight at once.
+        """
+        first = await anext(parts, b"")
+        second = await anext(parts, None)
+        if second is None:
+            await self._call(self.client.put_object, Bucket=self.bucket, Key=key, Body=first)
+            return
+
+        upload = await self._call(self.client.create_multipart_upload, Bucket=self.bucket, Key=key)
+        upload_id = upload["UploadId"]
+        slots = asyncio.Semaphore(settings.s3_multipart_concurrency)
+        tasks: list[asyncio.Task] = []
+
+        async def _put_part(number: int, body: bytes) -> dict:
+            try:
+                resp = await self._call(
+                    self.client.upload_part,
+                    Bucket=self.bucket,
+                    Key=key,
+                    UploadId=upload_id,
+                    PartNumber=number,
+                    Body=body,
+                )
+                return {"ETag": resp["ETag"], "PartNumber": number}
+            finally:
+                slots.release()
+
+        async def _all_parts():
+            yield first
+            yield second
+            async for part in parts:
+                yield part
+
+        try:
+            number = 0
+            async for body in _all_parts():
+                await slots.acquire()
+                number += 1
+                tasks.append(asyncio.create_task(_put_part(number, body)))
+            completed = await asyncio.gather(*tasks)
+            await self._call(
+                self.client.complete_multipart_upload,
+                Bucket=self.bucket,
+                Key=key,
+                UploadId=upload_id,
+                MultipartUpload={"Parts": completed},
+            )
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await self._call(
+                self.client.abort_multipart_upload, Bucket=self.bucket, Key=key, UploadId=upload_id
+            )
+            raise
+
     async def save(self, fileobj: BinaryIO, filename: str) -> str:
         key = self._build_key(filename)
-        self.client.put_object(Bucket=self.bucket, Key=key, Body=fileobj.read())
+        await self._upload(key, self._file_parts(fileobj))
         return key
 
+    async def save_stream(
+        self,
+        chunks: AsyncIterator[bytes],
+        filename: str,
+        max_bytes: int | None = None,
+        claim: Claim | None = None,
+    ) -> StoredObject:
+        meter = _UploadMeter(max_bytes)
+        if not self.content_addressed:
+            key = self._build_key(filename)
+            await self._upload(key, self._stream_parts(chunks, meter))
+            if claim is None:
+                return meter.result(key)
+            try:
+                canonical = await claim(meter.result(key))
+            except BaseException:
+                await self.delete(key)
+                raise
+            if canonical != key:
+                await self.delete(key)
+            return meter.result(canonical)
+
+        # The key depends on the hash, so spool first (to disk past one chunk).
+        with tempfile.SpooledTemporaryFile(max_size=settings.upload_chunk_bytes) as spool:
+            async for chunk in chunks:
+                meter.update(chunk)
+                spool.write(chunk)
+            spool.seek(0)
+            key = self._content_key(meter.digest.hexdigest(), filename)
+            if claim is not None:
+                key = await claim(meter.result(key))
+            if not await self._call(self._object_exists, key):
+                await self._upload(key, self._file_parts(spool))
+        return meter.result(key)
+
+    @asynccontextmanager
+    async def open_local(self, key: str):
+        with tempfile.NamedTemporaryFile(suffix=Path(key).suffix) as tmp:
+            try:
+                await self._call(self.client.download_fileobj, self.bucket, key, tmp)
+            except ClientError as exc:
+                raise FileNotFoundError(key) from exc
+            tmp.flush()
+            yield Path(tmp.name)
+
+    async def read_range(self, key: str, start: int, end: int) -> bytes:
+        def _read() -> bytes:
+            resp = self.client.get_object(Bucket=self.bucket, Key=key, Range=f"bytes={start}-{end - 1}")
+            return resp["Body"].read()
+
+        return await self._call(_read)
+
     async def delete(self, key: str) -> None:
-        self.client.delete_object(Bucket=self.bucket, Key=key)
+        await self._call(self.client.delete_object, Bucket=self.bucket, Key=key)
 
     async def get_download_url(
         self,
@@ -106,8 +407,10 @@ class S3Storage(StorageBackend):
         expires_seconds: int = 3600,
         disposition: str = "attachment",
         content_type: str | None = None,
+        filename: str | None = None,
     ) -> str | None:
-        filename = Path(key).name.split("_", 1)[1] if "_" in Path(key).name else Path(key).name
+        if not filename:
+            filename = Path(key).name.split("_", 1)[1] if "_" in Path(key).name else Path(key).name
         params = {
             "Bucket": self.bucket,
             "Key": key,
@@ -116,16 +419,44 @@ class S3Storage(StorageBackend):
         if content_type:
             params["ResponseContentType"] = content_type
 
-        return self.client.generate_presigned_url(
+        # Presigning may resolve credentials over the network on first use.
+        return await self._call(
+            self.client.generate_presigned_url,
             ClientMethod="get_object",
             Params=params,
             ExpiresIn=expires_seconds,
         )
 
 
-def get_storage() -> StorageBackend:
+_storage: StorageBackend | None = None
+
+
+def create_storage() -> StorageBackend:
     if settings.storage_backend == "local":
         return LocalStorage()
     if settings.storage_backend == "s3":
         return S3Storage()
     raise NotImplementedError(f"Unknown storage backend {settings.storage_backend}")
+
+
+def start_storage() -> StorageBackend:
+    global _storage
+    if _storage is None:
+        _storage = create_storage()
+    return _storage
+
+
+def shutdown_storage() -> None:
+    global _storage
+    if _storage is not None:
+        _storage.close()
+    _storage = None
+
+
+def get_storage() -> StorageBackend:
+    """The process-wide backend, started on first use outside the app lifespan.
+
+    Whoever runs the process (the app lifespan, the worker, a command) closes it
+    with ``shutdown_storage``.
+    """
+    return start_storage()
@@ -0,0 +1,276 @@
+"""Map-reduce summarization over a book's full extracted text.
+
+Sections of up to ``summary_chunk_chars`` are summarized in parallel (map), then the
+section summaries are combined in rounds until they fit one prompt (reduce). Every
+partial summary is checkpointed in ``summary_chunks``, so a run that dies part way
+resumes from the sections it already finished.
+"""
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from typing import AsyncIterator, Awaitable, Callable
+
+from sqlalchemy import delete, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.db import models
+from app.db.session import AsyncSessionLocal
+from app.services.llm import SUMMARY_PROMPT_VERSION, LLMProvider, LLMResult
+from app.services.storage import get_storage
+from app.services.text_store import get_book_text, iter_book_pages
+
+logger = logging.getLogger(__name__)
+
+EMPTY_BOOK_SUMMARY = "No textual content available to summarize."
+
+# After this many combine rounds the remaining partials are trimmed into one final prompt.
+MAX_REDUCE_LEVELS = 4
+
+
+@dataclass
+class SummaryReport:
+    book_id: int
+    sections: int = 0
+    resumed: int = 0
+    llm_calls: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    wall_seconds: float = 0.0
+
+    def add(self, result: LLMResult) -> None:
+        if not result.cached:
+            self.llm_calls += 1
+        self.prompt_tokens += result.prompt_tokens
+        self.completion_tokens += result.completion_tokens
+
+
+async def iter_sections(pages: AsyncIterator[str], size: int) -> AsyncIterator[str]:
+    """Regroup pages into sections of at most ``size`` characters, cut at whitespace when possible."""
+    buffer = ""
+    async for page in pages:
+        buffer = f"{buffer}\n{page}" if buffer else page
+        while len(buffer) > size:
+            cut = buffer.rfind("\n", 0, size)
+            if cut < size // 2:
+                cut = buffer.rfind(" ", 0, size)
+            if cut < size // 2:
+                cut = size
+            yield buffer[:cut]
+            buffer = buffer[cut:].lstrip()
+    if buffer.strip():
+        yield buffer
+
+
+async def summarize_book(book_id: int, llm: LLMProvider) -> tuple[str, SummaryReport] | None:
+    """Summarize the book's whole text artifact; None if the book has no artifact."""
+    started = time.perf_counter()
+    async with AsyncSessionLocal() as db:
+        book_text = await get_book_text(db, book_id)
+        if book_text is None:
+            return None
+        checkpoints = await _load_checkpoints(db, book_id, book_text.sha256)
+
+    report = SummaryReport(book_id=book_id)
+    size = max(1000, settings.summary_chunk_chars)
+    sections = iter_sections(iter_book_pages(get_storage(), book_text), size)
+    first = await anext(sections, None)
+    second = await anext(sections, None) if first is not None else None
+
+    if first is None:
+        summary = EMPTY_BOOK_SUMMARY
+    elif second is None:
+        # Short book: one prompt, same as before map-reduce.
+        report.sections = 1
+        summary = await llm.summarize(first)
+    else:
+        summary = await _map_reduce(
+            book_id, book_text.sha256, llm, _chain(first, second, sections), size, checkpoints, report
+        )
+
+    async with AsyncSessionLocal() as db:
+        await discard_checkpoints(db, book_id)
+        await db.commit()
+
+    report.wall_seconds = time.perf_counter() - started
+    metrics.inc("summary.tokens.prompt", report.prompt_tokens)
+    metrics.inc("summary.tokens.completion", report.completion_tokens)
+    metrics.observe("summary.wall_seconds", report.wall_seconds)
+    logger.info(
+        "Summarized book_id=%s: %s sections (%s resumed), %s LLM calls, "
+        "%s prompt + %s completion tokens in %.1fs",
+        book_id,
+        report.sections,
+        report.resumed,
+        report.llm_calls,
+        report.prompt_tokens,
+        report.completion_tokens,
+        report.wall_seconds,
+    )
+    return summary, report
+
+
+async def discard_checkpoints(db: AsyncSession, book_id: int) -> None:
+    """Caller commits."""
+    await db.execute(delete(models.SummaryChunk).where(models.SummaryChunk.book_id == book_id))
+
+
+async def _chain(first: str, second: str, rest: AsyncIterator[str]) -> AsyncIterator[str]:
+    yield first
+    yield second
+    async for section in rest:
+        yield section
+
+
+async def _load_checkpoints(
+    db: AsyncSession, book_id: int, source_sha256: str
+) -> dict[tuple[int, int], str]:
+    # Checkpoints from another text artifact or prompt version cannot be reused.
+    await db.execute(
+        delete(models.SummaryChunk).where(
+            models.SummaryChunk.book_id == book_id,
+            or_(
+                models.SummaryChunk.source_sha256 != source_sha256,
+                models.SummaryChunk.prompt_version != SUMMARY_PROMPT_VERSION,
+            ),
+        )
+    )
+    await db.commit()
+    rows = (
+        await db.execute(select(models.SummaryChunk).where(models.SummaryChunk.book_id == book_id))
+    ).scalars()
+    return {(row.level, row.chunk_index): row.summary for row in rows}
+
+
+async def _map_reduce(
+    book_id: int,
+    source_sha256: str,
+    llm: LLMProvider,
+    sections: AsyncIterator[str],
+    size: int,
+    checkpoints: dict[tuple[int, int], str],
+    report: SummaryReport,
+) -> str:
+    async def step(level: int, index: int, work: Callable[[], Awaitable[LLMResult]]) -> str:
+        result = await work()
+        report.add(result)
+        async with AsyncSessionLocal() as db:
+            await db.merge(
+                models.SummaryChunk(
+                    book_id=book_id,
+                    level=level,
+                    chunk_index=index,
+                    source_sha256=source_sha256,
+                    prompt_version=SUMMARY_PROMPT_VERSION,
+                    summary=result.text,
+                    prompt_tokens=result.prompt_tokens,
+                    completion_tokens=result.completion_tokens,
+                )
+            )
+            await db.commit()
+        return result.text
+
+    # Map: sections are read lazily, so at most `concurrency` of them are held at once.
+    partials = await _run_level(
+        0,
+        _numbered(sections, report),
+        lambda section: (lambda: llm.summarize_section(section)),
+        step,
+        checkpoints,
+        report,
+    )
+
+    if not partials:
+        return EMPTY_BOOK_SUMMARY
+
+    level = 0
+    while True:
+        groups = _group(partials, size)
+        if len(groups) == 1 or level >= MAX_REDUCE_LEVELS:
+            break
+        level += 1
+        combined = await _run_level(
+            level,
+            _as_async(groups),
+            lambda group: (lambda: llm.combine_summaries(group, final=False)),
+            step,
+            checkpoints,
+            report,
+        )
+        partials = combined or partials
+
+    if len(groups) > 1:
+        share = size // len(partials)
+        partials = [part[:share] for part in partials]
+    result = await llm.combine_summaries(partials, final=True)
+    report.add(result)
+    return result.text or "\n\n".join(partials)[:size]
+
+
+async def _run_level(level, items, make_work, step, checkpoints, report) -> list[str]:
+    slots = asyncio.Semaphore(max(1, settings.summary_map_concurrency))
+    results: dict[int, str] = {}
+    errors: list[BaseException] = []
+
+    async def run(index: int, work) -> None:
+        try:
+            results[index] = await step(level, index, work)
+        except Exception as exc:
+            errors.append(exc)
+        finally:
+            slots.release()
+
+    tasks: list[asyncio.Task] = []
+    try:
+        async for index, item in items:
+            if (level, index) in checkpoints:
+                results[index] = checkpoints[(level, index)]
+                if level == 0:
+                    report.resumed += 1
+                continue
+            await slots.acquire()
+            if errors:
+                # Stop scheduling; steps already running finish and keep their checkpoints.
+                slots.release()
+                break
+            tasks.append(asyncio.create_task(run(index, make_work(item))))
+        await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+    if errors:
+        raise errors[0]
+    # Empty answers carry nothing forward.
+    return [results[i] for i in sorted(results) if results[i]]
+
+
+async def _numbered(sections: AsyncIterator[str], report: SummaryReport):
+    index = 0
+    async for section in sections:
+        report.sections += 1
+        yield index, section
+        index += 1
+
+
+async def _as_async(groups: list[list[str]]):
+    for index, group in enumerate(groups):
+        yield index, group
+
+
+def _group(partials: list[str], size: int) -> list[list[str]]:
+    groups: list[list[str]] = []
+    current: list[str] = []
+    length = 0
+    for part in partials:
+        if current and length + len(part) > size:
+            groups.append(current)
+            current, length = [], 0
+        current.append(part)
+        length += len(part) + 2
+    if current:
+        groups.append(current)
+    return groups
@@ -0,0 +1,196 @@
+"""Persisted extracted text: one zlib frame per page, read back lazily by byte range.
+
+The artifact is written once at ingest through the configured StorageBackend and
+shared between books with identical content via the ``blobs`` reference counts.
+"""
+import json
+import zlib
+from dataclasses import dataclass
+from functools import partial
+from pathlib import Path
+from typing import AsyncIterator
+
+from sqlalchemy import select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db import models
+from app.services.blobs import acquire_blob, reap_blob, release_blob
+from app.services.extraction import SUPPORTED_SUFFIXES, extracted_pages
+from app.services.storage import StorageBackend, StoredObject
+
+ARTIFACT_FILENAME = "extracted.ztext"
+
+
+@dataclass
+class _ArtifactWriter:
+    offsets: list[int]
+    char_count: int = 0
+    preview: str = ""
+    preview_chars: int = 0
+
+    async def frames(self, pages: AsyncIterator[str]) -> AsyncIterator[bytes]:
+        async for page in pages:
+            frame = zlib.compress(page.encode("utf-8"))
+            self.offsets.append(self.offsets[-1] + len(frame))
+            self.char_count += len(page)
+            if len(self.preview) < self.preview_chars:
+                self.preview += page + "\n"
+            yield frame
+
+
+async def save_book_text(
+    db: AsyncSession,
+    storage: StorageBackend,
+    book_id: int,
+    pages: AsyncIterator[str],
+    preview_chars: int = 0,
+) -> tuple[models.BookText, str]:
+    """Store the pages as an artifact for book_id and return it with a text preview.
+
+    The preview is the first ``preview_chars`` characters, collected while
+    streaming so callers need not read the artifact back. Caller commits.
+    """
+    writer = _ArtifactWriter(offsets=[0], preview_chars=preview_chars)
+    # Identical text already stored under another key is kept and shared.
+    stored = await storage.save_stream(writer.frames(pages), ARTIFACT_FILENAME, claim=partial(acquire_blob, db))
+    book_text = models.BookText(
+        book_id=book_id,
+        key=stored.key,
+        sha256=stored.sha256,
+        page_offsets=json.dumps(writer.offsets),
+        page_count=len(writer.offsets) - 1,
+        char_count=writer.char_count,
+    )
+    db.add(book_text)
+    return book_text, writer.preview[:preview_chars]
+
+
+async def get_book_text(db: AsyncSession, book_id: int) -> models.BookText | None:
+    return await db.get(models.BookText, book_id)
+
+
+async def extract_book_text(
+    db: AsyncSession, storage: StorageBackend, book_id: int, file_path: str
+) -> models.BookText | None:
+    """Extract the stored file into book_id's artifact and commit; None for unsupported files.
+
+    Text cut short by a timeout or a parse error is kept but marked incomplete, so it
+    is not shared with later uploads and is extracted again on refresh. Raises
+    FileNotFoundError when the file is missing.
+    """
+    ext = Path(file_path).suffix.lower()
+    if ext not in SUPPORTED_SUFFIXES:
+        return None
+    async with storage.open_local(file_path) as local_path:
+        pages = extracted_pages(local_path, ext)
+        book_text, _ = await save_book_text(db, storage, book_id, pages)
+    book_text.complete = pages.complete
+    stored = StoredObject(
+        key=book_text.key, size=json.loads(book_text.page_offsets)[-1], sha256=book_text.sha256
+    )
+    try:
+        await db.commit()
+    except IntegrityError:
+        # The upload and its summary job both extracted the book; the first artifact stays.
+        await db.rollback()
+        # The rollback dropped our blob reference too; take it back and release it, so the
+        # object is reaped unless other books share it.
+        await acquire_blob(db, stored)
+        released = await release_blob(db, stored.sha256)
+        await db.commit()
+        if released:
+            await reap_blob(db, storage, stored.sha256)
+        return await get_book_text(db, book_id)
+    return book_text
+
+
+async def discard_incomplete_text(db: AsyncSession, storage: StorageBackend, book_id: int) -> bool:
+    """Drop an artifact from an interrupted extraction; True when the book has a complete one."""
+    book_text = await get_book_text(db, book_id)
+    if book_text is None or book_text.complete:
+        return book_text is not None
+    released = await release_book_text(db, book_id)
+    await db.commit()
+    if released:
+        await reap_blob(db, storage, released)
+    return False
+
+
+async def find_reusable_text(db: AsyncSession, content_hash: str) -> models.BookText | None:
+    """Complete artifact of an earlier book uploaded with the same bytes, if any."""
+    stmt = (
+        select(models.BookText)
+        .join(models.Book, models.Book.id == models.BookText.book_id)
+        .where(models.Book.content_hash == content_hash, models.BookText.complete.is_(True))
+        .limit(1)
+    )
+    return (await db.execute(stmt)).scalar_one_or_none()
+
+
+async def share_book_text(
+    db: AsyncSession, source: models.BookText, book_id: int
+) -> models.BookText | None:
+    """Point book_id at an existing artifact instead of extracting again. Caller commits.
+
+    Returns None when the artifact was released and reaped in the meantime.
+    """
+    taken = await db.execute(
+        update(models.Blob)
+        .where(models.Blob.sha256 == source.sha256)
+        .values(ref_count=models.Blob.ref_count + 1)
+    )
+    if not taken.rowcount:
+        return None
+    book_text = models.BookText(
+        book_id=book_id,
+        key=source.key,
+        sha256=source.sha256,
+        page_offsets=source.page_offsets,
+        page_count=source.page_count,
+        char_count=source.char_count,
+    )
+    db.add(book_text)
+    return book_text
+
+
+async def release_book_text(db: AsyncSession, book_id: int) -> str | None:
+    """Drop book_id's artifact row; return the blob's sha256 if nothing else uses it.
+
+    Reap it with ``reap_blob`` after committing.
+    """
+    book_text = await db.get(models.BookText, book_id)
+    if book_text is None:
+        return None
+    await db.delete(book_text)
+    return book_text.sha256 if await release_blob(db, book_text.sha256) else None
+
+
+async def read_page(storage: StorageBackend, book_text: models.BookText, index: int) -> str:
+    offsets = json.loads(book_text.page_offsets)
+    frame = await storage.read_range(book_text.key, offsets[index], offsets[index + 1])
+    return zlib.decompress(frame).decode("utf-8")
+
+
+async def iter_book_pages(
+    storage: StorageBackend, book_text: models.BookText, start: int = 0
+) -> AsyncIterator[str]:
+    """Yield pages one range read at a time, so only one page is held in memory."""
+    offsets = json.loads(book_text.page_offsets)
+    for index in range(start, len(offsets) - 1):
+        frame = await storage.read_range(book_text.key, offsets[index], offsets[index + 1])
+        yield zlib.decompress(frame).decode("utf-8")
+
+
+async def read_book_text(
+    storage: StorageBackend, book_text: models.BookText, max_chars: int | None = None
+) -> str:
+    parts: list[str] = []
+    total = 0
+    async for page in iter_book_pages(storage, book_text):
+        parts.append(page)
+        total += len(page) + 1
+        if max_chars is not None and total >= max_chars:
+            break
+    text = "\n".join(parts)
+    return text[:max_chars] if max_chars is not None else text
@@ -4,38 +4,87 @@ import asyncio
 from app.services.llm import get_llm
 from app.db.session import AsyncSessionLocal
 from app.db import models
+from app.services.book_stats import record_sentiment
+from app.services.sentiment_batcher import get_sentiment_batcher
+from app.services.sentiment_lexicon import lexicon_sentiment
+from app.services.storage import get_storage
+from app.services.summarizer import SummaryReport, summarize_book
+from app.services.text_store import extract_book_text, get_book_text
 from app.core.config import settings
+from app.core.events import BOOK_CHANGED, events
+from app.core.metrics import metrics
 
 logger = logging.getLogger(__name__)
 
 
-async def generate_summary(book_id: int, text: str):
+async def generate_summary(
+    book_id: int, text: str = "", reraise: bool = False
+) -> SummaryReport | None:
+    """Summarize the book's full text artifact, extracting it first if the book has none.
+
+    ``text`` is only used for books whose file cannot be extracted. With ``reraise`` a
+    failure propagates (so the job is retried) instead of being saved.
+    """
     summary = "__SUMMARY_FAILED__"
+    report = None
     try:
+        await _ensure_book_text(book_id)
         llm = get_llm()
-        max_chars = getattr(settings, "llm_max_input_chars", 12000)
-        safe_text = (text or "")[: max_chars]
-        summary = await llm.summarize(safe_text)
+        outcome = await summarize_book(book_id, llm)
+        if outcome is None:
+            max_chars = getattr(settings, "llm_max_input_chars", 12000)
+            safe_text = (text or "")[: max_chars]
+            summary = await llm.summarize(safe_text)
+        else:
+            summary, report = outcome
     except Exception:
+        if reraise:
+            raise
         logger.exception("Summary generation task failed for book_id=%s", book_id)
 
     await _persist_summary_with_retry(book_id, summary)
+    return report
+
 
+async def _ensure_book_text(book_id: int) -> None:
+    # The upload extracts before the job runs unless it died first, or a refresh dropped
+    # an incomplete artifact.
+    async with AsyncSessionLocal() as db:
+        book = await db.get(models.Book, book_id)
+        if book is None or await get_book_text(db, book_id):
+            return
+        try:
+            await extract_book_text(db, get_storage(), book_id, book.file_path)
+        except FileNotFoundError:
+            logger.warning("File for book_id=%s is missing; summarizing without its text", book_id)
 
-async def analyze_review(review_id: int, text: str):
+
+async def analyze_review(review_id: int, text: str, reraise: bool = False):
     score = 0.0
     try:
-        llm = get_llm()
         max_chars = getattr(settings, "llm_max_input_chars", 12000)
         safe_text = (text or "")[: max_chars]
-        result = await llm.analyze_sentiment(safe_text)
+        result = await _score_sentiment(safe_text)
         score = result.get("score")
     except Exception:
+        if reraise:
+            raise
         logger.exception("Review sentiment task failed for review_id=%s", review_id)
 
     await _persist_sentiment_with_retry(review_id, score)
 
 
+async def _score_sentiment(text: str) -> dict:
+    # Lexicon first when configured; only low-confidence reviews wait for the LLM.
+    if settings.sentiment_engine == "lexicon":
+        result = lexicon_sentiment(text)
+        if result["confidence"] >= settings.sentiment_llm_min_confidence:
+            metrics.inc("sentiment.engine.lexicon")
+            return result
+        metrics.inc("sentiment.engine.llm_escalations")
+    return await get_sentiment_batcher().score(text)
+
+
 async def _persist_summary_with_retry(book_id: int, summary: str, attempts: int = 5) -> None:
     for attempt in range(1, attempts + 1):
         async with AsyncSessionLocal() as db:
@@ -46,6 +95,7 @@ async def _persist_summary_with_retry(book_id: int, summary: str, attempts: int
                 book.summary = summary
                 await db.commit()
                 await db.refresh(book)
+                events.publish(BOOK_CHANGED, book=book)
                 return
             except Exception:
                 logger.exception(
@@ -64,7 +114,9 @@ async def _persist_sentiment_with_retry(review_id: int, score: float, attempts:
                 review = await db.get(models.Review, review_id)
                 if not review:
                     return
+                previous = review.sentiment_score
                 review.sentiment_score = score
+                await record_sentiment(db, review.book_id, previous, score)
                 await db.commit()
                 await db.refresh(review)
                 return
@@ -0,0 +1,20 @@
+import asyncio
+import logging
+
+from app.db.session import AsyncSessionLocal
+from app.services.preferences import rebuild_preferences
+
+logger = logging.getLogger(__name__)
+
+
+async def rebuild_user_preferences() -> int:
+    """Offline job: recompute preference counters and profiles from all reviews."""
+    async with AsyncSessionLocal() as db:
+        users = await rebuild_preferences(db)
+    logger.info("Rebuilt preference profiles for %s users", users)
+    return users
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(rebuild_user_preferences())
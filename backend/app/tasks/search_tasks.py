@@ -0,0 +1,24 @@
+import asyncio
+import logging
+
+from app.db.session import AsyncSessionLocal
+from app.services.search_index import rebuild_search_index
+from app.services.storage import get_storage, shutdown_storage
+
+logger = logging.getLogger(__name__)
+
+
+async def rebuild_book_search() -> int:
+    """Offline job: drop the full-text search index and index every book again."""
+    try:
+        async with AsyncSessionLocal() as db:
+            books = await rebuild_search_index(db, get_storage())
+    finally:
+        shutdown_storage()
+    logger.info("Indexed %s books for search", books)
+    return books
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(rebuild_book_search())
@@ -0,0 +1,23 @@
+import asyncio
+import logging
+
+from app.db.session import AsyncSessionLocal
+from app.services.book_stats import rebuild_book_stats
+
+logger = logging.getLogger(__name__)
+
+
+async def check_book_stats() -> int:
+    """Consistency job: rebuild book_stats from reviews and borrows."""
+    async with AsyncSessionLocal() as db:
+        corrected = await rebuild_book_stats(db)
+    if corrected:
+        logger.warning("book_stats consistency check corrected %s rows", corrected)
+    else:
+        logger.info("book_stats consistency check found no drift")
+    return corrected
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(check_book_stats())
@@ -0,0 +1,20 @@
+import asyncio
+import logging
+
+from app.db.session import AsyncSessionLocal
+from app.services.book_vectors import build_book_vectors
+
+logger = logging.getLogger(__name__)
+
+
+async def rebuild_book_vectors() -> int:
+    """Offline job: refit the book vectors and ANN index; running API processes reload them."""
+    async with AsyncSessionLocal() as db:
+        vectors = await build_book_vectors(db)
+    logger.info("Built %s-dimensional vectors for %s books", vectors.dim, len(vectors.ids))
+    return len(vectors.ids)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(rebuild_book_vectors())
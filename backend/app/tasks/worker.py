@@ -0,0 +1,216 @@
+"""Job worker: claims jobs from the ``jobs`` table and runs their handlers.
+
+Runs inside the API process when ``job_worker_in_process`` is set, or on its own:
+
+    python -m app.tasks.worker
+"""
+import asyncio
+import json
+import logging
+import os
+import signal
+import socket
+import traceback
+from typing import Any, Awaitable, Callable
+from uuid import uuid4
+
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.db.session import AsyncSessionLocal
+from app.services import jobs
+from app.services.extraction import shutdown_extraction_pool, start_extraction_pool
+from app.services.llm import shutdown_llm_client, start_llm_client
+from app.services.storage import shutdown_storage, start_storage
+from app.tasks.llm_tasks import analyze_review, generate_summary
+from app.tasks.review_tasks import update_book_consensus
+
+logger = logging.getLogger(__name__)
+
+# Handlers get the payload and whether this is the job's last attempt; raising retries the job.
+Handler = Callable[[dict[str, Any], bool], Awaitable[Any]]
+
+HANDLERS: dict[str, Handler] = {
+    "generate_summary": lambda p, last: generate_summary(
+        p["book_id"], p.get("text", ""), reraise=not last
+    ),
+    "analyze_review": lambda p, last: analyze_review(
+        p["review_id"], p.get("text", ""), reraise=not last
+    ),
+    "update_book_consensus": lambda p, last: update_book_consensus(p["book_id"]),
+}
+
+
+def default_lanes() -> dict[str, int]:
+    # Sentiment jobs wait on the batcher, so they need enough slots to fill a batch.
+    return {"analyze_review": settings.sentiment_batch_size}
+
+
+class JobWorker:
+    def __init__(
+        self,
+        concurrency: int | None = None,
+        poll_seconds: float | None = None,
+        handlers: dict[str, Handler] | None = None,
+        lanes: dict[str, int] | None = None,
+    ):
+        """``lanes`` gives job kinds their own slots, outside the shared ``concurrency``."""
+        self.concurrency = max(1, concurrency or settings.job_worker_concurrency)
+        self.poll_seconds = poll_seconds or settings.job_poll_seconds
+        self.handlers = handlers or HANDLERS
+        lanes = default_lanes() if lanes is None else lanes
+        self.lanes = {kind: max(1, size) for kind, size in lanes.items()}
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid4().hex[:6]}"
+        self._running: dict[int, asyncio.Task] = {}
+        self._lane_of: dict[int, str | None] = {}  # None is the shared pool
+        self._stopping = asyncio.Event()
+
+    async def run(self) -> None:
+        logger.info(
+            "Job worker %s started (concurrency %s, lanes %s)", self.worker_id, self.concurrency, self.lanes
+        )
+        wakeup = jobs.wakeup_event()
+        loop = asyncio.get_running_loop()
+        next_maintenance = 0.0
+        while not self._stopping.is_set():
+            if loop.time() >= next_maintenance:
+                await self._maintenance()
+                next_maintenance = loop.time() + settings.job_heartbeat_seconds
+
+            filled = False
+            for lane in [None, *self.lanes]:
+                free = self._size(lane) - sum(1 for other in self._lane_of.values() if other == lane)
+                if free > 0 and await self.run_once(free, lane) == free:
+                    filled = True
+            if filled:
+                continue
+            wakeup.clear()
+            waiters = [asyncio.ensure_future(wakeup.wait()), asyncio.ensure_future(self._stopping.wait())]
+            await asyncio.wait(
+                waiters + list(self._running.values()),
+                timeout=self.poll_seconds,
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+            for waiter in waiters:
+                waiter.cancel()
+        await self._drain()
+
+    async def run_once(self, limit: int | None = None, lane: str | None = None) -> int:
+        """Claim up to ``limit`` due jobs of a lane and start them; returns how many were claimed.
+
+        The default lane is the shared pool, which takes every kind without a lane of its own.
+        """
+        if lane is None:
+            filters = {"exclude_kinds": list(self.lanes)}
+        else:
+            filters = {"kinds": [lane]}
+        async with AsyncSessionLocal() as db:
+            claimed = await jobs.claim_jobs(db, self.worker_id, limit or self._size(lane), **filters)
+        for job in claimed:
+            task = asyncio.create_task(self._execute(job))
+            self._running[job.id] = task
+            self._lane_of[job.id] = lane
+            task.add_done_callback(lambda _, job_id=job.id: self._finished(job_id))
+        return len(claimed)
+
+    async def wait_idle(self) -> None:
+        while self._running:
+            await asyncio.gather(*self._running.values(), return_exceptions=True)
+
+    def stop(self) -> None:
+        self._stopping.set()
+
+    def _size(self, lane: str | None) -> int:
+        return self.concurrency if lane is None else self.lanes[lane]
+
+    def _finished(self, job_id: int) -> None:
+        self._running.pop(job_id, None)
+        self._lane_of.pop(job_id, None)
+
+    async def _execute(self, job) -> None:
+        handler = self.handlers.get(job.kind)
+        try:
+            if handler is None:
+                raise LookupError(f"No handler for job kind {job.kind!r}")
+            with metrics.timer(f"jobs.{job.kind}.seconds"):
+                await handler(json.loads(job.payload), job.attempts >= job.max_attempts)
+        except asyncio.CancelledError:
+            async with AsyncSessionLocal() as db:
+                await jobs.release_job(db, job.id)
+            raise
+        except Exception:
+            error = traceback.format_exc()
+            async with AsyncSessionLocal() as db:
+                status = await jobs.fail_job(db, job, error)
+            metrics.inc(f"jobs.{job.kind}.{'retried' if status == jobs.QUEUED else status}")
+            logger.warning("Job %s (%s) attempt %s failed; now %s", job.id, job.kind, job.attempts, status)
+            return
+        async with AsyncSessionLocal() as db:
+            await jobs.complete_job(db, job.id)
+        metrics.inc(f"jobs.{job.kind}.succeeded")
+
+    async def _maintenance(self) -> None:
+        try:
+            async with AsyncSessionLocal() as db:
+                await jobs.heartbeat(db, list(self._running), self.worker_id)
+                recovered = await jobs.recover_stale_jobs(db)
+                status = await jobs.queue_status(db)
+        except Exception:
+            logger.exception("Job worker maintenance failed")
+            return
+        if recovered:
+            logger.warning("Requeued %s jobs abandoned by a lost worker", recovered)
+        metrics.set_gauge("jobs.queue_depth", status["depth"])
+        metrics.set_gauge("jobs.running", status["by_status"][jobs.RUNNING])
+        metrics.set_gauge("jobs.dead", status["by_status"][jobs.DEAD])
+
+    async def _drain(self) -> None:
+        # Give running jobs a grace period, then hand the rest back to the queue.
+        if self._running:
+            _, unfinished = await asyncio.wait(
+                list(self._running.values()), timeout=settings.job_shutdown_grace_seconds
+            )
+            for task in unfinished:
+                task.cancel()
+            await asyncio.gather(*unfinished, return_exceptions=True)
+        logger.info("Job worker %s stopped", self.worker_id)
+
+
+_worker: JobWorker | None = None
+_worker_task: asyncio.Task | None = None
+
+
+def start_worker() -> None:
+    global _worker, _worker_task
+    if _worker_task is None:
+        _worker = JobWorker()
+        _worker_task = asyncio.create_task(_worker.run())
+
+
+async def shutdown_worker() -> None:
+    global _worker, _worker_task
+    if _worker is not None and _worker_task is not None:
+        _worker.stop()
+        await _worker_task
+    _worker, _worker_task = None, None
+
+
+async def _main() -> None:
+    # The same process-wide resources the API lifespan opens (see app.main), closed on exit.
+    start_extraction_pool()
+    start_storage()
+    start_llm_client()
+    try:
+        worker = JobWorker()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, worker.stop)
+        await worker.run()
+    finally:
+        shutdown_extraction_pool()
+        shutdown_storage()
+        await shutdown_llm_client()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_main())
@@ -0,0 +1,80 @@
+"""Build cost, query latency and recall of the book vectors' IVF index.
+
+Generates a synthetic catalog where each book draws most of its words from one
+of a few hundred topics, fits and saves the vectors, and compares IVF queries
+with an exact scan of the memory-mapped matrix:
+
+    JWT_SECRET=bench python -m benchmarks.book_vectors --books 100000
+"""
+import argparse
+import random
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from app.core.config import settings
+from app.services import book_vectors
+
+
+def _catalog(rng: random.Random, books: int, topics: int) -> list[tuple[str, str, str]]:
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    shared = ["".join(rng.choices(letters, k=8)) for _ in range(5000)]
+    topic_words = [["".join(rng.choices(letters, k=8)) for _ in range(60)] for _ in range(topics)]
+    catalog = []
+    for _ in range(books):
+        topic = rng.randrange(topics)
+        words = rng.choices(topic_words[topic], k=25) + rng.choices(shared, k=15)
+        catalog.append((" ".join(words[:4]), f"Author {rng.randrange(books // 5)}", " ".join(words[4:])))
+    return catalog
+
+
+def _summary(name: str, latencies: list[float]) -> str:
+    latencies = sorted(latencies)
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+    return f"{name}: mean {statistics.mean(latencies) * 1000:.2f} ms, p95 {p95 * 1000:.2f} ms"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--books", type=int, default=100_000)
+    parser.add_argument("--topics", type=int, default=300)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+
+    rng = random.Random(5)
+    catalog = _catalog(rng, args.books, args.topics)
+    ids = list(range(1, args.books + 1))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        started = time.perf_counter()
+        features = [book_vectors.book_features(title, author, text, None) for title, author, text in catalog]
+        arrays = book_vectors.fit(ids, features, settings.vector_dim)
+        book_vectors.save(Path(tmp), arrays, watermark=None)
+        print(f"fit and save: {time.perf_counter() - started:.1f}s for {args.books} books")
+        size = (Path(tmp) / book_vectors.VECTORS_FILE).stat().st_size
+        print(f"vector file: {size / 2**20:.1f} MiB ({arrays['vectors'].shape[1]} float32 dimensions)")
+
+        vectors = book_vectors.load(Path(tmp), settings.vector_ann_probes)
+        exact = book_vectors.load(Path(tmp), len(vectors.centroids))  # probing every list is a full scan
+        queries = rng.sample(ids, args.queries)
+        ann_latencies, exact_latencies, recall = [], [], []
+        for book_id in queries:
+            query = vectors.vector_for(book_id)
+            started = time.perf_counter()
+            approximate = vectors.nearest(query, args.k, exclude={book_id})
+            ann_latencies.append(time.perf_counter() - started)
+            started = time.perf_counter()
+            truth = exact.nearest(query, args.k, exclude={book_id})
+            exact_latencies.append(time.perf_counter() - started)
+            recall.append(len({i for i, _ in approximate} & {i for i, _ in truth}) / max(1, len(truth)))
+        print(_summary(f"IVF, {vectors.probes} of {len(vectors.centroids)} lists", ann_latencies))
+        print(_summary("exact scan", exact_latencies))
+        print(f"recall@{args.k}: {statistics.mean(recall):.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""Collaborative signal cost: the old similar-user SQL scan vs item-item neighbour lookup.
+
+Uses (and on first run seeds) the same database as ``benchmarks.preferences``:
+
+    DATABASE_URL=sqlite+aiosqlite:///./bench.db JWT_SECRET=bench \\
+        python -m benchmarks.item_similarity --reviews 1000000
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+from collections import defaultdict
+
+from sqlalchemy import select
+
+from app.db import models
+from app.db.migrations import run_migrations
+from app.db.session import AsyncSessionLocal, engine
+from app.services import item_similarity
+from benchmarks.preferences import _seed
+
+
+async def _legacy_scores(db, user_id: int) -> dict[int, float]:
+    # The two IN queries the recommendation endpoint used to run.
+    liked = (
+        await db.execute(
+            select(models.Review.book_id).where(models.Review.user_id == user_id, models.Review.rating >= 4)
+        )
+    ).scalars().all()
+    similar = (
+        await db.execute(
+            select(models.Review.user_id)
+            .where(models.Review.book_id.in_(liked), models.Review.rating >= 4)
+            .distinct()
+        )
+    ).scalars().all()
+    scores: dict[int, float] = defaultdict(float)
+    rows = await db.execute(
+        select(models.Review.book_id, models.Review.rating).where(
+            models.Review.user_id.in_([u for u in similar if u != user_id]), models.Review.rating >= 4
+        )
+    )
+    for book_id, rating in rows:
+        scores[book_id] += float(rating)
+    return scores
+
+
+def _summary(name: str, latencies: list[float]) -> str:
+    latencies = sorted(latencies)
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+    return f"{name}: mean {statistics.mean(latencies) * 1000:.2f} ms, p95 {p95 * 1000:.2f} ms"
+
+
+async def _run(args) -> None:
+    await run_migrations(engine)
+    await _seed(args.reviews, args.users, args.books)
+    rng = random.Random(3)
+
+    async with AsyncSessionLocal() as db:
+        started = time.perf_counter()
+        model = await item_similarity.build_item_similarity(db)
+        print(f"build: {time.perf_counter() - started:.1f}s for {len(model.neighbours)} books")
+        user_ids = (await db.execute(select(models.User.id))).scalars().all()
+        book_ids = (await db.execute(select(models.Book.id))).scalars().all()
+
+        sample = rng.sample(user_ids, args.samples)
+        likes = {
+            user_id: set(
+                (
+                    await db.execute(
+                        select(models.Review.book_id).where(
+                            models.Review.user_id == user_id, models.Review.rating >= 4
+                        )
+                    )
+                ).scalars()
+            )
+            for user_id in sample
+        }
+
+        lookup = []
+        for user_id in sample:
+            started = time.perf_counter()
+            model.scores_for(likes[user_id], exclude=likes[user_id])
+            lookup.append(time.perf_counter() - started)
+        print(_summary("neighbour lookup per user", lookup))
+
+        updates = []
+        for _ in range(args.samples):
+            started = time.perf_counter()
+            model.add_like(rng.choice(user_ids), rng.choice(book_ids))
+            updates.append(time.perf_counter() - started)
+        print(_summary("incremental update per like", updates))
+
+        legacy = []
+        for user_id in sample[: args.legacy_samples]:
+            started = time.perf_counter()
+            await _legacy_scores(db, user_id)
+            legacy.append(time.perf_counter() - started)
+        print(_summary("old similar-user SQL scan per user", legacy))
+    await engine.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--reviews", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=50_000)
+    parser.add_argument("--books", type=int, default=10_000)
+    parser.add_argument("--samples", type=int, default=200)
+    parser.add_argument("--legacy-samples", type=int, default=20)
+    asyncio.run(_run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""Cost of keeping preference profiles fresh after a review, at a large review count.
+
+Compares the old full recompute (every review, every user) with the
+counter-based update of one user, and times the offline full rebuild. Seeds the
+database given by DATABASE_URL on first run:
+
+    DATABASE_URL=sqlite+aiosqlite:///./bench.db JWT_SECRET=bench \\
+        python -m benchmarks.preferences --reviews 1000000
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+from collections import Counter
+
+from sqlalchemy import delete, func, insert, select
+
+from app.db import models
+from app.db.migrations import run_migrations
+from app.db.session import AsyncSessionLocal, engine
+from app.services import preferences
+
+WORDS = (
+    "gripping haunting lyrical slow clever brutal tender witty sprawling bleak dense "
+    "charming twisty moving political epic quiet dark hopeful strange vivid"
+).split()
+CHUNK = 20000
+
+
+async def _seed(reviews: int, users: int, books: int) -> None:
+    async with AsyncSessionLocal() as db:
+        existing = (await db.execute(select(func.count()).select_from(models.Review))).scalar_one()
+        if existing >= reviews:
+            return
+        print(f"seeding {users} users, {books} books, {reviews} reviews ...")
+        rng = random.Random(11)
+        await db.execute(
+            insert(models.User),
+            [{"email": f"bench{i}@example.com", "hashed_password": "x"} for i in range(users)],
+        )
+        await db.execute(
+            insert(models.Book),
+            [
+                {"title": f"Book {i}", "author": f"Author {i % (books // 10 or 1)}", "file_path": f"b{i}.txt"}
+                for i in range(books)
+            ],
+        )
+        user_ids = (await db.execute(select(models.User.id))).scalars().all()
+        book_ids = (await db.execute(select(models.Book.id))).scalars().all()
+        for start in range(0, reviews, CHUNK):
+            await db.execute(
+                insert(models.Review),
+                [
+                    {
+                        "user_id": rng.choice(user_ids),
+                        "book_id": rng.choice(book_ids),
+                        "rating": rng.randint(1, 5),
+                        "comment": " ".join(rng.choices(WORDS, k=8)),
+                    }
+                    for _ in range(min(CHUNK, reviews - start))
+                ],
+            )
+        await db.commit()
+
+
+async def _legacy_full_recompute(db) -> None:
+    # The recompute that used to run after every review.
+    rows = (
+        await db.execute(
+            select(models.Review.user_id, models.Review.rating, models.Review.comment, models.Book.author)
+            .join(models.Book, models.Book.id == models.Review.book_id)
+        )
+    ).all()
+    by_user: dict[int, list] = {}
+    for user_id, rating, comment, author in rows:
+        by_user.setdefault(user_id, []).append((rating, comment, author))
+    for user_id, entries in by_user.items():
+        liked_authors = [author for rating, _, author in entries if rating >= 4 and author]
+        keyword_counter = Counter()
+        for rating, comment, _ in entries:
+            if rating >= 4 and comment:
+                keyword_counter.update(preferences.extract_keywords(comment))
+        await db.execute(delete(models.UserPreference).where(models.UserPreference.user_id == user_id))
+        if liked_authors:
+            top_authors = ",".join(a for a, _ in Counter(liked_authors).most_common(5))
+            db.add(models.UserPreference(user_id=user_id, key="liked_authors", value=top_authors))
+        if keyword_counter:
+            top_keywords = ",".join(k for k, _ in keyword_counter.most_common(10))
+            db.add(models.UserPreference(user_id=user_id, key="liked_keywords", value=top_keywords))
+    await db.commit()
+
+
+async def _incremental(samples: int) -> list[float]:
+    rng = random.Random(5)
+    async with AsyncSessionLocal() as db:
+        user_ids = (await db.execute(select(models.User.id))).scalars().all()
+        books = (await db.execute(select(models.Book.id, models.Book.author))).all()
+    latencies = []
+    for _ in range(samples):
+        user_id = rng.choice(user_ids)
+        book_id, author = rng.choice(books)
+        comment = " ".join(rng.choices(WORDS, k=8))
+        started = time.perf_counter()
+        async with AsyncSessionLocal() as db:
+            db.add(models.Review(user_id=user_id, book_id=book_id, rating=5, comment=comment))
+            await preferences.record_review(db, user_id, 5, comment, author)
+            await db.commit()
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+async def _run(args) -> None:
+    await run_migrations(engine)
+    await _seed(args.reviews, args.users, args.books)
+
+    async with AsyncSessionLocal() as db:
+        started = time.perf_counter()
+        users = await preferences.rebuild_preferences(db)
+        print(f"full rebuild: {time.perf_counter() - started:.1f}s for {users} users")
+
+    latencies = sorted(await _incremental(args.samples))
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+    print(
+        f"per-review update (review insert + counters + profile, committed): "
+        f"mean {statistics.mean(latencies) * 1000:.2f} ms, p95 {p95 * 1000:.2f} ms"
+    )
+
+    if args.legacy:
+        async with AsyncSessionLocal() as db:
+            started = time.perf_counter()
+            await _legacy_full_recompute(db)
+            print(f"old per-review full recompute: {time.perf_counter() - started:.1f}s")
+        # Put the counter-derived profiles back.
+        async with AsyncSessionLocal() as db:
+            await preferences.rebuild_preferences(db)
+    await engine.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--reviews", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=50_000)
+    parser.add_argument("--books", type=int, default=10_000)
+    parser.add_argument("--samples", type=int, default=200)
+    parser.add_argument("--legacy", action="store_true", help="also time the old full recompute")
+    args = parser.parse_args()
+    asyncio.run(_run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""Compare the old blocking S3 upload path with the pooled multipart backend.
+
+Run against any S3-compatible endpoint, e.g. a local moto server or MinIO:
+
+    moto_server -p 5005 &
+    DATABASE_URL=sqlite+aiosqlite:///./bench.db JWT_SECRET=bench \\
+        python -m benchmarks.s3_upload --endpoint http://127.0.0.1:5005 --size-mb 64 --uploads 4
+
+For each mode it reports upload throughput and the worst event-loop stall seen
+by a 10 ms heartbeat task while the uploads run.
+"""
+import argparse
+import asyncio
+import time
+
+import boto3
+
+from app.core.config import settings
+from app.services.storage import S3Storage
+
+CHUNK = 1024 * 1024
+
+
+async def _chunks(size: int):
+    block = b"x" * CHUNK
+    sent = 0
+    while sent < size:
+        part = block[: min(CHUNK, size - sent)]
+        sent += len(part)
+        yield part
+
+
+async def _heartbeat(stop: asyncio.Event, lags: list[float]) -> None:
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        expected = loop.time() + 0.01
+        await asyncio.sleep(0.01)
+        lags.append(max(0.0, loop.time() - expected))
+
+
+async def _legacy_upload(client, bucket: str, size: int, index: int) -> None:
+    # What the old S3Storage.save did: buffer everything, then a blocking put_object.
+    body = b"".join([chunk async for chunk in _chunks(size)])
+    client.put_object(Bucket=bucket, Key=f"bench/legacy-{index}", Body=body)
+
+
+async def _run(mode: str, args, size: int) -> None:
+    # Clients are built before timing starts; only the uploads are measured.
+    if mode == "legacy":
+        client = boto3.client(
+            "s3",
+            endpoint_url=args.endpoint,
+            region_name="us-east-1",
+            aws_access_key_id="bench",
+            aws_secret_access_key="bench",
+        )
+        uploads = [_legacy_upload(client, args.bucket, size, i) for i in range(args.uploads)]
+    else:
+        storage = S3Storage(bucket=args.bucket, endpoint_url=args.endpoint, content_addressed=False)
+        uploads = [storage.save_stream(_chunks(size), f"bench-{i}.bin") for i in range(args.uploads)]
+
+    lags: list[float] = []
+    stop = asyncio.Event()
+    beat = asyncio.create_task(_heartbeat(stop, lags))
+    await asyncio.sleep(0.05)
+
+    started = time.perf_counter()
+    await asyncio.gather(*uploads)
+    elapsed = time.perf_counter() - started
+
+    stop.set()
+    await beat
+    if mode != "legacy":
+        storage.close()
+    total_mb = size * args.uploads / CHUNK
+    print(
+        f"{mode:>9}: {total_mb:.0f} MiB in {elapsed:.2f}s = {total_mb / elapsed:.1f} MiB/s, "
+        f"max loop stall {max(lags, default=0) * 1000:.0f} ms"
+    )
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--endpoint", required=True)
+    parser.add_argument("--bucket", default="luminalib-bench")
+    parser.add_argument("--size-mb", type=int, default=64)
+    parser.add_argument("--uploads", type=int, default=4)
+    args = parser.parse_args()
+
+    settings.s3_access_key = settings.s3_access_key or "bench"
+    settings.s3_secret_key = settings.s3_secret_key or "bench"
+    settings.s3_region = settings.s3_region or "us-east-1"
+    settings.s3_object_prefix = "bench"
+    boto3.client(
+        "s3",
+        endpoint_url=args.endpoint,
+        region_name="us-east-1",
+        aws_access_key_id="bench",
+        aws_secret_access_key="bench",
+    ).create_bucket(Bucket=args.bucket)
+
+    size = args.size_mb * CHUNK
+    for mode in ("legacy", "pooled"):
+        await _run(mode, args, size)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,86 @@
+"""Query latency of the full-text search index at catalog scale.
+
+Fills a throwaway index with synthetic books (title, author, description and
+``--text-words`` words of text each, Zipf-distributed) and times BM25 queries of
+varying selectivity, with and without the ``search_max_candidates`` bound:
+
+    JWT_SECRET=bench python -m benchmarks.search --books 100000 --text-words 500
+"""
+import argparse
+import itertools
+import random
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from app.core.config import settings
+from app.services.search_index import SearchIndex, match_expression
+
+BATCH = 1000
+
+
+def _vocabulary(rng: random.Random, size: int) -> list[str]:
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    return ["".join(rng.choices(letters, k=rng.randint(4, 10))) for _ in range(size)]
+
+
+def _zipf_words(rng: random.Random, vocabulary: list[str], cum_weights: list[float], k: int) -> str:
+    return " ".join(rng.choices(vocabulary, cum_weights=cum_weights, k=k))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--books", type=int, default=100_000)
+    parser.add_argument("--text-words", type=int, default=2000)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    vocabulary = _vocabulary(rng, 50_000)
+    # Zipf-like word frequencies: the n-th word is n times rarer than the first.
+    weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(vocabulary))))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        index = SearchIndex(Path(tmp) / "search.sqlite3")
+        started = time.perf_counter()
+        for start in range(0, args.books, BATCH):
+            ids = range(start + 1, min(start + BATCH, args.books) + 1)
+            index.put_books(
+                [
+                    (
+                        book_id,
+                        _zipf_words(rng, vocabulary, weights, 3),
+                        _zipf_words(rng, vocabulary, weights, 2),
+                        _zipf_words(rng, vocabulary, weights, 30),
+                        None,
+                    )
+                    for book_id in ids
+                ]
+            )
+            for book_id in ids:
+                index.put_text(book_id, f"k{book_id}", _zipf_words(rng, vocabulary, weights, args.text_words))
+        print(f"indexed {len(index)} books in {time.perf_counter() - started:.0f}s")
+
+        for name, band in (("common", (0, 50)), ("mid", (500, 5000)), ("rare", (20_000, 50_000))):
+            queries = [
+                match_expression(" ".join(vocabulary[rng.randrange(*band)] for _ in range(rng.randint(1, 3))))
+                for _ in range(args.queries)
+            ]
+            for label, max_candidates in (("ranked in full", None), ("bounded", settings.search_max_candidates)):
+                latencies = []
+                for match in queries:
+                    started = time.perf_counter()
+                    index.search(match, limit=11, max_candidates=max_candidates)
+                    latencies.append(time.perf_counter() - started)
+                latencies.sort()
+                p95 = latencies[int(len(latencies) * 0.95) - 1]
+                print(
+                    f"{name} terms, {label}: "
+                    f"mean {statistics.mean(latencies) * 1000:.2f} ms, p95 {p95 * 1000:.2f} ms"
+                )
+        index.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""Throughput of the lexicon sentiment scorer.
+
+    DATABASE_URL=sqlite+aiosqlite:///./bench.db JWT_SECRET=bench \\
+        python -m benchmarks.sentiment_lexicon --reviews 20000
+"""
+import argparse
+import random
+import time
+
+from app.core.config import settings
+from app.services.sentiment_lexicon import DEFAULT_WORDS, lexicon_sentiment, load_lexicon
+
+FILLER = "the book story author chapter plot characters ending pages writing style".split()
+MODIFIERS = ["not", "very", "really", "but", "somewhat", "!"]
+
+
+def _reviews(count: int, seed: int = 7) -> list[str]:
+    rng = random.Random(seed)
+    words = list(DEFAULT_WORDS)
+    reviews = []
+    for _ in range(count):
+        length = rng.randint(8, 60)
+        tokens = []
+        for _ in range(length):
+            roll = rng.random()
+            pool = words if roll < 0.15 else MODIFIERS if roll < 0.25 else FILLER
+            tokens.append(rng.choice(pool))
+        reviews.append(" ".join(tokens))
+    return reviews
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--reviews", type=int, default=20000)
+    args = parser.parse_args()
+
+    reviews = _reviews(args.reviews)
+    lexicon = load_lexicon(settings.sentiment_lexicon_path)
+    started = time.perf_counter()
+    results = [lexicon_sentiment(text, lexicon) for text in reviews]
+    elapsed = time.perf_counter() - started
+    confident = sum(1 for r in results if r["confidence"] >= 0.5)
+    print(
+        f"{len(reviews)} reviews in {elapsed:.3f}s = {len(reviews) / elapsed:,.0f} reviews/s, "
+        f"{confident / len(reviews):.0%} at confidence >= 0.5"
+    )
+
+
+if __name__ == "__main__":
+    main()
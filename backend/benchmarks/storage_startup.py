@@ -0,0 +1,74 @@
+"""Measure per-request storage setup cost: a new backend per request vs the app-scoped one.
+
+Each simulated request obtains a backend (a new one from ``create_storage()``, or
+the shared one from ``get_storage()``) and uploads a small object, which is what
+``POST /books/`` does. Run against a local moto
+server or MinIO:
+
+    moto_server -p 5005 &
+    DATABASE_URL=sqlite+aiosqlite:///./bench.db JWT_SECRET=bench \\
+        python -m benchmarks.storage_startup --endpoint http://127.0.0.1:5005 --requests 200
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from app.core.config import settings
+from app.services import storage as storage_module
+from app.services.storage import create_storage, get_storage, shutdown_storage, start_storage
+
+
+async def _payload():
+    yield b"x" * 4096
+
+
+async def _request(index: int, per_request: bool) -> float:
+    started = time.perf_counter()
+    storage = create_storage() if per_request else get_storage()
+    await storage.save_stream(_payload(), f"bench-{index}.txt")
+    if per_request:
+        # What the old dependency left behind: an S3 client and thread pool per request.
+        storage.close()
+    return time.perf_counter() - started
+
+
+async def _run(mode: str, requests: int) -> None:
+    per_request = mode == "per-request"
+    if not per_request:
+        start_storage()
+    latencies = [await _request(i, per_request) for i in range(requests)]
+    if not per_request:
+        shutdown_storage()
+    latencies.sort()
+    print(
+        f"{mode:>11}: mean {statistics.mean(latencies) * 1000:.2f} ms, "
+        f"p50 {latencies[len(latencies) // 2] * 1000:.2f} ms, "
+        f"p99 {latencies[int(len(latencies) * 0.99) - 1] * 1000:.2f} ms"
+    )
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--endpoint", required=True)
+    parser.add_argument("--bucket", default="luminalib-bench")
+    parser.add_argument("--requests", type=int, default=200)
+    args = parser.parse_args()
+
+    settings.storage_backend = "s3"
+    settings.storage_content_addressed = False
+    settings.s3_bucket = args.bucket
+    settings.s3_endpoint_url = args.endpoint
+    settings.s3_access_key = settings.s3_access_key or "bench"
+    settings.s3_secret_key = settings.s3_secret_key or "bench"
+    settings.s3_region = settings.s3_region or "us-east-1"
+    settings.s3_object_prefix = "bench"
+    settings.s3_create_bucket_if_missing = True
+
+    assert storage_module._storage is None
+    for mode in ("per-request", "shared"):
+        await _run(mode, args.requests)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,11 +1,39 @@
 """Conftest for pytest fixtures."""
+import asyncio
+
 import pytest
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker
 
 from app.db.base import Base
-from app.db.session import get_db
+from app.db.migrations import run_migrations
+from app.db.session import engine, get_db
 from app.main import app
+from app.services import book_vectors
+
+
+@pytest.fixture(scope="session", autouse=True)
+def migrated_database():
+    """Apply Alembic migrations to the configured database, as app startup does."""
+
+    async def _migrate():
+        await run_migrations(engine)
+        await engine.dispose()
+
+    loop = asyncio.new_event_loop()
+    try:
+        loop.run_until_complete(_migrate())
+    finally:
+        loop.close()
+
+
+@pytest.fixture(autouse=True)
+def own_vectors(tmp_path, monkeypatch):
+    """Build book vectors under the test's tmp_path rather than the working tree."""
+    monkeypatch.setattr("app.services.book_vectors.settings.vector_path", str(tmp_path / "vectors"))
+    book_vectors.reset_book_vectors()
+    yield
+    book_vectors.reset_book_vectors()
 
 
 @pytest.fixture
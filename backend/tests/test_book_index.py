@@ -0,0 +1,68 @@
+"""Tests for the inverted index behind content-based recommendations."""
+import random
+import string
+
+import pytest
+from sqlalchemy import update
+
+from app.core.events import BOOK_CHANGED, BOOK_DELETED, events
+from app.db import models
+from app.db.session import AsyncSessionLocal
+from app.services import book_index, book_vectors, item_similarity
+from app.services.book_index import BookIndex
+from app.services.recommendation import get_recommendations_for_user
+
+
+def _word() -> str:
+    return "".join(random.choices(string.ascii_lowercase, k=12))
+
+
+def test_index_maps_tokens_and_authors_to_books():
+    index = BookIndex()
+    index.put(1, "Dune", "Frank Herbert", "Desert politics and desert ecology", None)
+    index.put(2, "Emma", "Jane Austen", "Matchmaking", "Politics of a village")
+
+    assert index.keyword_hits({"politics", "desert", "ecology"}) == {1: 3, 2: 1}
+    assert index.books_by_authors({"frank herbert"}) == {1}
+
+    index.put(1, "Dune", "F. Herbert", "Sand", None)
+    assert index.keyword_hits({"politics", "desert"}) == {2: 1}
+    assert index.books_by_authors({"frank herbert", "f. herbert"}) == {1}
+
+    index.remove(2)
+    assert index.keyword_hits({"politics"}) == {}
+    assert "politics" not in index.keywords and len(index) == 1
+
+
+@pytest.mark.asyncio
+async def test_recommendations_follow_events_and_other_processes_writes(monkeypatch):
+    liked, later = _word(), _word()
+    async with AsyncSessionLocal() as db:
+        reader = models.User(email=f"{_word()}@test.com", hashed_password="x")
+        match = models.Book(title="Match", description=f"All about {liked}", file_path="m.txt")
+        other = models.Book(title="Other", file_path="o.txt")
+        db.add_all([reader, match, other])
+        await db.flush()
+        db.add(models.UserPreference(user_id=reader.id, key="liked_keywords", value=liked))
+        await db.commit()
+
+        await book_index.build_book_index(db)
+        await item_similarity.build_item_similarity(db)
+        await book_vectors.build_book_vectors(db)
+        assert [b.id for b in await get_recommendations_for_user(db, reader)] == [match.id]
+
+        # In-process writes arrive through events.
+        other.summary = f"Also {liked}"
+        await db.commit()
+        events.publish(BOOK_CHANGED, book=other)
+        assert {b.id for b in await get_recommendations_for_user(db, reader)} == {match.id, other.id}
+        events.publish(BOOK_DELETED, book_id=match.id)
+        assert [b.id for b in await get_recommendations_for_user(db, reader)] == [other.id]
+
+        # A write from another process (no event) is picked up by the periodic sync.
+        await db.execute(
+            update(models.Book).where(models.Book.id == match.id).values(summary=f"{liked} {later}")
+        )
+        await db.commit()
+        monkeypatch.setattr("app.services.book_index.settings.book_index_sync_seconds", 0)
+        assert {b.id for b in await get_recommendations_for_user(db, reader)} == {match.id, other.id}
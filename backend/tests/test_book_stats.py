@@ -0,0 +1,53 @@
+"""Tests for incrementally maintained per-book statistics."""
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+from app.db import models
+from app.db.base import Base
+from app.services import book_stats
+
+
+@pytest.mark.asyncio
+async def test_book_stats_track_writes_and_rebuild_repairs_drift():
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    async with AsyncSession(engine, expire_on_commit=False) as db:
+        reader = models.User(email="stats@test.com", hashed_password="x")
+        book = models.Book(title="Counted", file_path="counted.txt")
+        db.add_all([reader, book])
+        await db.flush()
+        await book_stats.init_book_stats(db, book.id)
+        await db.commit()
+
+        db.add(models.Borrow(user_id=reader.id, book_id=book.id))
+        await book_stats.set_current_borrower(db, book.id, reader.id)
+        review = models.Review(user_id=reader.id, book_id=book.id, rating=4, comment="fine")
+        db.add(review)
+        await book_stats.record_review(db, book.id, 4)
+        await db.commit()
+
+        review.sentiment_score = 0.5
+        await book_stats.record_sentiment(db, book.id, None, 0.5)
+        await db.commit()
+        review.sentiment_score = -0.5
+        await book_stats.record_sentiment(db, book.id, 0.5, -0.5)
+        await db.commit()
+
+        stats = await book_stats.get_book_stats(db, book.id)
+        await db.refresh(stats)
+        assert (stats.review_count, stats.rating_sum) == (1, 4)
+        assert (stats.sentiment_count, stats.sentiment_sum) == (1, -0.5)
+        assert stats.current_borrower_id == reader.id
+
+        stats.review_count = 42
+        stats.current_borrower_id = None
+        await db.commit()
+
+        assert await book_stats.rebuild_book_stats(db) == 1
+        await db.refresh(stats)
+        assert stats.review_count == 1
+        assert stats.current_borrower_id == reader.id
+        assert await book_stats.rebuild_book_stats(db) == 0
+    await engine.dispose()
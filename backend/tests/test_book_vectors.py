@@ -0,0 +1,115 @@
+"""Tests for the book vectors and ANN index behind similar-book lookups."""
+import asyncio
+import random
+import shutil
+import string
+
+import numpy as np
+import pytest
+from httpx import AsyncClient
+
+from app.core.events import BOOK_CHANGED, BOOK_DELETED, events
+from app.db import models
+from app.db.session import AsyncSessionLocal
+from app.main import app
+from app.services import book_vectors
+
+BOOKS = [
+    ("Dune", "Frank Herbert", "Desert planet, spice and the politics of empire"),
+    ("Dune Messiah", "Frank Herbert", "The emperor of the desert planet and the spice religion"),
+    ("Emma", "Jane Austen", "Matchmaking and manners in a quiet village"),
+    ("Persuasion", "Jane Austen", "A navy captain returns to the village; manners and romance"),
+    ("Moby Dick", "Herman Melville", "A captain's obsession with a white whale across the ocean"),
+]
+
+
+def _word() -> str:
+    return "".join(random.choices(string.ascii_lowercase, k=12))
+
+
+def test_saved_vectors_are_memory_mapped_and_follow_changes(tmp_path, monkeypatch):
+    features = [book_vectors.book_features(title, author, text, None) for title, author, text in BOOKS]
+    book_vectors.save(tmp_path, book_vectors.fit([1, 2, 3, 4, 5], features, dim=64), watermark=None)
+    vectors = book_vectors.load(tmp_path, probes=8)
+
+    assert isinstance(vectors.vectors, np.memmap) and vectors.vectors.dtype == np.float32
+    assert vectors.nearest(vectors.vector_for(1), 1, exclude={1})[0][0] == 2
+    assert vectors.nearest(vectors.vector_for(3), 1, exclude={3})[0][0] == 4
+    # A book projected later lands where the build put it.
+    title, author, text = BOOKS[0]
+    assert np.allclose(vectors.project(title, author, text, None), vectors.vector_for(1), atol=1e-5)
+
+    vectors.put(6, "Children of Dune", "Frank Herbert", "Desert planet spice", None)
+    vectors.remove(2)
+    neighbours = [book_id for book_id, _ in vectors.nearest(vectors.vector_for(1), 3, exclude={1})]
+    assert neighbours[0] == 6 and 2 not in neighbours
+    assert set(vectors.scores_for({3}, exclude={3}, k=3)) == {4}
+    assert vectors.overlay() is vectors.overlay()  # stacked once, not per query
+
+    monkeypatch.setattr(book_vectors, "EXTRA_REBUILD_MIN", 0)
+    assert vectors.outgrown  # 1 changed book is over a tenth of 5
+
+
+def test_load_rejects_files_from_different_or_broken_builds(tmp_path):
+    features = [book_vectors.book_features(title, author, text, None) for title, author, text in BOOKS]
+    first, second = tmp_path / "first", tmp_path / "second"
+    book_vectors.save(first, book_vectors.fit([1, 2, 3, 4, 5], features, dim=4, seed=1), watermark=None)
+    book_vectors.save(second, book_vectors.fit([1, 2, 3, 4, 5], features, dim=4, seed=2), watermark=None)
+    # No temp files are left behind.
+    assert {path.name for path in second.iterdir()} == {book_vectors.MODEL_FILE, book_vectors.VECTORS_FILE}
+
+    # Same shape, but the model of one build beside the vectors of another.
+    shutil.copy(first / book_vectors.MODEL_FILE, second / book_vectors.MODEL_FILE)
+    assert book_vectors.load(second, probes=8) is None
+    (first / book_vectors.MODEL_FILE).write_bytes(b"not an npz")
+    assert book_vectors.load(first, probes=8) is None
+
+
+@pytest.mark.asyncio
+async def test_concurrent_first_requests_share_one_build(monkeypatch):
+    fits = []
+    fit = book_vectors.fit
+
+    def counting_fit(*args, **kwargs):
+        fits.append(1)
+        return fit(*args, **kwargs)
+
+    monkeypatch.setattr(book_vectors, "fit", counting_fit)
+    async with AsyncSessionLocal() as first, AsyncSessionLocal() as second:
+        loaded = await asyncio.gather(
+            book_vectors.get_book_vectors(first), book_vectors.get_book_vectors(second)
+        )
+    assert loaded[0] is loaded[1]
+    assert len(fits) == 1
+
+
+@pytest.mark.asyncio
+async def test_similar_endpoint():
+    shared = [_word() for _ in range(3)]
+    async with AsyncSessionLocal() as db:
+        base = models.Book(title="Base", description=" ".join(shared), file_path="a.txt")
+        close = models.Book(title="Close", description=" ".join(shared[:2] + [_word()]), file_path="b.txt")
+        db.add_all([base, close])
+        await db.commit()
+        await book_vectors.build_book_vectors(db)
+
+        async with AsyncClient(app=app, base_url="http://test") as ac:
+            resp = await ac.get(f"/books/{base.id}/similar")
+            assert resp.status_code == 200
+            items = resp.json()["items"]
+            assert items[0]["id"] == close.id and 0 < items[0]["score"] <= 1
+            assert base.id not in [item["id"] for item in items]
+
+            # A book added after the build is projected on its event.
+            later = models.Book(title="Later", description=" ".join(shared), file_path="c.txt")
+            db.add(later)
+            await db.commit()
+            events.publish(BOOK_CHANGED, book=later)
+            items = (await ac.get(f"/books/{base.id}/similar")).json()["items"]
+            assert items[0]["id"] == later.id
+
+            events.publish(BOOK_DELETED, book_id=later.id)
+            items = (await ac.get(f"/books/{base.id}/similar")).json()["items"]
+            assert later.id not in [item["id"] for item in items]
+
+            assert (await ac.get("/books/999999/similar")).status_code == 404
@@ -1,8 +1,14 @@
 """Integration tests for book ingestion and library mechanics."""
+from pathlib import Path
+
 import pytest
 from httpx import AsyncClient
 
+from app.db import models
+from app.db.session import AsyncSessionLocal
 from app.main import app
+from app.services.storage import shutdown_storage
+from app.services.text_store import find_reusable_text, get_book_text
 
 
 @pytest.mark.asyncio
@@ -29,6 +35,15 @@ async def test_create_book_with_text_upload_and_list_books():
         assert isinstance(payload["items"], list)
         assert any(item["title"] == "Uploaded Book" for item in payload["items"])
 
+        capped_resp = await ac.get("/books/?page_size=100000&include_total=true")
+        assert capped_resp.status_code == 200
+        capped = capped_resp.json()
+        assert capped["page_size"] == 100
+        assert capped["total_estimate"] >= 1
+
+        bad_cursor_resp = await ac.get("/books/?cursor=not-a-cursor")
+        assert bad_cursor_resp.status_code == 400
+
 
 @pytest.mark.asyncio
 async def test_review_requires_borrow_and_borrow_return_flow():
@@ -79,8 +94,98 @@ async def test_review_requires_borrow_and_borrow_return_flow():
         )
         assert review_after_borrow.status_code == 200
 
+        analysis_resp = await ac.get(f"/books/{book_id}/analysis")
+        assert analysis_resp.status_code == 200
+        assert analysis_resp.json()["review_count"] == 1
+        assert analysis_resp.json()["average_rating"] == 4
+
         return_resp = await ac.post(f"/books/{book_id}/return", headers=auth_headers)
         assert return_resp.status_code == 200
 
         return_again_resp = await ac.post(f"/books/{book_id}/return", headers=auth_headers)
         assert return_again_resp.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_create_book_rejects_oversized_upload(monkeypatch):
+    monkeypatch.setattr("app.api.routes.books.settings.upload_max_bytes", 16)
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        resp = await ac.post(
+            "/books/",
+            data={"title": "Too Big"},
+            files={"file": ("big.txt", b"x" * 64, "text/plain")},
+        )
+        assert resp.status_code == 413
+
+        empty = await ac.post(
+            "/books/",
+            data={"title": "Empty"},
+            files={"file": ("empty.txt", b"", "text/plain")},
+        )
+        assert empty.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_content_addressed_uploads_share_blob_and_summary(tmp_path, monkeypatch, request):
+    monkeypatch.setattr("app.services.storage.settings.storage_path", str(tmp_path))
+    monkeypatch.setattr("app.services.storage.settings.storage_content_addressed", True)
+    shutdown_storage()  # rebuilt with the settings above
+    request.addfinalizer(shutdown_storage)
+    payload = b"identical content for dedup " + tmp_path.name.encode()
+
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        first = await ac.post(
+            "/books/",
+            data={"title": "Original"},
+            files={"file": ("same.txt", payload, "text/plain")},
+        )
+        assert first.status_code == 200
+        first_id = first.json()["id"]
+
+        async with AsyncSessionLocal() as db:
+            book = await db.get(models.Book, first_id)
+            book.summary = "A cached summary."
+            await db.commit()
+
+        second = await ac.post(
+            "/books/",
+            data={"title": "Re-upload"},
+            files={"file": ("copy.txt", payload, "text/plain")},
+        )
+        assert second.status_code == 200
+        assert second.json()["summary"] == "A cached summary."
+        assert second.json()["summary_status"] == "ready"
+
+        async with AsyncSessionLocal() as db:
+            original = await db.get(models.Book, first_id)
+            duplicate = await db.get(models.Book, second.json()["id"])
+            assert original.file_path == duplicate.file_path
+            blob_path = Path(original.file_path)
+
+        # Turning the mode off later must not make a delete remove the shared blob.
+        monkeypatch.setattr("app.services.storage.settings.storage_content_addressed", False)
+        assert (await ac.delete(f"/books/{first_id}")).status_code == 204
+        assert blob_path.exists()
+        assert (await ac.delete(f"/books/{second.json()['id']}")).status_code == 204
+        assert not blob_path.exists()
+
+
+@pytest.mark.asyncio
+async def test_interrupted_extraction_is_not_shared_with_later_uploads(tmp_path):
+    payload = b"%PDF-1.4 truncated " + tmp_path.name.encode()
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        ids = []
+        for name in ("first.pdf", "second.pdf"):
+            resp = await ac.post(
+                "/books/",
+                data={"title": "Broken"},
+                files={"file": (name, payload, "application/pdf")},
+            )
+            assert resp.status_code == 200
+            ids.append(resp.json()["id"])
+
+    async with AsyncSessionLocal() as db:
+        first, second = [await get_book_text(db, book_id) for book_id in ids]
+        # Each upload extracted on its own instead of inheriting the failed text.
+        assert not first.complete and not second.complete
+        assert await find_reusable_text(db, (await db.get(models.Book, ids[0])).content_hash) is None
@@ -0,0 +1,92 @@
+"""Tests for the batched catalog data-access layer."""
+import pytest
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+from app.db import models
+from app.db.base import Base
+from app.services.catalog import decode_cursor, fetch_book_page
+
+
+async def _seed(session: AsyncSession, book_count: int) -> None:
+    reader = models.User(email="reader@test.com", hashed_password="x", full_name="Reader")
+    session.add(reader)
+    await session.flush()
+    for i in range(book_count):
+        book = models.Book(title=f"Book {i}", file_path=f"book-{i}.txt")
+        session.add(book)
+        await session.flush()
+        session.add(models.Borrow(user_id=reader.id, book_id=book.id))
+        session.add(models.BookStats(book_id=book.id, current_borrower_id=reader.id))
+        for j in range(7):
+            session.add(
+                models.Review(user_id=reader.id, book_id=book.id, rating=4, comment=f"comment {j}")
+            )
+    await session.commit()
+
+
+def _count_queries(engine):
+    counter = {"queries": 0}
+
+    def before_cursor_execute(*args, **kwargs):
+        counter["queries"] += 1
+
+    event.listen(engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+    return counter
+
+
+async def _memory_engine():
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    return engine
+
+
+@pytest.mark.asyncio
+async def test_fetch_book_page_uses_constant_query_count():
+    engine = await _memory_engine()
+
+    async with AsyncSession(engine, expire_on_commit=False) as session:
+        await _seed(session, 12)
+
+        counter = _count_queries(engine)
+        small_page, _ = await fetch_book_page(session, offset=0, limit=2)
+        small_count = counter["queries"]
+
+        counter["queries"] = 0
+        large_page, _ = await fetch_book_page(session, offset=0, limit=12)
+        large_count = counter["queries"]
+    await engine.dispose()
+
+    assert len(small_page) == 2
+    assert len(large_page) == 12
+    assert small_count == large_count == 3
+
+    first = large_page[0]
+    assert first["current_borrower"] == "Reader"
+    assert len(first["recent_reviews"]) == 5
+    assert all(snippet["reviewer"] == "Reader" for snippet in first["recent_reviews"])
+
+
+@pytest.mark.asyncio
+async def test_cursor_pages_cover_catalog_once():
+    engine = await _memory_engine()
+    async with AsyncSession(engine, expire_on_commit=False) as session:
+        # Inserted within the same second, so ordering falls back to the id tie-breaker.
+        await _seed(session, 7)
+
+        seen = []
+        after = None
+        while True:
+            items, next_cursor = await fetch_book_page(session, limit=3, after=after)
+            seen.extend(item["id"] for item in items)
+            if not next_cursor:
+                break
+            after = decode_cursor(next_cursor)
+
+        offset_items, _ = await fetch_book_page(session, offset=3, limit=3)
+    await engine.dispose()
+
+    assert len(seen) == 7
+    assert seen == sorted(set(seen))
+    assert [item["id"] for item in offset_items] == seen[3:6]
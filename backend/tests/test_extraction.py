@@ -0,0 +1,88 @@
+"""Tests for process-pool text extraction."""
+import asyncio
+import time
+
+import pytest
+from pypdf import PdfWriter
+from pypdf.generic import DecodedStreamObject, DictionaryObject, NameObject
+
+from app.core.metrics import metrics
+from app.services import extraction
+from app.services.extraction import extracted_pages, iter_pages
+
+
+def _write_pdf(path, page_texts):
+    writer = PdfWriter()
+    font = writer._add_object(
+        DictionaryObject(
+            {
+                NameObject("/Type"): NameObject("/Font"),
+                NameObject("/Subtype"): NameObject("/Type1"),
+                NameObject("/BaseFont"): NameObject("/Helvetica"),
+            }
+        )
+    )
+    for text in page_texts:
+        page = writer.add_blank_page(200, 200)
+        page[NameObject("/Resources")] = DictionaryObject(
+            {NameObject("/Font"): DictionaryObject({NameObject("/F1"): font})}
+        )
+        content = DecodedStreamObject()
+        content.set_data(f"BT /F1 12 Tf 20 100 Td ({text}) Tj ET".encode())
+        page[NameObject("/Contents")] = writer._add_object(content)
+    with open(path, "wb") as f:
+        writer.write(f)
+
+
+@pytest.mark.asyncio
+async def test_iter_pages_streams_pdf_pages_up_to_limit(tmp_path, monkeypatch):
+    monkeypatch.setattr("app.services.extraction.settings.extraction_max_pages", 3)
+    monkeypatch.setattr("app.services.extraction.settings.extraction_pages_per_batch", 2)
+    pdf_path = tmp_path / "book.pdf"
+    _write_pdf(pdf_path, [f"page {i}" for i in range(5)])
+
+    pages = [page async for page in iter_pages(pdf_path, ".pdf")]
+
+    assert pages == ["page 0", "page 1", "page 2"]
+
+
+@pytest.mark.asyncio
+async def test_extracted_pages_handle_text_and_broken_pdf(tmp_path):
+    text_path = tmp_path / "book.txt"
+    text_path.write_text("plain text body", encoding="utf-8")
+    broken_path = tmp_path / "broken.pdf"
+    broken_path.write_bytes(b"not a pdf")
+
+    text = extracted_pages(text_path, ".txt")
+    assert [page async for page in text] == ["plain text body"] and text.complete
+    broken = extracted_pages(broken_path, ".pdf")
+    assert [page async for page in broken] == [] and not broken.complete
+    snapshot = metrics.snapshot()
+    assert snapshot["timings"]["extraction.latency_seconds"]["count"] >= 2
+    assert snapshot["gauges"]["extraction.in_flight"] == 0
+
+
+@pytest.mark.asyncio
+async def test_timed_out_batch_is_killed_and_others_are_resubmitted(monkeypatch):
+    monkeypatch.setattr("app.services.extraction.settings.extraction_workers", 2)
+    extraction.shutdown_extraction_pool()
+    extraction.start_extraction_pool()
+    old = extraction._executor
+    old_processes = []
+    try:
+        # Warm both workers so the timeout below is spent in the task, not in spawning.
+        await asyncio.gather(*(asyncio.wrap_future(old.submit(time.sleep, 0.2)) for _ in range(2)))
+        old_processes = list(old._processes.values())
+
+        stuck = extraction._run_in_pool(extraction._Budget(0.5), time.sleep, 30)
+        innocent = extraction._run_in_pool(extraction._Budget(30), time.sleep, 1)
+        results = await asyncio.gather(stuck, innocent, return_exceptions=True)
+
+        assert isinstance(results[0], extraction.ExtractionTimeout)
+        assert results[1] is None  # rerun on the new pool
+        assert extraction._executor is not old
+        for process in old_processes:
+            process.join(timeout=5)
+            assert not process.is_alive()
+    finally:
+        extraction.shutdown_extraction_pool()
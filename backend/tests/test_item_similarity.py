@@ -0,0 +1,91 @@
+"""Tests for the item-item collaborative filtering model."""
+import asyncio
+from uuid import uuid4
+
+import numpy as np
+import pytest
+from sqlalchemy import func, select
+
+from app.db import models
+from app.db.session import AsyncSessionLocal
+from app.services.item_similarity import ItemSimilarity, get_item_similarity, reset_item_similarity
+
+
+def _pairs(*likes):
+    return np.array(likes, dtype=np.int64).reshape(-1, 2)
+
+
+def _neighbours(model, book_id):
+    indices, sims = model.neighbours[model.book_index[book_id]]
+    return {model.book_ids[i]: round(float(s), 4) for i, s in zip(indices, sims)}
+
+
+LIKES = [(1, 10), (1, 20), (2, 10), (2, 20), (2, 30), (3, 30), (3, 40), (4, 40)]
+
+
+def test_build_keeps_top_k_cosine_neighbours():
+    model = ItemSimilarity.build(_pairs(*LIKES), k=2)
+
+    # 10 and 20 were liked by the same two users; 10 and 30 share one of 2 x 2.
+    assert _neighbours(model, 10) == {20: 1.0, 30: 0.5}
+    assert _neighbours(model, 40) == {30: 0.5}
+    assert model.scores_for({10}, exclude={20}) == pytest.approx({30: 0.5})
+
+
+def test_incremental_like_matches_a_rebuild_for_the_touched_pairs():
+    model = ItemSimilarity.build(_pairs(*LIKES), k=3)
+    model.add_like(4, 10)
+    model.add_like(5, 50)  # new user and new book
+    model.add_like(4, 50)
+    model.add_like(4, 10)  # duplicate, ignored
+
+    rebuilt = ItemSimilarity.build(_pairs(*LIKES, (4, 10), (5, 50), (4, 50)), k=3)
+    for book_id in (10, 50):
+        assert _neighbours(model, book_id) == _neighbours(rebuilt, book_id)
+    # Books user 4 liked before got the new pair scores.
+    assert _neighbours(model, 40)[10] == _neighbours(rebuilt, 40)[10]
+    assert _neighbours(model, 40)[50] == _neighbours(rebuilt, 40)[50]
+
+
+@pytest.mark.asyncio
+async def test_concurrent_first_requests_share_one_build(monkeypatch, request):
+    builds = []
+    build = ItemSimilarity.build
+
+    def counting_build(pairs, k):
+        builds.append(len(pairs))
+        return build(pairs, k)
+
+    monkeypatch.setattr(ItemSimilarity, "build", staticmethod(counting_build))
+    reset_item_similarity()
+    request.addfinalizer(reset_item_similarity)
+
+    async with AsyncSessionLocal() as first, AsyncSessionLocal() as second:
+        models = await asyncio.gather(get_item_similarity(first), get_item_similarity(second))
+    assert models[0] is models[1]
+    assert len(builds) == 1
+
+
+@pytest.mark.asyncio
+async def test_catch_up_rereads_ids_committed_out_of_order(request):
+    reset_item_similarity()
+    request.addfinalizer(reset_item_similarity)
+    async with AsyncSessionLocal() as db:
+        reader = models.User(email=f"{uuid4().hex[:8]}@test.com", hashed_password="x")
+        first = models.Book(title="First", file_path="first.txt")
+        second = models.Book(title="Second", file_path="second.txt")
+        db.add_all([reader, first, second])
+        await db.commit()
+        top = (await db.execute(select(func.max(models.Review.id)))).scalar_one() or 0
+        model = await get_item_similarity(db)
+
+        # Another process's review with id top + 2 commits before the one that got top + 1.
+        db.add(models.Review(id=top + 2, user_id=reader.id, book_id=first.id, rating=5))
+        await db.commit()
+        await get_item_similarity(db)
+        db.add(models.Review(id=top + 1, user_id=reader.id, book_id=second.id, rating=5))
+        await db.commit()
+        await get_item_similarity(db)
+
+    assert model.review_watermark == top + 2
+    assert model.book_index[second.id] in model.extra_by_user[reader.id]
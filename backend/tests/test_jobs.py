@@ -0,0 +1,248 @@
+"""Tests for the durable job queue and worker."""
+import asyncio
+import json
+from datetime import datetime
+from uuid import uuid4
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import select
+
+from app.core.metrics import metrics
+from app.db import models
+from app.db.session import AsyncSessionLocal
+from app.main import app
+from app.services import jobs
+from app.services.storage import get_storage
+from app.services.text_store import get_book_text
+from app.tasks import llm_tasks
+from app.tasks.worker import JobWorker
+
+
+async def _job(kind):
+    async with AsyncSessionLocal() as db:
+        return (await db.execute(select(models.Job).where(models.Job.kind == kind))).scalar_one()
+
+
+async def _stored_file(body: bytes):
+    async def chunks():
+        yield body
+
+    return (await get_storage().save_stream(chunks(), "orphan.txt")).key
+
+
+@pytest.mark.asyncio
+async def test_enqueue_is_idempotent_and_claims_are_exclusive():
+    kind = f"test-{uuid4().hex[:8]}"
+    async with AsyncSessionLocal() as db:
+        await jobs.enqueue(db, kind, {"n": 1}, idempotency_key=f"{kind}:1")
+        await jobs.enqueue(db, kind, {"n": 2}, idempotency_key=f"{kind}:1")
+        await db.commit()
+
+    async with AsyncSessionLocal() as db:
+        rows = (await db.execute(select(models.Job).where(models.Job.kind == kind))).scalars().all()
+    assert [json.loads(row.payload) for row in rows] == [{"n": 1}]
+
+    async with AsyncSessionLocal() as db:
+        first = await jobs.claim_jobs(db, "a", 100)
+    async with AsyncSessionLocal() as db:
+        second = await jobs.claim_jobs(db, "b", 100)
+    assert kind in {job.kind for job in first}
+    assert kind not in {job.kind for job in second}
+    assert (await _job(kind)).attempts == 1
+
+
+@pytest.mark.asyncio
+async def test_failing_job_backs_off_then_goes_dead(monkeypatch):
+    monkeypatch.setattr("app.services.jobs.settings.job_backoff_base_seconds", 0)
+    kind = f"test-{uuid4().hex[:8]}"
+    calls = []
+
+    async def flaky(payload, last_attempt):
+        calls.append(last_attempt)
+        raise RuntimeError("boom")
+
+    async with AsyncSessionLocal() as db:
+        await jobs.enqueue(db, kind, {}, max_attempts=3)
+        await db.commit()
+
+    worker = JobWorker(concurrency=1, handlers={kind: flaky})
+    for _ in range(3):
+        await worker.run_once()
+        await worker.wait_idle()
+
+    job = await _job(kind)
+    assert calls == [False, False, True]
+    assert job.status == jobs.DEAD
+    assert "boom" in job.last_error
+
+
+@pytest.mark.asyncio
+async def test_worker_runs_enqueued_jobs_until_stopped(monkeypatch):
+    kind = f"test-{uuid4().hex[:8]}"
+    done = []
+
+    async def handler(payload, last_attempt):
+        done.append(payload["n"])
+
+    worker = JobWorker(concurrency=2, poll_seconds=0.05, handlers={kind: handler})
+    runner = asyncio.create_task(worker.run())
+    async with AsyncSessionLocal() as db:
+        for n in range(3):
+            await jobs.enqueue(db, kind, {"n": n})
+        await db.commit()
+    for _ in range(100):
+        if len(done) == 3:
+            break
+        await asyncio.sleep(0.02)
+    worker.stop()
+    await runner
+
+    assert sorted(done) == [0, 1, 2]
+    async with AsyncSessionLocal() as db:
+        statuses = (
+            await db.execute(select(models.Job.status).where(models.Job.kind == kind))
+        ).scalars().all()
+    assert statuses == [jobs.SUCCEEDED] * 3
+
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        resp = await ac.get("/jobs/status")
+    assert resp.status_code == 200
+    assert resp.json()["by_kind"][kind] == {jobs.SUCCEEDED: 3}
+
+
+@pytest.mark.asyncio
+async def test_coalesced_jobs_keep_one_queued_and_one_running_per_key():
+    kind = f"test-{uuid4().hex[:8]}"
+    key = f"{kind}:book-1"
+    before = metrics.snapshot()["counters"].get(f"jobs.{kind}.coalesced", 0)
+
+    async def enqueue():
+        async with AsyncSessionLocal() as db:
+            added = await jobs.enqueue(db, kind, {}, coalesce_key=key)
+            await db.commit()
+        return added
+
+    assert [await enqueue() for _ in range(3)] == [True, False, False]
+    assert metrics.snapshot()["counters"][f"jobs.{kind}.coalesced"] - before == 2
+
+    async with AsyncSessionLocal() as db:
+        (first,) = [job for job in await jobs.claim_jobs(db, "a", 100) if job.kind == kind]
+    # A trigger while the first runs queues exactly one follow-up, held back until it finishes.
+    assert [await enqueue() for _ in range(2)] == [True, False]
+    async with AsyncSessionLocal() as db:
+        assert kind not in {job.kind for job in await jobs.claim_jobs(db, "b", 100)}
+
+    async with AsyncSessionLocal() as db:
+        assert await jobs.fail_job(db, first, "boom") == jobs.COALESCED
+    async with AsyncSessionLocal() as db:
+        follow_up = [job for job in await jobs.claim_jobs(db, "b", 100) if job.kind == kind]
+    assert len(follow_up) == 1 and follow_up[0].id != first.id
+
+
+@pytest.mark.asyncio
+async def test_summary_refresh_is_queued_not_awaited():
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        book = (
+            await ac.post(
+                "/books/",
+                data={"title": "Refresh Me"},
+                files={"file": ("refresh.txt", b"some text to summarize", "text/plain")},
+            )
+        ).json()
+        first = await ac.post(f"/books/{book['id']}/summary/refresh")
+        second = await ac.post(f"/books/{book['id']}/summary/refresh")
+    assert first.status_code == second.status_code == 202
+    # Both fold into the upload's summary job, which has not run yet.
+    assert (first.json()["job"], second.json()["job"]) == ("coalesced", "coalesced")
+
+    async with AsyncSessionLocal() as db:
+        queued = (
+            await db.execute(select(models.Job).where(models.Job.coalesce_key == f"summary:{book['id']}"))
+        ).scalars().all()
+    assert [job.status for job in queued] == [jobs.QUEUED]
+
+
+@pytest.mark.asyncio
+async def test_upload_queues_summary_with_the_book_and_the_job_extracts_missing_text():
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        book = (
+            await ac.post(
+                "/books/",
+                data={"title": "Queued With Book"},
+                files={"file": ("queued.txt", b"text worth summarizing", "text/plain")},
+            )
+        ).json()
+    async with AsyncSessionLocal() as db:
+        job = (
+            await db.execute(select(models.Job).where(models.Job.coalesce_key == f"summary:{book['id']}"))
+        ).scalar_one()
+        # Held back during extraction, then made due once the text was stored.
+        assert job.run_at <= datetime.utcnow()
+
+        # A book whose upload died before extracting: the summary job extracts it.
+        stored = models.Book(title="Orphan", file_path=str(await _stored_file(b"orphaned body")))
+        db.add(stored)
+        await db.commit()
+    await llm_tasks._ensure_book_text(stored.id)
+    async with AsyncSessionLocal() as db:
+        book_text = await get_book_text(db, stored.id)
+        assert book_text.complete and book_text.char_count == len("orphaned body")
+
+
+@pytest.mark.asyncio
+async def test_a_reused_book_id_gets_its_own_summary_job():
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+
+        async def upload(title):
+            resp = await ac.post(
+                "/books/",
+                data={"title": title},
+                files={"file": (f"{title}.txt", f"body of {title}".encode(), "text/plain")},
+            )
+            return resp.json()["id"]
+
+        async def summary_jobs(book_id):
+            async with AsyncSessionLocal() as db:
+                stmt = select(models.Job).where(models.Job.coalesce_key == f"summary:{book_id}")
+                return (await db.execute(stmt)).scalars().all()
+
+        deleted = await upload("Deleted")
+        before = {job.idempotency_key for job in await summary_jobs(deleted)}
+        assert (await ac.delete(f"/books/{deleted}")).status_code == 204
+        assert not await summary_jobs(deleted)  # the queued job went with its book
+        reused = await upload("Reused")
+    assert reused == deleted  # SQLite reuses the id of the newest row once it is deleted
+
+    queued = await summary_jobs(reused)
+    assert len(queued) == 1 and queued[0].idempotency_key not in before
+    assert queued[0].status == jobs.QUEUED and queued[0].run_at <= datetime.utcnow()
+
+
+@pytest.mark.asyncio
+async def test_a_lane_runs_its_kind_beyond_the_shared_concurrency():
+    kind = f"test-{uuid4().hex[:8]}"
+    started, release = [], asyncio.Event()
+
+    async def handler(payload, last_attempt):
+        started.append(payload["n"])
+        await release.wait()
+
+    async with AsyncSessionLocal() as db:
+        for n in range(3):
+            await jobs.enqueue(db, kind, {"n": n})
+        await db.commit()
+
+    worker = JobWorker(concurrency=1, handlers={kind: handler}, lanes={kind: 3})
+    await worker.run_once()
+    assert started == []  # the shared pool leaves the lane's kind alone
+    assert await worker.run_once(lane=kind) == 3
+    await asyncio.sleep(0)
+    assert sorted(started) == [0, 1, 2]
+    release.set()
+    await worker.wait_idle()
+    async with AsyncSessionLocal() as db:
+        statuses = (
+            await db.execute(select(models.Job.status).where(models.Job.kind == kind))
+        ).scalars().all()
+    assert statuses == [jobs.SUCCEEDED] * 3
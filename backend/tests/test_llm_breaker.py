@@ -0,0 +1,81 @@
+"""Tests for the LLM circuit breaker and cached health snapshot."""
+import asyncio
+
+import httpx
+import pytest
+
+from app.core.metrics import metrics
+from app.services import llm as llm_service
+from app.services.circuit_breaker import CLOSED, OPEN, CircuitOpenError
+
+
+class FakeOllama:
+    def __init__(self):
+        self.up = False
+        self.calls: list[str] = []
+
+    def handler(self, request):
+        self.calls.append(request.url.path)
+        if not self.up:
+            raise httpx.ConnectError("connection refused", request=request)
+        if request.url.path == "/api/tags":
+            return httpx.Response(200, json={"models": [{"name": "phi3:latest"}]})
+        return httpx.Response(200, json={"response": "ok"})
+
+
+@pytest.fixture
+def ollama(monkeypatch):
+    fake = FakeOllama()
+    client = httpx.AsyncClient(transport=httpx.MockTransport(fake.handler))
+    monkeypatch.setattr(llm_service, "_client", client)
+    monkeypatch.setattr(llm_service, "_health", None)
+    monkeypatch.setattr(llm_service.settings, "llm_breaker_failure_threshold", 2)
+    monkeypatch.setattr(llm_service.settings, "llm_breaker_reset_seconds", 0.05)
+    monkeypatch.setattr(llm_service.settings, "llm_cache_enabled", False)
+    return fake
+
+
+@pytest.mark.asyncio
+async def test_breaker_fails_fast_then_closes_after_a_background_probe(ollama):
+    breaker = llm_service.get_breaker()
+    try:
+        for _ in range(2):
+            with pytest.raises(httpx.ConnectError):
+                await llm_service._ollama_generate("hello")
+        assert breaker.state == OPEN
+
+        upstream_calls = len(ollama.calls)
+        with pytest.raises(CircuitOpenError):
+            await llm_service._ollama_generate("hello")
+        result = await llm_service.LocalLLM().analyze_sentiment("A wonderful, moving book.")
+        assert result["label"] == "positive"
+        assert len(ollama.calls) == upstream_calls
+
+        ollama.up = True
+        for _ in range(50):
+            if breaker.state == CLOSED:
+                break
+            await asyncio.sleep(0.02)
+        assert breaker.state == CLOSED
+        assert ollama.calls[-1] == "/api/tags"
+        assert await llm_service._ollama_generate("hello") == "ok"
+    finally:
+        breaker.close()
+
+
+@pytest.mark.asyncio
+async def test_status_is_served_from_a_short_lived_snapshot(ollama, monkeypatch):
+    ollama.up = True
+    before = metrics.snapshot()["counters"].get("llm.health.checks", 0)
+
+    first, second = await asyncio.gather(llm_service.ollama_status(), llm_service.ollama_status())
+    again = await llm_service.ollama_status()
+    assert first["connected"] and first["configured_model_ready"]
+    assert again["available_models"] == ["phi3:latest"]
+    assert ollama.calls.count("/api/tags") == 1
+
+    monkeypatch.setattr(llm_service.settings, "llm_health_ttl_seconds", 0)
+    ollama.up = False
+    down = await llm_service.ollama_status()
+    assert down["connected"] is False and "refused" in down["error"]
+    assert metrics.snapshot()["counters"]["llm.health.checks"] - before == 2
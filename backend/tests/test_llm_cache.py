@@ -0,0 +1,66 @@
+import pytest
+
+from app.core.metrics import metrics
+from app.services import llm as llm_service
+from app.services import llm_cache
+from app.services.llm import LocalLLM
+
+
+def _counters():
+    return metrics.snapshot()["counters"]
+
+
+@pytest.mark.asyncio
+async def test_summary_is_served_from_memory_then_database(monkeypatch):
+    calls = []
+
+    async def fake_generate(prompt, priority="background"):
+        calls.append(prompt)
+        return "- A cached bullet"
+
+    monkeypatch.setattr(llm_service, "_ollama_generate", fake_generate)
+    llm_cache.clear_memory_cache()
+    before = _counters()
+    text = "Once upon a time, in a cache far away."
+
+    assert await LocalLLM().summarize(text) == "- A cached bullet"
+    assert await LocalLLM().summarize(text + "  ") == "- A cached bullet"
+    llm_cache.clear_memory_cache()
+    assert await LocalLLM().summarize(text) == "- A cached bullet"
+
+    after = _counters()
+    assert len(calls) == 1
+    assert after.get("llm_cache.hits.memory", 0) - before.get("llm_cache.hits.memory", 0) == 1
+    assert after.get("llm_cache.hits.db", 0) - before.get("llm_cache.hits.db", 0) == 1
+
+    monkeypatch.setattr("app.services.llm_cache.settings.llm_model", "another-model")
+    await LocalLLM().summarize(text)
+    monkeypatch.setattr(llm_service, "SUMMARY_PROMPT_VERSION", llm_service.SUMMARY_PROMPT_VERSION + 1)
+    await LocalLLM().summarize(text)
+    assert len(calls) == 3
+
+
+@pytest.mark.asyncio
+async def test_unparseable_sentiment_is_not_cached(monkeypatch):
+    responses = iter(["not json", '{"score": 0.8, "label": "positive", "rationale": "ok"}'])
+
+    async def fake_generate(prompt, priority="background"):
+        return next(responses)
+
+    monkeypatch.setattr(llm_service, "_ollama_generate", fake_generate)
+    llm_cache.clear_memory_cache()
+
+    first = await LocalLLM().analyze_sentiment("great book, unexpectedly")
+    assert first["rationale"] != "ok"
+    second = await LocalLLM().analyze_sentiment("great book, unexpectedly")
+    assert second["score"] == 0.8
+    assert await LocalLLM().analyze_sentiment("great book, unexpectedly") == second
+
+
+@pytest.mark.asyncio
+async def test_memory_tier_is_bounded(monkeypatch):
+    monkeypatch.setattr("app.services.llm_cache.settings.llm_cache_memory_entries", 2)
+    llm_cache.clear_memory_cache()
+    for i in range(3):
+        llm_cache._remember(f"k{i}", i, 60)
+    assert list(llm_cache._memory) == ["k1", "k2"]
@@ -0,0 +1,67 @@
+import asyncio
+
+import pytest
+
+from app.services.llm_scheduler import LLMScheduler
+
+
+async def _hold(scheduler, priority, order, release):
+    async with scheduler.slot(priority):
+        order.append(priority)
+        await release.wait()
+
+
+@pytest.mark.asyncio
+async def test_scheduler_bounds_in_flight_and_shares_slots_fairly():
+    scheduler = LLMScheduler(limit=1, interactive_weight=2)
+    order: list[str] = []
+    gate = asyncio.Event()
+
+    first = asyncio.create_task(_hold(scheduler, "background", order, gate))
+    await asyncio.sleep(0)
+    waiting = [
+        asyncio.create_task(_hold(scheduler, priority, order, gate))
+        for priority in ["background"] * 3 + ["interactive"] * 4
+    ]
+    await asyncio.sleep(0)
+    assert scheduler.stats() == {
+        "limit": 1,
+        "in_flight": 1,
+        "queued": {"interactive": 4, "background": 3},
+    }
+
+    gate.set()
+    await asyncio.gather(first, *waiting)
+    assert order == [
+        "background",
+        "interactive",
+        "interactive",
+        "background",
+        "interactive",
+        "interactive",
+        "background",
+        "background",
+    ]
+    assert scheduler.stats()["in_flight"] == 0
+
+
+@pytest.mark.asyncio
+async def test_cancelled_waiter_does_not_leak_a_slot():
+    scheduler = LLMScheduler(limit=1)
+    gate = asyncio.Event()
+    order: list[str] = []
+
+    holder = asyncio.create_task(_hold(scheduler, "background", order, gate))
+    await asyncio.sleep(0)
+    queued = asyncio.create_task(_hold(scheduler, "interactive", order, gate))
+    await asyncio.sleep(0)
+    queued.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await queued
+    assert scheduler.stats()["queued"]["interactive"] == 0
+
+    gate.set()
+    await holder
+    async with scheduler.slot("interactive"):
+        assert scheduler.stats()["in_flight"] == 1
+    assert scheduler.stats()["in_flight"] == 0
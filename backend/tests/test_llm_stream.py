@@ -0,0 +1,62 @@
+"""Tests for the streaming chat endpoint."""
+import json
+
+import httpx
+import pytest
+from httpx import AsyncClient
+
+from app.core.metrics import metrics
+from app.main import app
+from app.services import llm as llm_service
+
+
+class NDJSONStream(httpx.AsyncByteStream):
+    def __init__(self, deltas):
+        self.deltas = deltas
+        self.sent = 0
+        self.closed = False
+
+    async def __aiter__(self):
+        for delta in self.deltas:
+            self.sent += 1
+            yield (json.dumps({"message": {"content": delta}, "done": False}) + "\n").encode()
+        yield (json.dumps({"done": True, "prompt_eval_count": 7, "eval_count": 3}) + "\n").encode()
+
+    async def aclose(self):
+        self.closed = True
+
+
+def _fake_ollama(monkeypatch, stream):
+    def handler(request):
+        assert json.loads(request.content)["stream"] is True
+        return httpx.Response(200, stream=stream)
+
+    monkeypatch.setattr(llm_service, "_client", httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+
+
+@pytest.mark.asyncio
+async def test_chat_stream_relays_deltas_as_sse(monkeypatch):
+    _fake_ollama(monkeypatch, NDJSONStream(["Hel", "lo", "!"]))
+
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        resp = await ac.post("/llm/chat/stream", json={"messages": [{"role": "user", "content": "hi"}]})
+
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("text/event-stream")
+    events = [block for block in resp.text.split("\n\n") if block]
+    assert [json.loads(e.removeprefix("data: "))["delta"] for e in events[:-1]] == ["Hel", "lo", "!"]
+    assert events[-1] == "event: done\ndata: {}"
+    assert metrics.snapshot()["timings"]["llm.chat.ttft_seconds.stream"]["count"] >= 1
+
+
+@pytest.mark.asyncio
+async def test_closing_the_stream_closes_the_upstream_response(monkeypatch):
+    upstream = NDJSONStream(["a"] * 1000)
+    _fake_ollama(monkeypatch, upstream)
+
+    deltas = llm_service.ollama_chat_stream([{"role": "user", "content": "hi"}])
+    assert await anext(deltas) == "a"
+    await deltas.aclose()
+
+    assert upstream.closed
+    assert upstream.sent < 1000
@@ -0,0 +1,53 @@
+"""Tests for the Alembic migration baseline."""
+import pytest
+from alembic import command
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.db.migrations import BASELINE_REVISION, _alembic_config, run_migrations
+
+
+def _index_names(connection, table):
+    rows = connection.execute(
+        text("SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = :table"),
+        {"table": table},
+    )
+    return {name for (name,) in rows}
+
+
+@pytest.mark.asyncio
+async def test_migrations_create_hot_path_indexes(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'fresh.db'}")
+    await run_migrations(engine)
+
+    async with engine.connect() as conn:
+        borrows = await conn.run_sync(_index_names, "borrows")
+        reviews = await conn.run_sync(_index_names, "reviews")
+        users = await conn.run_sync(_index_names, "users")
+        prefs = await conn.run_sync(_index_names, "user_preferences")
+    await engine.dispose()
+
+    assert "uq_borrows_active_book" in borrows
+    assert {"ix_reviews_book_id_created_at", "ix_reviews_user_id_rating"} <= reviews
+    assert "ix_users_email_lower" in users
+    assert "ix_user_preferences_user_id_key" in prefs
+
+
+@pytest.mark.asyncio
+async def test_migrations_adopt_create_all_database(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'legacy.db'}")
+
+    def _create_legacy_schema(sync_conn):
+        # Same tables the old create_all() startup hook produced, without alembic_version.
+        command.upgrade(_alembic_config(sync_conn), BASELINE_REVISION)
+        sync_conn.execute(text("DROP TABLE alembic_version"))
+
+    async with engine.begin() as conn:
+        await conn.run_sync(_create_legacy_schema)
+
+    await run_migrations(engine)
+    async with engine.connect() as conn:
+        borrows = await conn.run_sync(_index_names, "borrows")
+    await engine.dispose()
+
+    assert "uq_borrows_active_book" in borrows
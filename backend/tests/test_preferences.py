@@ -0,0 +1,86 @@
+"""Tests for incrementally maintained user preference profiles."""
+import pytest
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+from app.db import models
+from app.db.base import Base
+from app.services import preferences
+
+
+async def _profile(db, user_id):
+    rows = await db.execute(
+        select(models.UserPreference.key, models.UserPreference.value).where(
+            models.UserPreference.user_id == user_id
+        )
+    )
+    return dict(rows.all())
+
+
+async def _review(db, user, book, rating, comment):
+    db.add(models.Review(user_id=user.id, book_id=book.id, rating=rating, comment=comment))
+    await preferences.record_review(db, user.id, rating, comment, book.author)
+    await db.commit()
+
+
+@pytest.mark.asyncio
+async def test_reviews_update_only_their_author_and_match_a_full_rebuild():
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    async with AsyncSession(engine, expire_on_commit=False) as db:
+        alice = models.User(email="alice@test.com", hashed_password="x")
+        bob = models.User(email="bob@test.com", hashed_password="x")
+        dune = models.Book(title="Dune", author="Herbert", file_path="dune.txt")
+        emma = models.Book(title="Emma", author="Austen", file_path="emma.txt")
+        db.add_all([alice, bob, dune, emma])
+        await db.commit()
+
+        await _review(db, alice, dune, 5, "Sprawling desert politics, great politics")
+        await _review(db, alice, emma, 2, "Tedious matchmaking")
+        await _review(db, bob, emma, 4, "Witty matchmaking")
+
+        assert await _profile(db, alice.id) == {
+            "liked_authors": "Herbert",
+            "liked_keywords": "politics,desert,great,sprawling",
+        }
+        assert await _profile(db, bob.id) == {"liked_authors": "Austen", "liked_keywords": "matchmaking,witty"}
+
+        await preferences.change_book_author(db, dune.id, "Herbert", "F. Herbert")
+        dune.author = "F. Herbert"
+        await db.commit()
+        assert (await _profile(db, alice.id))["liked_authors"] == "F. Herbert"
+
+        incremental = {u.id: await _profile(db, u.id) for u in (alice, bob)}
+        assert await preferences.rebuild_preferences(db, users_per_batch=1) == 2
+        assert {u.id: await _profile(db, u.id) for u in (alice, bob)} == incremental
+
+        await preferences.forget_book(db, emma)
+        await db.commit()
+        assert await _profile(db, bob.id) == {}
+        assert await _profile(db, alice.id) == incremental[alice.id]
+    await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_overlong_words_are_not_counted_and_profiles_fit_their_column():
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    async with AsyncSession(engine, expire_on_commit=False) as db:
+        reader = models.User(email="reader@test.com", hashed_password="x")
+        book = models.Book(title="Long", author="Writer", file_path="long.txt")
+        db.add_all([reader, book])
+        await db.commit()
+
+        words = [c * 60 for c in "abcdefghij"]
+        await _review(db, reader, book, 5, " ".join(words + ["x" * 300]))
+
+        terms = (await db.execute(select(models.UserPreferenceCount.term))).scalars().all()
+        assert max(map(len, terms)) <= preferences.MAX_TERM_CHARS
+        keywords = (await _profile(db, reader.id))["liked_keywords"]
+        assert keywords == ",".join(words[:4])
+        assert len(keywords) <= preferences.MAX_PROFILE_CHARS
+    await engine.dispose()
@@ -0,0 +1,96 @@
+"""Tests for the per-user recommendation cache and its event-driven invalidation."""
+import asyncio
+import random
+import string
+
+import pytest
+
+from app.core.events import BOOK_CHANGED, PREFERENCES_CHANGED, REVIEW_CREATED, events
+from app.core.metrics import metrics
+from app.db import models
+from app.db.session import AsyncSessionLocal
+from app.services import book_index, book_vectors, item_similarity
+from app.services.recommendation import get_recommendations_for_user
+from app.services.recommendation_cache import RecommendationCache, recommendation_cache
+
+
+def _word() -> str:
+    return "".join(random.choices(string.ascii_lowercase, k=12))
+
+
+def test_cache_drops_only_affected_entries_and_stays_bounded(monkeypatch):
+    monkeypatch.setattr("app.services.recommendation_cache.settings.recommendation_cache_max_entries", 2)
+    cache = RecommendationCache()
+    cache.put(1, [10, 11], keywords={"desert"}, authors={"herbert"})
+    cache.put(2, [12], keywords={"village"}, authors=set())
+
+    cache.invalidate_book(99, tokens={"ocean"}, author="melville")
+    assert cache.get(1) == [10, 11] and cache.get(2) == [12]
+
+    cache.invalidate_book(99, tokens={"desert", "sand"})
+    assert cache.get(1) is None and cache.get(2) == [12]
+
+    cache.put(1, [10], keywords=set(), authors=set())
+    cache.put(3, [13], keywords=set(), authors=set())
+    assert cache.get(2) is None and len(cache) == 2  # least recently used went first
+    assert cache.hits == 3 and cache.misses == 2
+
+
+@pytest.mark.asyncio
+async def test_recommendations_are_cached_until_an_event_touches_them():
+    liked = _word()
+    async with AsyncSessionLocal() as db:
+        reader = models.User(email=f"{_word()}@test.com", hashed_password="x")
+        match = models.Book(title="Match", description=f"All about {liked}", file_path="m.txt")
+        other = models.Book(title="Other", file_path="o.txt")
+        db.add_all([reader, match, other])
+        await db.flush()
+        db.add(models.UserPreference(user_id=reader.id, key="liked_keywords", value=liked))
+        await db.commit()
+        await book_index.build_book_index(db)
+        await item_similarity.build_item_similarity(db)
+        await book_vectors.build_book_vectors(db)
+
+        assert [b.id for b in await get_recommendations_for_user(db, reader)] == [match.id]
+        hits = metrics.snapshot()["counters"].get("recommendation_cache.hits", 0)
+        assert [b.id for b in await get_recommendations_for_user(db, reader)] == [match.id]
+        assert metrics.snapshot()["counters"]["recommendation_cache.hits"] == hits + 1
+        assert recommendation_cache.get(reader.id) == [match.id]
+
+        # A catalog change that now matches the reader's keywords drops their entry.
+        other.summary = f"Also {liked}"
+        await db.commit()
+        events.publish(BOOK_CHANGED, book=other)
+        assert recommendation_cache.get(reader.id) is None
+        assert {b.id for b in await get_recommendations_for_user(db, reader)} == {match.id, other.id}
+
+        events.publish(REVIEW_CREATED, review=models.Review(user_id=reader.id, book_id=match.id, rating=2))
+        assert recommendation_cache.get(reader.id) is None
+
+        await get_recommendations_for_user(db, reader)
+        events.publish(PREFERENCES_CHANGED, user_ids=[reader.id])
+        assert recommendation_cache.get(reader.id) is None
+
+
+@pytest.mark.asyncio
+async def test_recommendations_skip_models_still_being_built(request):
+    item_similarity.reset_item_similarity()
+    request.addfinalizer(item_similarity.reset_item_similarity)
+    liked = _word()
+    async with AsyncSessionLocal() as db:
+        reader = models.User(email=f"{_word()}@test.com", hashed_password="x")
+        match = models.Book(title="Match", description=f"All about {liked}", file_path="m.txt")
+        db.add_all([reader, match])
+        await db.flush()
+        db.add(models.UserPreference(user_id=reader.id, key="liked_keywords", value=liked))
+        await db.commit()
+        await book_index.build_book_index(db)
+
+        partial = metrics.snapshot()["counters"].get("recommendations.partial", 0)
+        assert [b.id for b in await get_recommendations_for_user(db, reader)] == [match.id]
+        assert metrics.snapshot()["counters"]["recommendations.partial"] == partial + 1
+        assert recommendation_cache.get(reader.id) is None  # not cached without the models
+
+        await asyncio.gather(item_similarity._building, book_vectors._building)
+        assert [b.id for b in await get_recommendations_for_user(db, reader)] == [match.id]
+        assert recommendation_cache.get(reader.id) == [match.id]
@@ -0,0 +1,149 @@
+"""Tests for BM25 full-text search over the catalog."""
+import asyncio
+import random
+
+import pytest
+from httpx import AsyncClient
+
+from app.db import models
+from app.db.session import AsyncSessionLocal
+from app.main import app
+from app.services import search_index
+from app.services.search_index import SearchIndex, match_expression
+from app.services.storage import get_storage
+
+
+def _word() -> str:
+    # Without vowels, "s" or "y" the porter stemmer leaves a word and its prefixes alone.
+    return "".join(random.choices("bcdfghjklmnpqrtvwxz", k=12))
+
+
+def test_index_ranks_title_matches_above_text_matches(tmp_path):
+    index = SearchIndex(tmp_path / "search.sqlite3")
+    index.put_books([(1, "Whales", None, None, None), (2, "Ships", None, "Life at sea", None)])
+    index.put_text(2, "key-2", "The whales surfaced beside the ship. " * 20)
+    index.put_books([(2, "Ships", None, "Life at sea", None)])  # metadata edit keeps the text
+
+    assert [book_id for book_id, _, _ in index.search(match_expression("whales"), 10)] == [1, 2]
+    assert [book_id for book_id, _, _ in index.search(match_expression("surf"), 10)] == [2]
+    assert index.text_keys([1, 2]) == {2: "key-2"}
+    # Past max_candidates matches, only title and author matches are ranked.
+    assert [book_id for book_id, _, _ in index.search(match_expression("whales"), 10, max_candidates=1)] == [1]
+    assert match_expression(' "); DROP --') == '"drop"*'
+    assert match_expression("  ") is None
+
+    index.delete([2])
+    assert index.search(match_expression("whales"), 10)[0][0] == 1 and len(index) == 1
+
+
+@pytest.fixture
+def own_index(tmp_path, monkeypatch):
+    """Point the index at a fresh file; the test shuts it down in a ``finally``."""
+    path = tmp_path / "search.sqlite3"
+    monkeypatch.setattr("app.services.search_index.settings.search_index_path", str(path))
+    monkeypatch.setattr(search_index, "_index", None)
+
+
+@pytest.mark.asyncio
+async def test_search_endpoint_follows_uploads_edits_and_deletes(own_index):
+    in_text, in_title, renamed = _word(), _word(), _word()
+    search_index.start_search_indexer()
+    try:
+        await _search_follows_changes(in_text, in_title, renamed)
+    finally:
+        await search_index.shutdown_search_indexer()
+
+
+async def _search_follows_changes(in_text, in_title, renamed):
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+
+        async def search(query, until=bool):
+            # The indexer picks events up in the background; poll until the result settles.
+            for _ in range(200):
+                resp = await ac.get("/books/search", params={"q": query})
+                assert resp.status_code == 200
+                if until(resp.json()["items"]):
+                    break
+                await asyncio.sleep(0.05)
+            return resp.json()
+
+        body = f"Chapter one. The {in_text} was found under the stairs.".encode()
+        first = (
+            await ac.post(
+                "/books/",
+                data={"title": f"The {in_title} Affair", "author": "Someone"},
+                files={"file": ("a.txt", body, "text/plain")},
+            )
+        ).json()
+        second = (
+            await ac.post(
+                "/books/",
+                data={"title": "Unrelated", "description": f"Mentions {in_title} once"},
+                files={"file": ("b.txt", b"nothing to see", "text/plain")},
+            )
+        ).json()
+
+        found = await search(in_text)
+        assert [item["id"] for item in found["items"]] == [first["id"]]
+        assert f"[{in_text}]" in found["items"][0]["snippet"]
+
+        ranked = await search(in_title[:6], until=lambda items: len(items) == 2)  # prefix match
+        assert [item["id"] for item in ranked["items"]] == [first["id"], second["id"]]
+        assert ranked["items"][0]["score"] > ranked["items"][1]["score"]
+
+        paged = (await ac.get("/books/search", params={"q": in_title, "limit": 1})).json()
+        assert len(paged["items"]) == 1 and paged["next_offset"] == 1
+
+        await ac.put(f"/books/{first['id']}", json={"title": f"The {renamed} Affair"})
+        assert [item["id"] for item in (await search(renamed))["items"]] == [first["id"]]
+
+        await ac.delete(f"/books/{first['id']}")
+        assert (await search(in_text, until=lambda items: not items))["items"] == []
+
+        assert (await ac.get("/books/search", params={"q": ""})).status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_pages_stay_full_when_hits_were_deleted_elsewhere(own_index):
+    word = _word()
+    try:
+        async with AsyncSessionLocal() as db:
+            books = [
+                models.Book(title=f"Book {n}", description=word, file_path=f"{n}.txt") for n in range(3)
+            ]
+            db.add_all(books)
+            await db.commit()
+        index = search_index.get_search_index()
+        index.put_books([(book.id, book.title, None, word, None) for book in books])
+        # Deleted by another process: still indexed, and ranked first.
+        index.put_books([(10**9, f"{word} {word}", None, word, None)])
+
+        async with AsyncClient(app=app, base_url="http://test") as ac:
+            first = (await ac.get("/books/search", params={"q": word, "limit": 2})).json()
+            second = (await ac.get("/books/search", params={"q": word, "limit": 2, "offset": 2})).json()
+        assert len(first["items"]) == 2 and first["next_offset"] == 2
+        assert len(second["items"]) == 1 and second["next_offset"] is None
+        assert {item["id"] for item in first["items"] + second["items"]} == {book.id for book in books}
+    finally:
+        await search_index.shutdown_search_indexer()
+
+
+@pytest.mark.asyncio
+async def test_rebuild_indexes_the_whole_catalog(own_index):
+    titles = [_word(), _word()]
+    try:
+        async with AsyncSessionLocal() as db:
+            books = [models.Book(title=title, file_path=f"{title}.txt") for title in titles]
+            db.add_all(books)
+            await db.commit()
+
+            index = search_index.get_search_index()
+            index.put_books([(-1, "Stale entry", None, None, None)])
+            indexed = await search_index.rebuild_search_index(db, get_storage())
+
+        assert indexed >= len(books)
+        assert len(index) == indexed  # the stale entry is gone
+        for book, title in zip(books, titles):
+            assert [book_id for book_id, _, _ in index.search(match_expression(title), 10)] == [book.id]
+    finally:
+        await search_index.shutdown_search_indexer()
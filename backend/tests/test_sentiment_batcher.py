@@ -0,0 +1,53 @@
+import asyncio
+
+import pytest
+
+from app.core.metrics import metrics
+from app.services import llm as llm_service
+from app.services import llm_cache
+from app.services.llm import LocalLLM
+from app.services.sentiment_batcher import SentimentBatcher
+
+
+@pytest.mark.asyncio
+async def test_reviews_in_one_window_share_one_prompt(monkeypatch):
+    prompts = []
+
+    async def fake_generate(prompt, priority="background"):
+        prompts.append(prompt)
+        return (
+            '[{"id": 2, "score": -0.5, "label": "negative", "rationale": "dull"},'
+            ' {"id": 1, "score": 0.9, "label": "positive", "rationale": "loved it"}]'
+        )
+
+    monkeypatch.setattr(llm_service, "_ollama_generate", fake_generate)
+    llm_cache.clear_memory_cache()
+    batcher = SentimentBatcher(LocalLLM, max_batch=10, window_seconds=0.01)
+
+    loved, dull = await asyncio.gather(
+        batcher.score("batched: loved every page"), batcher.score("batched: dull and slow")
+    )
+    assert len(prompts) == 1
+    assert loved["score"] == 0.9
+    assert dull["label"] == "negative"
+
+
+@pytest.mark.asyncio
+async def test_unparseable_batch_falls_back_to_single_reviews(monkeypatch):
+    prompts = []
+
+    async def fake_generate(prompt, priority="background"):
+        prompts.append(prompt)
+        if "JSON array" in prompt:
+            return "Sure! Here are the scores: first is good, second is bad."
+        return '{"score": 0.1, "label": "neutral", "rationale": "single"}'
+
+    monkeypatch.setattr(llm_service, "_ollama_generate", fake_generate)
+    llm_cache.clear_memory_cache()
+    before = metrics.snapshot()["counters"].get("sentiment.batch_fallbacks", 0)
+    batcher = SentimentBatcher(LocalLLM, max_batch=3, window_seconds=10)
+
+    results = await asyncio.gather(*(batcher.score(f"fallback review {i}") for i in range(3)))
+    assert [r["rationale"] for r in results] == ["single"] * 3
+    assert len(prompts) == 4
+    assert metrics.snapshot()["counters"]["sentiment.batch_fallbacks"] == before + 1
@@ -0,0 +1,58 @@
+import json
+
+import pytest
+
+from app.services import llm as llm_service
+from app.services.sentiment_lexicon import lexicon_sentiment, load_lexicon
+from app.tasks import llm_tasks
+
+
+def test_negation_intensifiers_and_contrast():
+    good = lexicon_sentiment("A good book")
+    very_good = lexicon_sentiment("A very good book")
+    assert 0 < good["score"] < very_good["score"]
+    assert lexicon_sentiment("This was not good at all")["label"] == "negative"
+    assert lexicon_sentiment("Slow and boring start, but brilliant and moving ending!")["label"] == "positive"
+    assert lexicon_sentiment("The cover is blue")["confidence"] == 0.0
+    assert lexicon_sentiment("Loved it, wonderful")["confidence"] == 1.0
+    assert lexicon_sentiment("great characters, terrible plot")["confidence"] < 0.5
+
+
+def test_hyphenated_words_and_barely():
+    assert lexicon_sentiment("A real page-turner.")["label"] == "positive"
+    # "barely" only dampens; it is not also a negator.
+    barely = lexicon_sentiment("barely good")
+    assert 0 < barely["score"] < lexicon_sentiment("good")["score"]
+
+
+def test_lexicon_file_extends_builtin_words(tmp_path):
+    path = tmp_path / "lexicon.json"
+    path.write_text(json.dumps({"words": {"zesty": 2.0}, "negators": ["nae"]}))
+    lexicon = load_lexicon(str(path))
+    assert lexicon_sentiment("zesty prose", lexicon)["label"] == "positive"
+    assert lexicon_sentiment("nae zesty", lexicon)["label"] == "negative"
+    assert "good" in lexicon.words
+
+
+@pytest.mark.asyncio
+async def test_lexicon_engine_escalates_only_low_confidence(monkeypatch):
+    monkeypatch.setattr("app.tasks.llm_tasks.settings.sentiment_engine", "lexicon")
+    escalated = []
+
+    class FakeBatcher:
+        async def score(self, text):
+            escalated.append(text)
+            return {"score": 0.3, "label": "positive", "rationale": "llm"}
+
+    monkeypatch.setattr(llm_tasks, "get_sentiment_batcher", lambda: FakeBatcher())
+
+    confident = await llm_tasks._score_sentiment("An absolutely wonderful, gripping read")
+    assert confident["rationale"].startswith("lexicon")
+    unsure = await llm_tasks._score_sentiment("It is a book about ships")
+    assert unsure["rationale"] == "llm"
+    assert escalated == ["It is a book about ships"]
+
+
+def test_failed_llm_parse_falls_back_to_lexicon():
+    assert llm_service._heuristic_sentiment("not bad, really enjoyable")["label"] == "positive"
+    assert llm_service._heuristic_sentiment("  ")["rationale"] == "empty review"
@@ -1,13 +1,25 @@
-from app.services.storage import LocalStorage, S3Storage, get_storage
+import hashlib
 
+import pytest
 
-def test_get_storage_local(monkeypatch):
+from app.services.storage import (
+    LocalStorage,
+    S3Storage,
+    UploadTooLargeError,
+    create_storage,
+    get_storage,
+    shutdown_storage,
+    start_storage,
+)
+
+
+def test_create_storage_local(monkeypatch):
     monkeypatch.setattr("app.services.storage.settings.storage_backend", "local")
-    storage = get_storage()
+    storage = create_storage()
     assert isinstance(storage, LocalStorage)
 
 
-def test_get_storage_s3(monkeypatch):
+def test_create_storage_s3(monkeypatch):
     monkeypatch.setattr("app.services.storage.settings.storage_backend", "s3")
     monkeypatch.setattr("app.services.storage.settings.s3_bucket", "test-bucket")
     monkeypatch.setattr("app.services.storage.settings.s3_region", "us-east-1")
@@ -24,5 +36,123 @@ def test_get_storage_s3(monkeypatch):
             return kwargs
 
     monkeypatch.setattr("app.services.storage.boto3.client", lambda *args, **kwargs: DummyClient())
-    storage = get_storage()
+    storage = create_storage()
     assert isinstance(storage, S3Storage)
+
+
+def test_app_scoped_storage_is_shared_until_shutdown(monkeypatch, tmp_path):
+    monkeypatch.setattr("app.services.storage.settings.storage_backend", "local")
+    monkeypatch.setattr("app.services.storage.settings.storage_path", str(tmp_path))
+    closed = []
+    monkeypatch.setattr(LocalStorage, "close", lambda self: closed.append(self))
+
+    shutdown_storage()
+    closed.clear()
+    shared = start_storage()
+    try:
+        assert get_storage() is shared
+        assert start_storage() is shared
+    finally:
+        shutdown_storage()
+    assert closed == [shared]
+
+    # Outside the lifespan the first caller starts one backend for the process.
+    try:
+        fallback = get_storage()
+        assert fallback is not shared and get_storage() is fallback
+    finally:
+        shutdown_storage()
+    assert closed == [shared, fallback]
+
+
+async def _chunks(*parts):
+    for part in parts:
+        yield part
+
+
+@pytest.mark.asyncio
+async def test_local_save_stream_hashes_and_counts(tmp_path):
+    storage = LocalStorage(tmp_path)
+    stored = await storage.save_stream(_chunks(b"hello ", b"world"), "greeting.txt")
+
+    assert stored.size == 11
+    assert stored.sha256 == hashlib.sha256(b"hello world").hexdigest()
+    async with storage.open_local(stored.key) as path:
+        assert path.read_bytes() == b"hello world"
+
+
+@pytest.mark.asyncio
+async def test_local_save_stream_enforces_max_bytes(tmp_path):
+    storage = LocalStorage(tmp_path)
+    with pytest.raises(UploadTooLargeError):
+        await storage.save_stream(_chunks(b"a" * 8, b"b" * 8), "big.txt", max_bytes=10)
+    assert list(tmp_path.iterdir()) == []
+
+
+class RecordingS3Client:
+    def __init__(self, fail_part=None):
+        self.fail_part = fail_part
+        self.calls = []
+        self.parts = {}
+
+    def put_object(self, **kwargs):
+        self.calls.append(("put_object", kwargs["Key"], len(kwargs["Body"])))
+
+    def create_multipart_upload(self, **kwargs):
+        self.calls.append(("create_multipart_upload", kwargs["Key"]))
+        return {"UploadId": "upload-1"}
+
+    def upload_part(self, **kwargs):
+        if kwargs["PartNumber"] == self.fail_part:
+            raise RuntimeError("part failed")
+        self.parts[kwargs["PartNumber"]] = len(kwargs["Body"])
+        return {"ETag": f"etag-{kwargs['PartNumber']}"}
+
+    def complete_multipart_upload(self, **kwargs):
+        self.calls.append(("complete_multipart_upload", kwargs["MultipartUpload"]["Parts"]))
+
+    def abort_multipart_upload(self, **kwargs):
+        self.calls.append(("abort_multipart_upload", kwargs["UploadId"]))
+
+    def close(self):
+        pass
+
+
+def _s3_storage(monkeypatch, client):
+    monkeypatch.setattr("app.services.storage.settings.s3_bucket", "test-bucket")
+    monkeypatch.setattr("app.services.storage.settings.s3_create_bucket_if_missing", False)
+    monkeypatch.setattr("app.services.storage.boto3.client", lambda *args, **kwargs: client)
+    return S3Storage(content_addressed=False)
+
+
+@pytest.mark.asyncio
+async def test_s3_save_stream_uses_parallel_multipart_for_large_objects(monkeypatch):
+    client = RecordingS3Client()
+    storage = _s3_storage(monkeypatch, client)
+    mib = 1024 * 1024
+
+    stored = await storage.save_stream(_chunks(*[b"x" * mib] * 11), "large.pdf")
+    small = await storage.save_stream(_chunks(b"tiny"), "small.txt")
+    storage.close()
+
+    assert stored.size == 11 * mib
+    assert client.parts == {1: 8 * mib, 2: 3 * mib}
+    assert ("complete_multipart_upload", [
+        {"ETag": "etag-1", "PartNumber": 1},
+        {"ETag": "etag-2", "PartNumber": 2},
+    ]) in client.calls
+    assert ("put_object", small.key, 4) in client.calls
+
+
+@pytest.mark.asyncio
+async def test_s3_multipart_failure_aborts_upload(monkeypatch):
+    client = RecordingS3Client(fail_part=2)
+    storage = _s3_storage(monkeypatch, client)
+    mib = 1024 * 1024
+
+    with pytest.raises(RuntimeError):
+        await storage.save_stream(_chunks(*[b"x" * mib] * 20), "large.pdf")
+    storage.close()
+
+    assert ("abort_multipart_upload", "upload-1") in client.calls
+    assert not any(call[0] == "complete_multipart_upload" for call in client.calls)
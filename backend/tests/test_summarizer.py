@@ -0,0 +1,94 @@
+"""Tests for map-reduce book summarization."""
+import asyncio
+
+import pytest
+from sqlalchemy import select
+
+from app.db import models
+from app.db.session import AsyncSessionLocal
+from app.services.llm import LLMResult
+from app.services.storage import LocalStorage
+from app.services.summarizer import iter_sections, summarize_book
+from app.services.text_store import save_book_text
+
+
+async def _pages(*pages):
+    for page in pages:
+        yield page
+
+
+class FakeLLM:
+    def __init__(self, fail_on: str | None = None):
+        self.fail_on = fail_on
+        self.sections: list[str] = []
+        self.active = 0
+        self.peak = 0
+
+    async def summarize(self, text):
+        return f"short:{text[:5]}"
+
+    async def summarize_section(self, text):
+        if self.fail_on and text.startswith(self.fail_on):
+            raise RuntimeError("model crashed")
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        await asyncio.sleep(0.01)
+        self.active -= 1
+        self.sections.append(text[:3])
+        return LLMResult(text=f"[{text[:3]}]", prompt_tokens=100, completion_tokens=10)
+
+    async def combine_summaries(self, parts, final):
+        return LLMResult(text=("final:" if final else "") + "+".join(parts), prompt_tokens=50, completion_tokens=5)
+
+
+@pytest.mark.asyncio
+async def test_iter_sections_respects_size_and_keeps_text():
+    text_pages = ["a" * 700, "b" * 700, "c " * 300]
+    sections = [s async for s in iter_sections(_pages(*text_pages), 1000)]
+    assert all(len(s) <= 1000 for s in sections)
+    assert "".join(sections).replace("\n", "").replace(" ", "") == "".join(text_pages).replace(" ", "")
+
+
+@pytest.mark.asyncio
+async def test_long_book_is_mapped_in_parallel_and_resumes_from_checkpoints(tmp_path, monkeypatch):
+    storage = LocalStorage(tmp_path, content_addressed=False)
+    monkeypatch.setattr("app.services.summarizer.get_storage", lambda: storage)
+    monkeypatch.setattr("app.services.summarizer.settings.summary_chunk_chars", 1000)
+    monkeypatch.setattr("app.services.summarizer.settings.summary_map_concurrency", 2)
+
+    pages = [f"s{i:02d}" + "x" * 990 for i in range(6)]
+    async with AsyncSessionLocal() as db:
+        book = models.Book(title="Long", file_path="long.txt")
+        db.add(book)
+        await db.flush()
+        await save_book_text(db, storage, book.id, _pages(*pages))
+        await db.commit()
+        book_id = book.id
+
+    crashing = FakeLLM(fail_on="s04")
+    with pytest.raises(RuntimeError):
+        await summarize_book(book_id, crashing)
+    assert crashing.peak <= 2
+
+    async with AsyncSessionLocal() as db:
+        saved = (
+            await db.execute(select(models.SummaryChunk).where(models.SummaryChunk.book_id == book_id))
+        ).scalars().all()
+    done = {row.chunk_index for row in saved}
+    # Sections already running when s04 failed still finish and are kept.
+    assert {0, 1, 2, 3} <= done and 4 not in done
+
+    llm = FakeLLM()
+    summary, report = await summarize_book(book_id, llm)
+    assert set(llm.sections) == {f"s{i:02d}" for i in range(6) if i not in done}
+    assert summary == "final:[s00]+[s01]+[s02]+[s03]+[s04]+[s05]"
+    assert report.sections == 6
+    assert report.resumed == len(done)
+    assert report.llm_calls == len(llm.sections) + 1
+    assert report.prompt_tokens == 100 * len(llm.sections) + 50
+
+    async with AsyncSessionLocal() as db:
+        left = (
+            await db.execute(select(models.SummaryChunk).where(models.SummaryChunk.book_id == book_id))
+        ).scalars().all()
+    assert left == []
@@ -0,0 +1,95 @@
+"""Tests for the persisted extracted-text store."""
+from pathlib import Path
+
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+from app.db import models
+from app.db.base import Base
+from app.services.blobs import reap_blob
+from app.services.storage import LocalStorage
+from app.services.text_store import (
+    extract_book_text,
+    read_book_text,
+    read_page,
+    release_book_text,
+    save_book_text,
+    share_book_text,
+)
+
+
+async def _pages(*pages):
+    for page in pages:
+        yield page
+
+
+@pytest.mark.asyncio
+async def test_text_artifact_round_trip_and_shared_release(tmp_path):
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    storage = LocalStorage(tmp_path, content_addressed=False)
+
+    async with AsyncSession(engine, expire_on_commit=False) as db:
+        first = models.Book(title="First", file_path="first.txt")
+        second = models.Book(title="Second", file_path="second.txt")
+        db.add_all([first, second])
+        await db.flush()
+
+        book_text, preview = await save_book_text(
+            db, storage, first.id, _pages("alpha page", "beta page", "gamma page"), preview_chars=12
+        )
+        await db.commit()
+
+        assert preview == "alpha page\nb"
+        assert book_text.page_count == 3
+        assert await read_page(storage, book_text, 1) == "beta page"
+        assert await read_book_text(storage, book_text) == "alpha page\nbeta page\ngamma page"
+        assert await read_book_text(storage, book_text, max_chars=5) == "alpha"
+
+        await share_book_text(db, book_text, second.id)
+        await db.commit()
+
+        assert await release_book_text(db, first.id) is None
+        await db.commit()
+        assert await release_book_text(db, second.id) == book_text.sha256
+        await db.commit()
+
+        # The same text saved again before the reap takes the blob back and keeps the object.
+        again, _ = await save_book_text(db, storage, first.id, _pages("alpha page", "beta page", "gamma page"))
+        await db.commit()
+        assert again.key == book_text.key
+        await reap_blob(db, storage, book_text.sha256)
+        assert await read_page(storage, again, 0) == "alpha page"
+
+        assert await release_book_text(db, first.id) == book_text.sha256
+        await db.commit()
+        await reap_blob(db, storage, book_text.sha256)
+        assert not list(tmp_path.iterdir())
+        assert await db.get(models.Blob, book_text.sha256) is None
+    await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_losing_a_concurrent_extraction_reaps_its_artifact(tmp_path):
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    storage = LocalStorage(tmp_path / "store", content_addressed=True)
+    source = tmp_path / "book.txt"
+
+    async with AsyncSession(engine, expire_on_commit=False) as db:
+        book = models.Book(title="Book", file_path=str(source))
+        db.add(book)
+        await db.commit()
+        source.write_text("first extraction", encoding="utf-8")
+        first = await extract_book_text(db, storage, book.id, str(source))
+
+    # The other extractor committed first; this one got different text, so nothing else uses it.
+    async with AsyncSession(engine, expire_on_commit=False) as db:
+        source.write_text("second extraction", encoding="utf-8")
+        kept = await extract_book_text(db, storage, book.id, str(source))
+
+    assert kept.key == first.key
+    stored = [path for path in (tmp_path / "store").rglob("*") if path.is_file()]
+    assert stored == [Path(first.key)]